@@ -7,14 +7,29 @@ from flask_jwt_extended import JWTManager
 import os
 from config import Config
 from db import query_one, query_all, execute
-from email_config import init_mail, send_notification_email
-from routes import auth_bp, users_bp, courses_bp, assignments_bp, notifications_bp, files_bp
-from routes.files import MAX_FILE_SIZE
+from email_config import init_mail
+from routes import auth_bp, users_bp, courses_bp, assignments_bp, notifications_bp, files_bp, uploads_bp, messages_bp, search_bp, announcements_bp, comments_bp, stream_bp, dashboard_bp, batch_bp, changes_bp
+from routes.files import MAX_FILE_SIZE, thumbnail_url
+from permissions import resolve_submission_access, resolve_assignment_access
+from commands import register_commands
+from changes import register_change_tracking
+from response_cache import cached_response, assignment_scope, assignment_tag
+from conditional import conditional_get
+from routes.notifications import notifications_version
+from json_provider import init_json
+from compression import init_compression, metrics as compression_metrics
+from routes.roles import role_required
 
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# JSON con orjson: las rutas pueden pasar fechas y Decimal sin convertir
+init_json(app)
+
+# gzip/br/zstd para las respuestas de texto grandes
+init_compression(app)
+
 #Registrar Blueprints para el funcionamiento de las rutas en el backend
 app.register_blueprint(auth_bp)
 app.register_blueprint(users_bp)
@@ -22,6 +37,21 @@ app.register_blueprint(courses_bp)
 app.register_blueprint(assignments_bp)
 app.register_blueprint(notifications_bp)
 app.register_blueprint(files_bp)
+app.register_blueprint(uploads_bp)
+app.register_blueprint(messages_bp)
+app.register_blueprint(search_bp)
+app.register_blueprint(announcements_bp)
+app.register_blueprint(comments_bp)
+app.register_blueprint(stream_bp)
+app.register_blueprint(dashboard_bp)
+app.register_blueprint(batch_bp)
+app.register_blueprint(changes_bp)
+
+# Comandos de mantenimiento (flask --app app <comando>)
+register_commands(app)
+
+# Registro de cambios de las escrituras hechas con el ORM (ver changes.py)
+register_change_tracking()
 
 
 # Inicializar Flask-Mail
@@ -45,8 +75,14 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
 # Inicialización de extensiones (usar la instancia de models.db)
 
-CORS(app, origins=app.config['CORS_ORIGINS'])
-socketio = SocketIO(app, cors_allowed_origins=app.config['CORS_ORIGINS'])
+# El frontend está en otro origen: sin expose_headers no puede leer el cursor
+# de los listados paginados
+CORS(app, origins=app.config['CORS_ORIGINS'], expose_headers=['X-Next-Cursor'])
+socketio = SocketIO(
+    app,
+    cors_allowed_origins=app.config['CORS_ORIGINS'],
+    message_queue=app.config['SOCKETIO_MESSAGE_QUEUE']
+)
 jwt.init_app(app)
 
 # Importar modelos y unificar la instancia de DB
@@ -73,11 +109,11 @@ db = models_db
 def get_submission_files(submission_id):
     current_user_id = int(get_jwt_identity())
     
-    # Verificar acceso a la entrega
-    submission = AssignmentSubmission.query.get_or_404(submission_id)
-    
-    # Verificar permisos
-    if submission.student_id != current_user_id and submission.assignment.course.teacher_id != current_user_id:
+    # Verificar acceso a la entrega en una sola consulta
+    has_access = resolve_submission_access(current_user_id, submission_id)
+    if has_access is None:
+        return jsonify({'message': 'Entrega no encontrada'}), 404
+    if not has_access:
         return jsonify({'message': 'No tienes permisos para ver estos archivos'}), 403
     
     files = FileAttachment.query.filter_by(submission_id=submission_id).all()
@@ -87,26 +123,22 @@ def get_submission_files(submission_id):
         'filename': file.original_filename,
         'size': file.file_size,
         'mime_type': file.mime_type,
+        'thumbnail_url': thumbnail_url(file),
         'uploaded_at': file.created_at.isoformat()
     } for file in files])
 
 @app.route('/api/assignments/<int:assignment_id>/files', methods=['GET'])
 @jwt_required()
+@cached_response(tags=lambda user_id, assignment_id: [assignment_tag(assignment_id)], scope=assignment_scope)
 def get_assignment_files(assignment_id):
     current_user_id = int(get_jwt_identity())
     
-    # Verificar acceso a la tarea
-    assignment = Assignment.query.get_or_404(assignment_id)
-    
-    # Verificar permisos
-    if assignment.course.teacher_id != current_user_id:
-        # Verificar si el usuario está inscrito en el curso
-        enrollment = CourseEnrollment.query.filter_by(
-            student_id=current_user_id,
-            course_id=assignment.course_id
-        ).first()
-        if not enrollment:
-            return jsonify({'message': 'No tienes permisos para ver estos archivos'}), 403
+    # Verificar acceso a la tarea en una sola consulta
+    has_access = resolve_assignment_access(current_user_id, assignment_id)
+    if has_access is None:
+        return jsonify({'message': 'Tarea no encontrada'}), 404
+    if not has_access:
+        return jsonify({'message': 'No tienes permisos para ver estos archivos'}), 403
     
     files = FileAttachment.query.filter_by(assignment_id=assignment_id).all()
     
@@ -115,12 +147,14 @@ def get_assignment_files(assignment_id):
         'filename': file.original_filename,
         'size': file.file_size,
         'mime_type': file.mime_type,
+        'thumbnail_url': thumbnail_url(file),
         'uploaded_at': file.created_at.isoformat()
     } for file in files])
 
 # Rutas de notificaciones
 @app.route('/api/notifications', methods=['GET'])
 @jwt_required()
+@conditional_get(notifications_version)
 def get_notifications():
     current_user_id = int(get_jwt_identity())
     
@@ -169,14 +203,23 @@ def mark_notification_read(notification_id):
 def health_check():
     return {"status": "ok"}, 200
 
+@app.route('/api/metrics/compression', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_compression_metrics():
+    """Bytes antes y después, relación y CPU por codificación (de este proceso)"""
+    return jsonify(compression_metrics.snapshot())
+
 @app.route('/api/notifications/read-all', methods=['PUT'])
 @jwt_required()
 def mark_all_notifications_read():
     current_user_id = int(get_jwt_identity())
     
     try:
-        Notification.query.filter_by(user_id=current_user_id, is_read=False)\
-            .update({'is_read': True})
+        # Se cargan las filas para que cada una quede en el registro de cambios
+        unread = Notification.query.filter_by(user_id=current_user_id, is_read=False).all()
+        for notification in unread:
+            notification.is_read = True
         db.session.commit()
         
         return jsonify({'message': 'Todas las notificaciones marcadas como leídas'})
@@ -237,121 +280,6 @@ def handle_leave_user_room(data):
     leave_room(f'user_{current_user_id}')
     print(f'Usuario {current_user_id} salió de su sala')
 
-# Funciones para notificaciones por email
-def send_assignment_notification(assignment_id, course_id):
-    """Envía notificación por email cuando se crea una nueva tarea"""
-    try:
-        # Obtener información de la tarea y curso
-        assignment = query_one("""
-            SELECT a.*, c.name as course_name, u.first_name, u.last_name, u.email as teacher_email
-            FROM assignments a
-            JOIN courses c ON a.course_id = c.id
-            JOIN users u ON c.teacher_id = u.id
-            WHERE a.id = %s
-        """, (assignment_id,))
-        
-        if not assignment:
-            return False
-        
-        # Obtener estudiantes inscritos en el curso
-        students = query_all("""
-            SELECT u.email, u.first_name, u.last_name, u.assignment_reminders
-            FROM course_enrollments ce
-            JOIN users u ON ce.student_id = u.id
-            WHERE ce.course_id = %s AND u.email_notifications = TRUE AND u.assignment_reminders = TRUE
-        """, (course_id,))
-        
-        # Enviar notificación a cada estudiante
-        for student in students:
-            send_notification_email(
-                student['email'],
-                f"{student['first_name']} {student['last_name']}",
-                'assignment',
-                {
-                    'title': assignment['title'],
-                    'description': assignment['description'],
-                    'due_date': assignment['due_date'].strftime('%d/%m/%Y %H:%M') if assignment['due_date'] else 'N/A',
-                    'course_name': assignment['course_name'],
-                    'teacher_name': f"{assignment['first_name']} {assignment['last_name']}"
-                }
-            )
-        
-        return True
-    except Exception as e:
-        print(f"Error enviando notificación de tarea: {e}")
-        return False
-
-def send_grade_notification(submission_id):
-    """Envía notificación por email cuando se califica una tarea"""
-    try:
-        # Obtener información de la calificación
-        submission = query_one("""
-            SELECT s.*, a.title as assignment_title, u.email, u.first_name, u.last_name, u.grade_notifications
-            FROM assignment_submissions s
-            JOIN assignments a ON s.assignment_id = a.id
-            JOIN users u ON s.student_id = u.id
-            WHERE s.id = %s AND u.email_notifications = TRUE AND u.grade_notifications = TRUE
-        """, (submission_id,))
-        
-        if not submission or not submission['grade_notifications']:
-            return False
-        
-        send_notification_email(
-            submission['email'],
-            f"{submission['first_name']} {submission['last_name']}",
-            'grade',
-            {
-                'assignment_title': submission['assignment_title'],
-                'grade': submission['points_earned'],
-                'comments': submission['feedback'] or 'Sin comentarios'
-            }
-        )
-        
-        return True
-    except Exception as e:
-        print(f"Error enviando notificación de calificación: {e}")
-        return False
-
-def send_announcement_notification(announcement_id, course_id):
-    """Envía notificación por email cuando se crea un anuncio"""
-    try:
-        # Obtener información del anuncio
-        announcement = query_one("""
-            SELECT a.*, c.name as course_name
-            FROM announcements a
-            JOIN courses c ON a.course_id = c.id
-            WHERE a.id = %s
-        """, (announcement_id,))
-        
-        if not announcement:
-            return False
-        
-        # Obtener estudiantes inscritos en el curso
-        students = query_all("""
-            SELECT u.email, u.first_name, u.last_name, u.announcement_notifications
-            FROM course_enrollments ce
-            JOIN users u ON ce.student_id = u.id
-            WHERE ce.course_id = %s AND u.email_notifications = TRUE AND u.announcement_notifications = TRUE
-        """, (course_id,))
-        
-        # Enviar notificación a cada estudiante
-        for student in students:
-            send_notification_email(
-                student['email'],
-                f"{student['first_name']} {student['last_name']}",
-                'announcement',
-                {
-                    'title': announcement['title'],
-                    'content': announcement['content'],
-                    'course_name': announcement['course_name']
-                }
-            )
-        
-        return True
-    except Exception as e:
-        print(f"Error enviando notificación de anuncio: {e}")
-        return False
-
 if __name__ == '__main__':
     try:
         with app.app_context():
@@ -0,0 +1,109 @@
+"""
+Avatares normalizados en varios tamaños.
+
+Al subir un avatar se recorta al centro y se guardan versiones WebP de 32, 64
+y 256 px. El nombre de cada versión lleva un hash del contenido, así que la URL
+nunca cambia de contenido y se puede cachear como inmutable; un avatar nuevo
+produce URLs nuevas. En users.avatar se guarda la URL de la versión mayor y
+el resto se deriva de ella.
+"""
+import hashlib
+import io
+import re
+
+from PIL import Image, ImageOps
+
+import storage
+from storage import shard_key
+
+AVATAR_SIZES = (32, 64, 256)
+AVATAR_URL_PREFIX = '/uploads/avatars/'
+RENDITION_PATTERN = re.compile(r'^([0-9a-f]{32})_(\d+)\.webp$')
+
+
+def rendition_name(digest, size):
+    return f"{digest}_{size}.webp"
+
+
+def render_avatar(stream, user_id):
+    """
+    Retorna (digest, {tamaño: bytes WebP}). Lanza OSError/ValueError si el
+    archivo no es una imagen válida.
+    """
+    largest = AVATAR_SIZES[-1]
+    image = Image.open(stream)
+    # Los JPEG grandes se decodifican directamente a una escala cercana
+    image.draft('RGB', (largest * 2, largest * 2))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    image = ImageOps.fit(image, (largest, largest), Image.LANCZOS)
+
+    renditions = {}
+    for size in AVATAR_SIZES:
+        resized = image if size == largest else image.resize((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, 'WEBP', quality=80, method=4)
+        renditions[size] = buffer.getvalue()
+
+    # El id del usuario entra en el hash: dos usuarios con la misma imagen no comparten archivos
+    digest = hashlib.sha256(f"{user_id}:".encode() + renditions[largest]).hexdigest()[:32]
+    return digest, renditions
+
+
+def store_avatar(stream, user_id):
+    """Guarda todas las versiones y retorna la URL a registrar en users.avatar"""
+    digest, renditions = render_avatar(stream, user_id)
+    for size, data in renditions.items():
+        storage.store_stream(io.BytesIO(data), shard_key('avatars', rendition_name(digest, size)))
+    return AVATAR_URL_PREFIX + rendition_name(digest, AVATAR_SIZES[-1])
+
+
+def avatar_url(avatar, size=None):
+    """URL de la versión más chica que cubre `size`; los avatares antiguos se retornan tal cual"""
+    if not avatar:
+        return None
+    match = RENDITION_PATTERN.match(avatar.rsplit('/', 1)[-1])
+    if not match or not size:
+        return avatar
+    chosen = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+    return AVATAR_URL_PREFIX + rendition_name(match.group(1), chosen)
+
+
+def avatar_urls(avatar):
+    """{tamaño: URL} de todas las versiones, o None si no hay avatar"""
+    if not avatar:
+        return None
+    return {str(size): avatar_url(avatar, size) for size in AVATAR_SIZES}
+
+
+def avatar_filenames(avatar):
+    """Nombres de archivo que ocupa un avatar registrado"""
+    if not avatar:
+        return []
+    return sorted({avatar_url(avatar, size).rsplit('/', 1)[-1] for size in AVATAR_SIZES})
+
+
+def is_immutable(filename):
+    return bool(RENDITION_PATTERN.match(filename))
+
+
+def avatar_location(filename):
+    """
+    Ubicación de un avatar, o None. Los avatares se guardan en su clave
+    repartida del backend configurado, así que basta una sola consulta; el
+    backend local y la carpeta plana sólo se revisan si falla, para los
+    archivos que storage-migrate todavía no movió.
+    """
+    key = shard_key('avatars', filename)
+    location = storage.location_for(storage.get_storage(), key)
+    if storage.exists(location):
+        return location
+    local = storage.get_storage('local')
+    if local.exists(key):
+        return storage.location_for(local, key)
+    return storage.find(f"avatars/{filename}")
+
+
+def delete_avatar_files(avatar):
+    for filename in avatar_filenames(avatar):
+        storage.delete(avatar_location(filename))
@@ -0,0 +1,206 @@
+"""
+Mide la serialización JSON de listados grandes antes y después de orjson.
+
+Antes: cada ruta armaba el dict con isoformat() y float() por campo y jsonify
+usaba el proveedor de Flask (json de la biblioteca estándar). Después: las
+funciones de serializers.py pasan las fechas y Decimal sin convertir y
+jsonify usa OrjsonProvider. Para cada forma de listado (tareas, entregas,
+usuarios) reporta tiempo por respuesta, bytes generados y el pico de memoria
+asignada durante la serialización (tracemalloc).
+
+Uso (desde backend/):
+    python benchmarks/bench_json_serialization.py --rows 10000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from avatars import avatar_url  # noqa: E402
+from json_provider import OrjsonProvider, orjson  # noqa: E402
+from serializers import serialize_assignment, serialize_submission, serialize_user  # noqa: E402
+
+BASE_DATE = datetime(2024, 3, 1, 8, 30, 15, 123456)
+
+
+def assignment_rows(count):
+    return [{
+        'id': i,
+        'title': f"Tarea {i}",
+        'description': 'Resolver los ejercicios del capítulo ' * 4,
+        'due_date': BASE_DATE + timedelta(days=i % 90),
+        'max_points': Decimal('100.00'),
+        'allow_late_submissions': 1,
+        'is_archived': 0,
+        'created_at': BASE_DATE - timedelta(minutes=i),
+        'course_id': i % 40,
+        'course_name': f"Curso {i % 40}",
+        'submission_status': 'submitted' if i % 3 else None,
+        'submitted_at': BASE_DATE + timedelta(hours=i % 500) if i % 3 else None
+    } for i in range(count)]
+
+
+def submission_rows(count):
+    return [{
+        'id': i,
+        'content': 'Adjunto mi entrega con las respuestas. ' * 3,
+        'points_earned': Decimal('87.50') if i % 2 else None,
+        'feedback': 'Buen trabajo' if i % 2 else None,
+        'status': 'graded' if i % 2 else 'submitted',
+        'submitted_at': BASE_DATE + timedelta(minutes=i),
+        'graded_at': BASE_DATE + timedelta(days=2, minutes=i) if i % 2 else None,
+        'created_at': BASE_DATE + timedelta(minutes=i),
+        'student_id': 1000 + i,
+        'first_name': 'Ana',
+        'last_name': f"Pérez {i}",
+        'email': f"alumno{i}@infoclass.com"
+    } for i in range(count)]
+
+
+def user_rows(count):
+    return [{
+        'id': i,
+        'email': f"usuario{i}@infoclass.com",
+        'first_name': 'Luis',
+        'last_name': f"Gómez {i}",
+        'role': 'student',
+        'avatar': f"/uploads/avatars/{i:032x}_256.webp" if i % 2 else None,
+        'is_active': 1,
+        'created_at': BASE_DATE - timedelta(days=i % 365)
+    } for i in range(count)]
+
+
+# Como armaban las rutas cada elemento antes de este cambio
+
+def assignment_before(row):
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'description': row['description'],
+        'due_date': row['due_date'].isoformat(),
+        'max_points': float(row['max_points']),
+        'allow_late_submissions': bool(row['allow_late_submissions']),
+        'is_archived': bool(row['is_archived']),
+        'course': {'id': row['course_id'], 'name': row['course_name']},
+        'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+        'submission': {
+            'status': row['submission_status'],
+            'submitted_at': row['submitted_at'].isoformat() if row['submitted_at'] else None
+        } if row['submission_status'] else None
+    }
+
+
+def assignment_after(row):
+    assignment = serialize_assignment(row)
+    assignment['course'] = {'id': row['course_id'], 'name': row['course_name']}
+    assignment['submission'] = {
+        'status': row['submission_status'],
+        'submitted_at': row['submitted_at']
+    } if row['submission_status'] else None
+    return assignment
+
+
+def submission_before(row):
+    return {
+        'id': row['id'],
+        'student': {
+            'id': row['student_id'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'email': row['email']
+        },
+        'content': row['content'],
+        'points_earned': float(row['points_earned']) if row['points_earned'] else None,
+        'feedback': row['feedback'],
+        'status': row['status'],
+        'submitted_at': row['submitted_at'].isoformat() if row['submitted_at'] else None,
+        'graded_at': row['graded_at'].isoformat() if row['graded_at'] else None,
+        'created_at': row['created_at'].isoformat()
+    }
+
+
+def submission_after(row):
+    return {
+        **serialize_submission(row),
+        'student': {
+            'id': row['student_id'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'email': row['email']
+        }
+    }
+
+
+def user_before(row):
+    return {
+        'id': row['id'],
+        'email': row['email'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'role': row['role'],
+        'avatar': avatar_url(row['avatar'], 32),
+        'is_active': bool(row['is_active']),
+        'created_at': row['created_at'].isoformat()
+    }
+
+
+CASES = (
+    ('tareas', assignment_rows, assignment_before, assignment_after),
+    ('entregas', submission_rows, submission_before, submission_after),
+    ('usuarios', user_rows, user_before, serialize_user),
+)
+
+
+def measure(app, rows, serialize, repeat):
+    """(segundos por respuesta, bytes, pico de memoria asignada)"""
+    with app.app_context():
+        size = len(jsonify([serialize(row) for row in rows]).get_data())
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            jsonify([serialize(row) for row in rows]).get_data()
+        elapsed = (time.perf_counter() - start) / repeat
+
+        # Las filas ya existen; sólo se cuenta lo que asigna la serialización
+        tracemalloc.start()
+        jsonify([serialize(row) for row in rows]).get_data()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000, help='Filas por listado')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones para medir tiempo')
+    args = parser.parse_args()
+
+    if orjson is None:
+        sys.exit('orjson no está instalado (pip install orjson)')
+
+    before_app = Flask('antes')
+    before_app.json = DefaultJSONProvider(before_app)
+    after_app = Flask('despues')
+    after_app.json = OrjsonProvider(after_app)
+
+    print(f"{'listado':<10} {'versión':<8} {'ms/resp':>9} {'KB':>8} {'pico KB':>9}")
+    for name, make_rows, before, after in CASES:
+        rows = make_rows(args.rows)
+        results = {}
+        for label, app, serialize in (('antes', before_app, before), ('después', after_app, after)):
+            elapsed, size, peak = measure(app, rows, serialize, args.repeat)
+            results[label] = elapsed
+            print(f"{name:<10} {label:<8} {elapsed * 1000:9.1f} {size / 1024:8.0f} {peak / 1024:9.0f}")
+        print(f"{'':<10} {'mejora':<8} {results['antes'] / results['después']:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Mide la compresión en reposo (zstd) sobre un corpus de archivos de ejemplo.
+
+Aplica el mismo criterio que store_blob: tipo detectado por contenido, sólo
+tipos comprimibles y sólo si el ahorro supera COMPRESSION_MIN_SAVINGS. Reporta
+espacio ahorrado y velocidad de compresión y descompresión.
+
+Uso (desde backend/):
+    python benchmarks/bench_storage_compression.py ruta/al/corpus --level 3
+"""
+import argparse
+import mimetypes
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zstandard  # noqa: E402
+
+from blobs import is_compressible  # noqa: E402
+from config import Config  # noqa: E402
+from ingest import read_head, resolve_content_type, sniff_content_type  # noqa: E402
+
+
+def iter_corpus(root):
+    for folder, _, names in os.walk(root):
+        for name in sorted(names):
+            yield os.path.join(folder, name)
+
+
+def content_type_for(path):
+    declared = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return resolve_content_type(sniff_content_type(read_head(path)), declared) or declared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('corpus', help='Carpeta con archivos de ejemplo')
+    parser.add_argument('--level', type=int, default=Config.ZSTD_LEVEL, help='Nivel de zstd')
+    parser.add_argument('--min-savings', type=float, default=Config.COMPRESSION_MIN_SAVINGS)
+    args = parser.parse_args()
+
+    compressor = zstandard.ZstdCompressor(level=args.level)
+    decompressor = zstandard.ZstdDecompressor()
+    by_type = defaultdict(lambda: {'files': 0, 'compressed': 0, 'original': 0, 'stored': 0})
+    compress_time = decompress_time = 0.0
+    compressed_input = decompressed_output = 0
+
+    for path in iter_corpus(args.corpus):
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        mime_type = content_type_for(path)
+        stats = by_type[mime_type]
+        stats['files'] += 1
+        stats['original'] += len(data)
+
+        if not is_compressible(mime_type):
+            stats['stored'] += len(data)
+            continue
+
+        start = time.perf_counter()
+        packed = compressor.compress(data)
+        compress_time += time.perf_counter() - start
+        compressed_input += len(data)
+
+        if len(packed) > len(data) * (1 - args.min_savings):
+            stats['stored'] += len(data)
+            continue
+
+        start = time.perf_counter()
+        decompressor.decompress(packed)
+        decompress_time += time.perf_counter() - start
+        decompressed_output += len(data)
+        stats['compressed'] += 1
+        stats['stored'] += len(packed)
+
+    total_original = sum(s['original'] for s in by_type.values())
+    total_stored = sum(s['stored'] for s in by_type.values())
+    if not total_original:
+        print('El corpus está vacío')
+        return
+
+    print(f"{'tipo':55} {'archivos':>8} {'comprim.':>8} {'original':>12} {'guardado':>12} {'ahorro':>7}")
+    for mime_type, s in sorted(by_type.items(), key=lambda item: -item[1]['original']):
+        saved = 1 - s['stored'] / s['original'] if s['original'] else 0
+        print(f"{mime_type[:55]:55} {s['files']:>8} {s['compressed']:>8} "
+              f"{s['original']:>12} {s['stored']:>12} {saved:>7.1%}")
+
+    mb = 1024 * 1024
+    print()
+    print(f"Total: {total_original / mb:.1f} MB -> {total_stored / mb:.1f} MB "
+          f"({1 - total_stored / total_original:.1%} ahorrado, zstd nivel {args.level})")
+    if compress_time:
+        print(f"Compresión: {compressed_input / mb / compress_time:.0f} MB/s")
+    if decompress_time:
+        print(f"Descompresión: {decompressed_output / mb / decompress_time:.0f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
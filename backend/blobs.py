@@ -0,0 +1,154 @@
+"""
+Almacenamiento de adjuntos direccionado por contenido.
+
+Cada archivo se guarda una sola vez bajo el SHA-256 de su contenido y los
+registros de file_attachments apuntan al blob compartido. El blob lleva un
+contador de referencias y sólo se borra del almacenamiento cuando se elimina
+el último adjunto que lo usa.
+
+Con STORAGE_COMPRESSION=zstd los tipos de texto se guardan comprimidos y el
+blob registra su content_encoding; el SHA-256 y file_size siguen siendo los
+del contenido original.
+"""
+import hashlib
+import os
+
+from sqlalchemy import text
+
+import storage
+from config import Config
+from db import transaction
+from models import db, FileBlob
+from storage import shard_key
+
+try:
+    import zstandard
+except ImportError:  # la compresión en reposo queda desactivada
+    zstandard = None
+
+BUFFER_SIZE = 64 * 1024
+
+# Tipos (según el contenido detectado) que suelen comprimirse bien
+COMPRESSIBLE_MIME_TYPES = {
+    'application/json',
+    'application/xml',
+    'application/javascript',
+    'application/rtf',
+    'application/x-sh',
+    'image/svg+xml',
+    # Los formatos Office ya son ZIP: sólo se guardan comprimidos si de verdad ahorran
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'application/msword',
+    'application/vnd.ms-excel',
+}
+
+
+def thumbnail_location(location):
+    """Las miniaturas se guardan junto al blob con un sufijo fijo"""
+    return f"{location}.thumb.webp"
+
+
+def is_compressible(mime_type):
+    return bool(mime_type) and (mime_type.startswith('text/') or mime_type in COMPRESSIBLE_MIME_TYPES)
+
+
+def compress_for_storage(temp_path, mime_type):
+    """
+    Comprime el temporal con zstd si el tipo lo amerita y el ahorro supera
+    COMPRESSION_MIN_SAVINGS. Retorna (ruta_a_guardar, content_encoding o None).
+    """
+    if Config.STORAGE_COMPRESSION != 'zstd' or zstandard is None or not is_compressible(mime_type):
+        return temp_path, None
+
+    compressed_path = f"{temp_path}.zst"
+    compressor = zstandard.ZstdCompressor(level=Config.ZSTD_LEVEL)
+    with open(temp_path, 'rb') as source, open(compressed_path, 'wb') as dest:
+        compressor.copy_stream(source, dest, read_size=BUFFER_SIZE, write_size=BUFFER_SIZE)
+
+    original_size = os.path.getsize(temp_path)
+    if os.path.getsize(compressed_path) > original_size * (1 - Config.COMPRESSION_MIN_SAVINGS):
+        os.remove(compressed_path)
+        return temp_path, None
+    os.remove(temp_path)
+    return compressed_path, 'zstd'
+
+
+def open_blob(location, content_encoding=None):
+    """Archivo legible con el contenido original, descomprimiendo al vuelo si hace falta"""
+    source = storage.open_file(location)
+    if content_encoding == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(source, closefd=True)
+    return source
+
+
+def hash_file(path, buffer_size=BUFFER_SIZE):
+    """SHA-256 de un archivo ya escrito (subidas reanudables)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(buffer_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_blob(temp_path, sha256, size, scheme=None, mime_type=None):
+    """
+    Registra una referencia al blob con este contenido, creándolo si no existe.
+    El incremento queda en la transacción actual; se confirma junto con el adjunto.
+    """
+    key = shard_key('blobs', sha256)
+
+    # El upsert bloquea la fila del blob hasta el commit, así un borrado
+    # concurrente no puede eliminar el archivo que estamos por referenciar.
+    db.session.execute(text("""
+        INSERT INTO file_blobs (sha256, file_path, file_size, ref_count)
+        VALUES (:sha256, :file_path, :file_size, 1)
+        ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+    """), {'sha256': sha256, 'file_path': storage.location_for(storage.get_storage(scheme), key), 'file_size': size})
+
+    blob = FileBlob.query.filter_by(sha256=sha256).one()
+    if blob.ref_count == 1 or not storage.exists(blob.file_path):
+        # Contenido nuevo (o perdido): guardarlo en el backend configurado
+        stored_path, blob.content_encoding = compress_for_storage(temp_path, mime_type)
+        blob.file_path = storage.store(stored_path, key, scheme)
+    else:
+        # Ya existe una copia: no hace falta escribir ni subir nada
+        os.remove(temp_path)
+
+    return blob
+
+
+def release_blob(blob_id):
+    """
+    Quita una referencia al blob dentro de la transacción actual.
+    Retorna la ubicación a borrar después del commit, o None si sigue en uso.
+    """
+    blob = FileBlob.query.filter_by(id=blob_id).with_for_update().first()
+    if not blob:
+        return None
+
+    blob.ref_count -= 1
+    if blob.ref_count > 0:
+        return None
+
+    db.session.delete(blob)
+    return blob.file_path
+
+
+def remove_blob_file(location):
+    """Borra el archivo de un blob liberado (y su miniatura), salvo que otra subida lo haya recreado"""
+    if not location:
+        return
+    sha256 = location.rsplit('/', 1)[-1]
+    # El FOR UPDATE bloquea la fila del blob o, si no existe, el hueco de su
+    # clave en el índice único (REPEATABLE READ) hasta terminar de borrar. Una
+    # subida concurrente del mismo contenido espera en el upsert de store_blob
+    # y después escribe el archivo de nuevo; si su upsert llegó antes, la
+    # fila existe y aquí no se borra nada.
+    with transaction() as cur:
+        cur.execute("SELECT id FROM file_blobs WHERE sha256 = %s FOR UPDATE", (sha256,))
+        if cur.fetchone():
+            return
+        storage.delete(location)
+        storage.delete(thumbnail_location(location))
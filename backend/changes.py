@@ -0,0 +1,115 @@
+"""
+Registro de cambios para la sincronización incremental de los clientes.
+
+Cada escritura en tareas, entregas, anuncios, notificaciones e inscripciones
+agrega una fila a change_log en la misma transacción: tipo de entidad, id,
+curso y, si el cambio sólo le concierne a un usuario, ese usuario. Los
+clientes piden /api/changes?since=<cursor> y reciben las referencias de lo
+que cambió para volver a pedir sólo eso.
+
+Las escrituras por el ORM se registran solas (evento after_flush); las hechas
+con SQL directo llaman a record() con el cursor de su transacción.
+"""
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from db import query_all, execute
+from models import Assignment, AssignmentSubmission, Announcement, Notification, CourseEnrollment
+from storage_gc import load_cursor, save_cursor
+
+# maintenance_cursors: id más alto borrado por purge(); un cliente con un
+# cursor anterior tiene que volver a cargar todo
+PURGED_CURSOR = 'change_log_purged'
+
+INSERT_SQL = """
+    INSERT INTO change_log (entity_type, entity_id, course_id, user_id, operation)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+ORM_INSERT_SQL = text("""
+    INSERT INTO change_log (entity_type, entity_id, course_id, user_id, operation)
+    VALUES (:entity_type, :entity_id, :course_id, :user_id, :operation)
+""")
+
+
+def submission_course(connection, submission):
+    row = connection.execute(
+        text("SELECT course_id FROM assignments WHERE id = :id"), {'id': submission.assignment_id}
+    ).first()
+    return row[0] if row else None
+
+
+# modelo -> (tipo, curso, usuario al que le concierne o None si es de todo el curso)
+TRACKED_MODELS = {
+    Assignment: ('assignment', lambda conn, obj: obj.course_id, lambda obj: None),
+    Announcement: ('announcement', lambda conn, obj: obj.course_id, lambda obj: None),
+    AssignmentSubmission: ('submission', submission_course, lambda obj: obj.student_id),
+    Notification: ('notification', lambda conn, obj: None, lambda obj: obj.user_id),
+    CourseEnrollment: ('enrollment', lambda conn, obj: obj.course_id, lambda obj: obj.student_id),
+}
+
+
+def change_entry(entity_type, entity_id, course_id=None, user_id=None, operation='upsert'):
+    return (entity_type, entity_id, course_id, user_id, operation)
+
+
+def record(cur, entries):
+    """Registra cambios hechos con SQL directo, dentro de la transacción de `cur`"""
+    if entries:
+        cur.executemany(INSERT_SQL, list(entries))
+
+
+def _entries_from_flush(session, connection):
+    changed = [(obj, 'upsert') for obj in session.new]
+    changed += [(obj, 'upsert') for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    changed += [(obj, 'delete') for obj in session.deleted]
+
+    entries = []
+    for obj, operation in changed:
+        tracked = TRACKED_MODELS.get(type(obj))
+        if tracked is None or obj.id is None:
+            continue
+        entity_type, course_of, user_of = tracked
+        entries.append({
+            'entity_type': entity_type,
+            'entity_id': obj.id,
+            'course_id': course_of(connection, obj),
+            'user_id': user_of(obj),
+            'operation': operation
+        })
+    return entries
+
+
+def _after_flush(session, flush_context):
+    connection = session.connection()
+    entries = _entries_from_flush(session, connection)
+    if entries:
+        connection.execute(ORM_INSERT_SQL, entries)
+
+
+def purged_up_to():
+    return int(load_cursor(PURGED_CURSOR, '0') or 0)
+
+
+def purge(days, batch_size=1000):
+    """Borra por lotes los cambios de más de `days` días y avanza la marca de purga"""
+    removed = 0
+    while True:
+        rows = query_all("""
+            SELECT id FROM change_log
+            WHERE created_at < NOW() - INTERVAL %s DAY
+            ORDER BY id LIMIT %s
+        """, (days, batch_size))
+        if not rows:
+            return removed
+        last_id = rows[-1]['id']
+        # La marca avanza antes de borrar: un cliente nunca lee un hueco sin enterarse
+        save_cursor(PURGED_CURSOR, last_id)
+        _, count = execute("DELETE FROM change_log WHERE id <= %s", (last_id,))
+        removed += count
+
+
+def register_change_tracking():
+    """Activa el registro para todas las sesiones del ORM (una vez por proceso)"""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
@@ -0,0 +1,228 @@
+"""
+Comandos de mantenimiento para la CLI de Flask.
+
+Uso:
+    flask --app app storage-migrate --to s3 --batch-size 200
+    flask --app app storage-gc --max-batches 20
+    flask --app app jobs-worker --concurrency 4
+    flask --app app changes-purge --days 30
+"""
+import os
+import shutil
+import signal
+import threading
+import uuid
+from contextlib import closing
+
+import click
+
+import changes
+import jobs
+import storage
+import tasks  # noqa: F401  registra los manejadores de la cola
+from avatars import avatar_filenames, avatar_location
+from blobs import store_blob, hash_file, thumbnail_location
+from db import query_all, transaction
+from models import db, FileAttachment
+from storage import shard_key
+from storage_gc import run_gc
+from thumbnails import schedule_thumbnail
+
+
+def copy_object(location, backend, key):
+    """Copia una ubicación a (backend, clave) si todavía no está allí"""
+    if not backend.exists(key):
+        with closing(storage.open_file(location)) as source:
+            backend.save_stream(source, key)
+    return storage.location_for(backend, key)
+
+
+def adopt_legacy_attachments(scheme, batch_size):
+    """Pasa a blobs los adjuntos anteriores a la deduplicación (blob_id NULL)"""
+    moved = 0
+    last_id = 0
+    while True:
+        attachments = (FileAttachment.query
+                       .filter(FileAttachment.blob_id.is_(None), FileAttachment.id > last_id)
+                       .order_by(FileAttachment.id)
+                       .limit(batch_size)
+                       .all())
+        if not attachments:
+            break
+
+        for attachment in attachments:
+            last_id = attachment.id
+            old_location = attachment.file_path
+            if not storage.exists(old_location):
+                click.echo(f"  adjunto {attachment.id}: archivo no encontrado ({old_location})")
+                continue
+
+            temp_path = os.path.join(storage.temp_folder(), f".{uuid.uuid4().hex}.tmp")
+            with closing(storage.open_file(old_location)) as source, open(temp_path, 'wb') as out:
+                shutil.copyfileobj(source, out, storage.BUFFER_SIZE)
+
+            blob = store_blob(
+                temp_path, hash_file(temp_path), os.path.getsize(temp_path), scheme, attachment.mime_type
+            )
+            attachment.blob_id = blob.id
+            attachment.file_path = blob.file_path
+            attachment.filename = blob.sha256
+            # La miniatura se regenera junto al blob
+            old_thumbnail = attachment.thumbnail_path
+            attachment.thumbnail_path = None
+            db.session.commit()
+
+            storage.delete(old_location)
+            storage.delete(old_thumbnail)
+            schedule_thumbnail(attachment)
+            moved += 1
+    return moved
+
+
+def migrate_blobs(scheme, batch_size):
+    """Copia cada blob a su clave repartida en el backend destino y actualiza las filas"""
+    backend = storage.get_storage(scheme)
+    prefix = f"{backend.scheme}:"
+    moved = 0
+    last_id = 0
+    while True:
+        blobs = query_all("""
+            SELECT id, sha256, file_path FROM file_blobs
+            WHERE id > %s AND file_path NOT LIKE %s
+            ORDER BY id LIMIT %s
+        """, (last_id, prefix + '%', batch_size))
+        if not blobs:
+            break
+
+        for blob in blobs:
+            last_id = blob['id']
+            old_location = blob['file_path']
+            if not storage.exists(old_location):
+                click.echo(f"  blob {blob['id']}: archivo no encontrado ({old_location})")
+                continue
+
+            key = shard_key('blobs', blob['sha256'])
+            new_location = copy_object(old_location, backend, key)
+            new_thumbnail = None
+            if storage.exists(thumbnail_location(old_location)):
+                new_thumbnail = copy_object(thumbnail_location(old_location), backend, thumbnail_location(key))
+
+            # Las lecturas siguen usando la ubicación vieja hasta este commit
+            with transaction() as cur:
+                cur.execute(
+                    "UPDATE file_blobs SET file_path = %s WHERE id = %s AND file_path = %s",
+                    (new_location, blob['id'], old_location)
+                )
+                if cur.rowcount == 0:
+                    continue
+                cur.execute("""
+                    UPDATE file_attachments
+                    SET file_path = %s,
+                        thumbnail_path = CASE WHEN thumbnail_path IS NULL THEN NULL ELSE %s END
+                    WHERE blob_id = %s
+                """, (new_location, new_thumbnail, blob['id']))
+
+            storage.delete(old_location)
+            storage.delete(thumbnail_location(old_location))
+            moved += 1
+    return moved
+
+
+def migrate_avatars(scheme, batch_size):
+    """Mueve los avatares a su clave repartida; la URL pública no cambia"""
+    backend = storage.get_storage(scheme)
+    moved = 0
+    last_id = 0
+    while True:
+        users = query_all("""
+            SELECT id, avatar FROM users
+            WHERE id > %s AND avatar IS NOT NULL
+            ORDER BY id LIMIT %s
+        """, (last_id, batch_size))
+        if not users:
+            break
+
+        for user in users:
+            last_id = user['id']
+            for filename in avatar_filenames(user['avatar']):
+                old_location = avatar_location(filename)
+                key = shard_key('avatars', filename)
+                if not old_location or old_location == storage.location_for(backend, key):
+                    continue
+
+                copy_object(old_location, backend, key)
+                storage.delete(old_location)
+                moved += 1
+    return moved
+
+
+def register_commands(app):
+    @app.cli.command('storage-migrate')
+    @click.option('--to', 'scheme', type=click.Choice(['local', 's3']), default=None,
+                  help='Backend destino (por defecto STORAGE_BACKEND)')
+    @click.option('--batch-size', default=100, show_default=True, help='Filas por lote')
+    def storage_migrate(scheme, batch_size):
+        """Mueve los archivos existentes al backend y la estructura repartida actuales"""
+        scheme = scheme or app.config['STORAGE_BACKEND']
+        click.echo(f"Migrando archivos a '{scheme}'...")
+        click.echo(f"Adjuntos antiguos convertidos en blobs: {adopt_legacy_attachments(scheme, batch_size)}")
+        click.echo(f"Blobs movidos: {migrate_blobs(scheme, batch_size)}")
+        click.echo(f"Avatares movidos: {migrate_avatars(scheme, batch_size)}")
+
+    @app.cli.command('storage-gc')
+    @click.option('--batch-size', default=500, show_default=True, help='Filas o archivos por lote')
+    @click.option('--max-batches', type=int, default=None,
+                  help='Lotes por fase en esta corrida; la siguiente continúa desde el cursor')
+    @click.option('--grace-hours', type=int, default=None, help='Por defecto GC_GRACE_HOURS')
+    def storage_gc(batch_size, max_batches, grace_hours):
+        """Elimina adjuntos y archivos huérfanos y corrige los contadores de blobs"""
+        report = run_gc(batch_size, max_batches, grace_hours)
+        total = 0
+        for phase, stats in report.items():
+            total += stats['bytes']
+            click.echo(f"{phase}: {stats['rows']} filas, {stats['files']} archivos, {stats['bytes']} bytes")
+        click.echo(f"Espacio recuperado: {total / (1024 * 1024):.1f} MB")
+
+    @app.cli.command('changes-purge')
+    @click.option('--days', type=int, default=None, help='Por defecto CHANGES_RETENTION_DAYS')
+    def changes_purge(days):
+        """Borra el registro de cambios más antiguo que --days"""
+        click.echo(f"Cambios borrados: {changes.purge(days or app.config['CHANGES_RETENTION_DAYS'])}")
+
+    @app.cli.command('jobs-worker')
+    @click.option('--concurrency', type=int, default=None, help='Hilos de trabajo (por defecto JOB_WORKERS)')
+    @click.option('--poll-interval', type=float, default=None, help='Por defecto JOB_POLL_INTERVAL')
+    def jobs_worker(concurrency, poll_interval):
+        """Atiende la cola de trabajos hasta recibir SIGINT o SIGTERM"""
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        click.echo(f"Worker iniciado con {concurrency or app.config['JOB_WORKERS']} hilos")
+        jobs.run_worker(app, concurrency, poll_interval, stop)
+        click.echo("Worker detenido")
+
+    @app.cli.command('jobs-stats')
+    def jobs_stats():
+        """Trabajos por tipo y estado, y tiempos de la última hora"""
+        rows = jobs.queue_stats()
+        if not rows:
+            click.echo("La cola está vacía")
+            return
+        click.echo(f"{'tipo':25} {'pend.':>7} {'en curso':>8} {'muertos':>8} {'ok 1h':>7} {'ms prom.':>9} {'espera s':>9}")
+        for row in rows:
+            avg_ms = f"{row['avg_ms_last_hour']:.0f}" if row['avg_ms_last_hour'] is not None else '-'
+            click.echo(f"{row['type'][:25]:25} {int(row['pending'] or 0):>7} {int(row['running'] or 0):>8} "
+                       f"{int(row['dead'] or 0):>8} {int(row['done_last_hour'] or 0):>7} {avg_ms:>9} "
+                       f"{row['oldest_pending_seconds'] if row['oldest_pending_seconds'] is not None else '-':>9}")
+
+    @app.cli.command('jobs-retry')
+    @click.option('--type', 'job_type', default=None, help='Sólo los trabajos de este tipo')
+    def jobs_retry(job_type):
+        """Reencola los trabajos muertos (agotaron sus intentos)"""
+        click.echo(f"Trabajos reencolados: {jobs.retry_dead(job_type)}")
+
+    @app.cli.command('jobs-purge')
+    @click.option('--days', type=int, default=None, help='Por defecto JOB_RETENTION_DAYS')
+    def jobs_purge(days):
+        """Borra los trabajos terminados más antiguos que --days"""
+        click.echo(f"Trabajos borrados: {jobs.purge_finished(days or app.config['JOB_RETENTION_DAYS'])}")
@@ -0,0 +1,200 @@
+"""
+Compresión de las respuestas HTTP según Accept-Encoding.
+
+Se registra como after_request en la app: las respuestas de texto (JSON,
+HTML, CSV...) de 200 se comprimen con la mejor codificación que acepte el
+cliente entre RESPONSE_COMPRESSION (zstd y br si están instaladas sus
+bibliotecas, gzip siempre). No se comprimen:
+  - respuestas de menos de RESPONSE_COMPRESSION_MIN_SIZE bytes
+  - las que ya traen Content-Encoding (blobs guardados con zstd)
+  - las que envía send_file (direct_passthrough) y los endpoints de
+    EXEMPT_ENDPOINTS: descargas de adjuntos, miniaturas y el ZIP de entregas
+  - HEAD, 206, 304 y demás estados distintos de 200
+
+Las respuestas en streaming se comprimen por fragmento con un flush de
+sincronización, así cada fragmento llega al cliente sin esperar al final.
+
+El tiempo de CPU y los bytes antes y después quedan en `metrics` por
+codificación (GET /api/metrics/compression) para ajustar los niveles.
+"""
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+from flask import request
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # br queda desactivada
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstd queda desactivada
+    zstandard = None
+
+COMPRESSIBLE_MIME_TYPES = {
+    'application/json',
+    'application/xml',
+    'application/javascript',
+    'image/svg+xml',
+}
+
+EXEMPT_ENDPOINTS = {
+    'files.download_file',
+    'files.get_file_thumbnail',
+    'files.download_submissions_archive',
+}
+
+
+class CompressionMetrics:
+    """Contadores por codificación del proceso actual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_ms': 0.0})
+
+    def record(self, encoding, bytes_in, bytes_out, cpu_seconds):
+        with self._lock:
+            stats = self._stats[encoding]
+            stats['responses'] += 1
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            stats['cpu_ms'] += cpu_seconds * 1000
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for encoding, stats in self._stats.items():
+                result[encoding] = {
+                    **stats,
+                    'cpu_ms': round(stats['cpu_ms'], 1),
+                    'ratio': round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None,
+                    'cpu_ms_per_mb': round(stats['cpu_ms'] / (stats['bytes_in'] / 1048576), 2) if stats['bytes_in'] else None
+                }
+            return result
+
+
+metrics = CompressionMetrics()
+
+
+# codificación -> fábrica de (compress(datos), sync_flush(), finish())
+
+def gzip_encoder():
+    obj = zlib.compressobj(Config.RESPONSE_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return obj.compress, lambda: obj.flush(zlib.Z_SYNC_FLUSH), obj.flush
+
+
+def brotli_encoder():
+    obj = brotli.Compressor(quality=Config.RESPONSE_BROTLI_LEVEL)
+    return obj.process, obj.flush, obj.finish
+
+
+def zstd_encoder():
+    obj = zstandard.ZstdCompressor(level=Config.RESPONSE_ZSTD_LEVEL).compressobj()
+    return obj.compress, lambda: obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), obj.flush
+
+
+ENCODERS = {
+    'zstd': zstd_encoder if zstandard is not None else None,
+    'br': brotli_encoder if brotli is not None else None,
+    'gzip': gzip_encoder,
+}
+
+
+def available_encodings():
+    """Codificaciones configuradas e instaladas, en orden de preferencia del servidor"""
+    names = [name.strip() for name in Config.RESPONSE_COMPRESSION.split(',') if name.strip()]
+    return [name for name in names if ENCODERS.get(name)]
+
+
+def is_compressible(mime_type):
+    return bool(mime_type) and (
+        mime_type.startswith('text/') or mime_type in COMPRESSIBLE_MIME_TYPES
+        or mime_type.endswith('+json') or mime_type.endswith('+xml')
+    )
+
+
+def negotiate(response):
+    """Codificación para esta respuesta, o None si se envía tal cual"""
+    if request.method == 'HEAD' or response.status_code != 200:
+        return None
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return None
+    if request.endpoint in EXEMPT_ENDPOINTS or not is_compressible(response.mimetype):
+        return None
+
+    # La representación depende de Accept-Encoding aunque ésta no se comprima
+    response.vary.add('Accept-Encoding')
+    if not response.is_streamed:
+        length = response.content_length
+        if length is None:
+            length = len(response.get_data())
+        if length < Config.RESPONSE_COMPRESSION_MIN_SIZE:
+            return None
+
+    encodings = available_encodings()
+    return request.accept_encodings.best_match(encodings) if encodings else None
+
+
+def encode_stream(chunks, encoding):
+    """Comprime un iterable de fragmentos; cada uno sale con flush de sincronización"""
+    compress, sync_flush, finish = ENCODERS[encoding]()
+    bytes_in = bytes_out = 0
+    cpu = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if not chunk:
+                continue
+            started = time.thread_time()
+            data = compress(chunk) + sync_flush()
+            cpu += time.thread_time() - started
+            bytes_in += len(chunk)
+            bytes_out += len(data)
+            yield data
+        started = time.thread_time()
+        tail = finish()
+        cpu += time.thread_time() - started
+        bytes_out += len(tail)
+        yield tail
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        metrics.record(encoding, bytes_in, bytes_out, cpu)
+
+
+def compress_response(response):
+    encoding = negotiate(response)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = encode_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        started = time.thread_time()
+        compress, _, finish = ENCODERS[encoding]()
+        body = compress(data) + finish()
+        metrics.record(encoding, len(data), len(body), time.thread_time() - started)
+        if len(body) >= len(data):
+            return response
+        response.set_data(body)
+
+    response.headers['Content-Encoding'] = encoding
+    # Un ETag fuerte identifica bytes exactos; comprimida es otra representación
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    """Registra la compresión de respuestas si hay alguna codificación habilitada"""
+    if available_encodings():
+        app.after_request(compress_response)
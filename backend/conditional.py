@@ -0,0 +1,60 @@
+"""
+GET condicional para los listados JSON.
+
+Antes de cargar y serializar la respuesta se ejecuta una consulta corta que
+resume lo que la respuesta muestra (cantidad de filas, MAX(updated_at) y
+similares). Con ese resumen se arma un ETag débil: si coincide con el
+If-None-Match del cliente se responde 304 sin hacer el resto del trabajo.
+
+El resumen queda en g.response_version y @cached_response lo agrega a su
+clave: un cuerpo guardado antes de que cambie la versión nunca se sirve con
+el ETag nuevo, aunque la invalidación de la caché llegue tarde o no llegue
+(cambios en users.updated_at, otro proceso con el backend 'memory').
+"""
+import hashlib
+import json
+from functools import wraps
+
+from flask import request, current_app, g
+from flask_jwt_extended import get_jwt_identity
+
+
+def weak_etag(*parts):
+    material = json.dumps(parts, default=str, sort_keys=True)
+    return hashlib.sha1(material.encode()).hexdigest()[:32]
+
+
+def conditional_get(validator):
+    """
+    Va debajo de @jwt_required() y encima de @cached_response.
+
+    validator(user_id, **view_args) -> fila (dict) con lo que identifica la
+    versión de la respuesta, o None si el usuario no tiene acceso: entonces se
+    ejecuta la vista y responde el error como siempre.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            user_id = int(get_jwt_identity())
+            version = validator(user_id, **view_args)
+            if version is None:
+                return view(**view_args)
+            g.response_version = version
+
+            # La query string cambia la respuesta (archivadas, páginas, comentarios)
+            etag = weak_etag(
+                request.endpoint, view_args, sorted(request.args.items(multi=True)), user_id, version
+            )
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(**view_args))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # El navegador guarda la respuesta pero la revalida en cada uso
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -28,3 +28,66 @@ class Config:
     # Configuración de archivos
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 10 * 1024 * 1024))  # 10MB
+    
+    # Subidas reanudables por fragmentos (videos y comprimidos grandes)
+    MAX_LARGE_FILE_SIZE = int(os.getenv('MAX_LARGE_FILE_SIZE', 500 * 1024 * 1024))  # 500MB
+    UPLOAD_BUFFER_SIZE = int(os.getenv('UPLOAD_BUFFER_SIZE', 64 * 1024))  # 64KB
+    UPLOAD_SESSION_TTL_HOURS = int(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24))
+    
+    # Descargas delegadas al servidor web tras verificar permisos:
+    # '' (Flask envía el archivo), 'x-accel' (nginx) o 'x-sendfile' (Apache/lighttpd)
+    FILE_OFFLOAD_MODE = os.getenv('FILE_OFFLOAD_MODE', '').lower()
+    FILE_OFFLOAD_PREFIX = os.getenv('FILE_OFFLOAD_PREFIX', '/protected-uploads')
+    
+    # Miniaturas y vistas previas de adjuntos
+    THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', 320))  # px, lado mayor
+    THUMBNAIL_MAX_AGE = int(os.getenv('THUMBNAIL_MAX_AGE', 7 * 24 * 3600))
+    AVATAR_MAX_AGE = int(os.getenv('AVATAR_MAX_AGE', 365 * 24 * 3600))  # URLs inmutables
+    DASHBOARD_MAX_AGE = int(os.getenv('DASHBOARD_MAX_AGE', 30))  # caché privada de /api/dashboard
+    
+    # Backend de almacenamiento de archivos: 'local' (UPLOAD_FOLDER) o 's3' (S3/MinIO)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local').lower()
+    S3_BUCKET = os.getenv('S3_BUCKET', 'infoclass')
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')  # p. ej. http://localhost:9000 para MinIO
+    S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY')
+    S3_SECRET_KEY = os.getenv('S3_SECRET_KEY')
+    S3_REGION = os.getenv('S3_REGION')
+    S3_URL_EXPIRES = int(os.getenv('S3_URL_EXPIRES', 300))  # segundos
+    
+    # Compresión en reposo de adjuntos de texto: '' (desactivada) o 'zstd'
+    STORAGE_COMPRESSION = os.getenv('STORAGE_COMPRESSION', '').lower()
+    ZSTD_LEVEL = int(os.getenv('ZSTD_LEVEL', 3))
+    COMPRESSION_MIN_SAVINGS = float(os.getenv('COMPRESSION_MIN_SAVINGS', 0.1))  # fracción mínima ahorrada
+    
+    # Recolección de archivos huérfanos: nada más reciente que esto se borra
+    GC_GRACE_HOURS = int(os.getenv('GC_GRACE_HOURS', 24))
+    
+    # Cola de trabajos en segundo plano (flask --app app jobs-worker)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))  # hilos por proceso worker
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))  # segundos sin trabajo antes de volver a consultar
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+    JOB_BACKOFF_BASE = int(os.getenv('JOB_BACKOFF_BASE', 30))  # segundos antes del primer reintento
+    JOB_BACKOFF_MAX = int(os.getenv('JOB_BACKOFF_MAX', 3600))
+    JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', 600))  # 'running' sin latido por más tiempo = worker caído
+    JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 7))
+    
+    # Registro de cambios (/api/changes)
+    CHANGES_SETTLE_SECONDS = int(os.getenv('CHANGES_SETTLE_SECONDS', 2))
+    CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', 30))
+    
+    # Caché de respuestas de lectura (response_cache.py): 'memory' (un solo
+    # proceso web), 'redis' (compartida, invalidable desde los workers) o '' (desactivada)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory').lower()
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/1')
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 300))  # segundos; acota lo que una invalidación perdida deja sin actualizar
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 5000))  # sólo backend 'memory'
+    
+    # Compresión de respuestas (compression.py): codificaciones en orden de preferencia
+    RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'zstd,br,gzip').lower()  # '' la desactiva
+    RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', 1024))  # bytes
+    RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', 6))
+    RESPONSE_BROTLI_LEVEL = int(os.getenv('RESPONSE_BROTLI_LEVEL', 4))
+    RESPONSE_ZSTD_LEVEL = int(os.getenv('RESPONSE_ZSTD_LEVEL', 3))
+    
+    # Redis para que los eventos Socket.IO emitidos por los workers lleguen a los clientes
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')  # p. ej. redis://localhost:6379/0
@@ -1,6 +1,9 @@
 import os
 import re
 from urllib.parse import urlparse
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector
 from mysql.connector import pooling
 from dotenv import load_dotenv
@@ -38,9 +41,14 @@ password = DB_PASSWORD or password or "password"
 database = DB_NAME or database or "infoclass_db"
 port = int(DB_PORT or port or 3306)
 
+# El pool no espera cuando se agota: debe cubrir los hilos del servidor más
+# los de gather()
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+GATHER_WORKERS = int(os.getenv("DB_GATHER_WORKERS", 4))
+
 _pool = pooling.MySQLConnectionPool(
     pool_name="infoclass_pool",
-    pool_size=3,
+    pool_size=POOL_SIZE,
     host=host,
     user=user,
     password=password,
@@ -51,10 +59,49 @@ _pool = pooling.MySQLConnectionPool(
 )
 
 
+# Conexión fijada por pinned_connection() para el contexto actual
+_pinned = ContextVar("pinned_connection", default=None)
+
+
+class _BorrowedConnection:
+    """Envuelve la conexión fijada para que `with get_conn()` no la devuelva al pool"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, *exc):
+        return False
+
+
 def get_conn():
+    pinned = _pinned.get()
+    if pinned is not None:
+        return _BorrowedConnection(pinned)
     return _pool.get_connection()
 
 
+@contextmanager
+def pinned_connection():
+    """
+    Todas las consultas de este hilo dentro del bloque usan la misma conexión
+    (p. ej. las sub-peticiones de /api/batch). gather() sigue usando
+    conexiones propias porque corre en otros hilos.
+    """
+    if _pinned.get() is not None:
+        yield
+        return
+    conn = _pool.get_connection()
+    token = _pinned.set(conn)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+        conn.close()
+
+
 def query_one(sql: str, params: tuple = ()):  # returns dict
     with get_conn() as conn:
         cur = conn.cursor(dictionary=True)
@@ -81,3 +128,47 @@ def execute(sql: str, params: tuple = ()):  # returns lastrowid, rowcount
         rowcount = cur.rowcount
         cur.close()
         return last_id, rowcount
+
+
+@contextmanager
+def transaction():  # yields a dict cursor; commits on exit, rolls back on error
+    with get_conn() as conn:
+        conn.start_transaction()
+        cur = conn.cursor(dictionary=True)
+        try:
+            yield cur
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+@contextmanager
+def session_cursor(session):
+    """
+    Cursor (dict) sobre la conexión de la transacción en curso de una sesión
+    del ORM: lo que se ejecute con él se confirma o descarta junto con
+    session.commit() / session.rollback().
+    """
+    cur = session.connection().connection.cursor(dictionary=True)
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+
+# Los hilos se crean a medida que hacen falta
+_gather_executor = ThreadPoolExecutor(max_workers=GATHER_WORKERS, thread_name_prefix='db-gather')
+
+
+def gather(**calls):
+    """
+    Ejecuta consultas independientes en paralelo, cada una con su propia
+    conexión del pool, y retorna {nombre: resultado}. Los hilos son
+    compartidos por todo el proceso, así que nunca se usan más de
+    GATHER_WORKERS conexiones a la vez por esta vía.
+    """
+    futures = {name: _gather_executor.submit(call) for name, call in calls.items()}
+    return {name: future.result() for name, future in futures.items()}
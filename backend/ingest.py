@@ -0,0 +1,251 @@
+"""
+Ingesta de archivos subidos en una sola pasada.
+
+El stream se lee una única vez en bloques de tamaño fijo. En esa misma pasada
+se escribe un archivo temporal, se calcula el SHA-256, se cuentan los bytes
+contra el límite (abortando en cuanto se supera) y se detecta el tipo real
+del contenido por sus bytes mágicos. El llamador mueve luego el temporal a su
+lugar definitivo con un rename atómico.
+
+Los formularios multipart se leen con MultipartReader directamente del stream
+de la petición: Werkzeug no los vuelca antes a memoria ni a otro temporal, y
+la parte del archivo llega a ingest_stream a medida que se recibe.
+"""
+import hashlib
+import os
+import uuid
+from collections import namedtuple
+
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Epilogue, NEED_DATA
+
+try:
+    import magic
+except ImportError:  # libmagic no disponible: usar la tabla de firmas
+    magic = None
+
+BUFFER_SIZE = 64 * 1024
+SNIFF_SIZE = 2048
+# Campos de texto del formulario (ids) y bytes que el decodificador puede
+# retener buscando el separador dentro de una parte
+MAX_FIELD_SIZE = 64 * 1024
+MAX_DECODER_BUFFER = 4 * 1024 * 1024
+
+IngestResult = namedtuple('IngestResult', ['temp_path', 'sha256', 'size', 'mime_type'])
+
+# Firmas conocidas (desplazamiento, bytes, tipo MIME)
+MAGIC_SIGNATURES = [
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'RIFF', 'image/webp'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'Rar!\x1a\x07', 'application/x-rar-compressed'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+    (4, b'ftypqt', 'video/quicktime'),
+    (4, b'ftyp', 'video/mp4'),
+]
+
+# Formatos que son contenedores de otro tipo genérico
+CONTAINER_TYPES = {
+    'application/zip': {
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    },
+    'application/x-ole-storage': {
+        'application/msword',
+        'application/vnd.ms-excel',
+        'application/vnd.ms-powerpoint',
+    },
+}
+
+# Tipos application/* que en realidad son texto
+TEXT_APPLICATION_TYPES = {
+    'application/json',
+    'application/xml',
+    'application/sql',
+    'application/javascript',
+    'application/csv',
+}
+
+# Alias que libmagic reporta para los mismos formatos
+MIME_ALIASES = {
+    'application/x-zip-compressed': 'application/zip',
+    'application/vnd.rar': 'application/x-rar-compressed',
+    'application/x-rar': 'application/x-rar-compressed',
+    'application/x-cdfv2': 'application/x-ole-storage',
+    'application/cdfv2': 'application/x-ole-storage',
+}
+
+
+def is_text_type(mime_type):
+    """True si el tipo es texto legible (text/*, JSON, XML y sus variantes +json/+xml)"""
+    return (
+        mime_type.startswith('text/')
+        or mime_type in TEXT_APPLICATION_TYPES
+        or mime_type.endswith(('+json', '+xml'))
+    )
+
+
+def sniff_content_type(head):
+    """Tipo MIME según los primeros bytes del archivo, o None si no se reconoce"""
+    if not head:
+        return None
+
+    if magic is not None:
+        try:
+            detected = magic.from_buffer(head, mime=True)
+        except Exception:
+            detected = None
+        if detected and detected not in ('application/octet-stream', 'text/plain'):
+            return MIME_ALIASES.get(detected, detected)
+
+    for offset, signature, mime_type in MAGIC_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if mime_type == 'image/webp' and head[8:12] != b'WEBP':
+                continue
+            return mime_type
+
+    # Texto plano: sin bytes nulos y decodificable como UTF-8
+    if b'\x00' not in head:
+        try:
+            head.decode('utf-8')
+            return 'text/plain'
+        except UnicodeDecodeError:
+            # El corte del bloque puede partir un carácter multibyte
+            try:
+                head[:-3].decode('utf-8')
+                return 'text/plain'
+            except UnicodeDecodeError:
+                pass
+    return None
+
+
+def resolve_content_type(sniffed, declared):
+    """
+    Combina el tipo detectado con el esperado por la extensión.
+    Retorna el tipo a guardar, o None si el contenido no corresponde a la extensión.
+    """
+    if sniffed is None:
+        return declared
+    if sniffed == declared:
+        return declared
+    if declared in CONTAINER_TYPES.get(sniffed, ()):
+        return declared
+    # Un .txt o .csv puede contener JSON o XML: todo el texto es compatible entre sí
+    if is_text_type(sniffed) and is_text_type(declared):
+        return declared
+    return None
+
+
+def ingest_stream(stream, dest_folder, max_bytes, buffer_size=BUFFER_SIZE):
+    """
+    Lee el stream una sola vez hacia un temporal dentro de dest_folder.
+    Lanza RequestEntityTooLarge en cuanto se supera max_bytes, sin seguir leyendo.
+    """
+    os.makedirs(dest_folder, exist_ok=True)
+    temp_path = os.path.join(dest_folder, f".{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    head = b''
+    size = 0
+    try:
+        with open(temp_path, 'wb') as out:
+            while True:
+                chunk = stream.read(buffer_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise RequestEntityTooLarge()
+                if len(head) < SNIFF_SIZE:
+                    head += chunk[:SNIFF_SIZE - len(head)]
+                digest.update(chunk)
+                out.write(chunk)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return IngestResult(temp_path, digest.hexdigest(), size, sniff_content_type(head))
+
+
+def read_head(path, size=SNIFF_SIZE):
+    with open(path, 'rb') as fh:
+        return fh.read(size)
+
+
+class MultipartReader:
+    """
+    Lector de multipart/form-data sobre el stream de la petición.
+
+    next_file(name) avanza hasta la parte de archivo con ese nombre juntando en
+    fields los campos de texto previos; luego read() entrega su contenido a
+    medida que llega. finish() lee el resto del formulario (los campos que el
+    cliente envía después del archivo).
+    """
+
+    def __init__(self, stream, boundary, buffer_size=BUFFER_SIZE):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.decoder = MultipartDecoder(boundary, max_form_memory_size=MAX_DECODER_BUFFER)
+        self.fields = {}
+        self._pending = b''
+        self._in_file = False
+        self._complete = False
+
+    def _event(self):
+        try:
+            event = self.decoder.next_event()
+            while event is NEED_DATA:
+                self.decoder.receive_data(self.stream.read(self.buffer_size) or None)
+                event = self.decoder.next_event()
+        except ValueError:
+            raise BadRequest('Formulario multipart inválido')
+        if isinstance(event, Epilogue):
+            self._complete = True
+        return event
+
+    def _part_data(self):
+        """Fragmentos de la parte actual hasta su separador"""
+        while True:
+            event = self._event()
+            yield event.data
+            if not event.more_data:
+                return
+
+    def next_file(self, name):
+        """Nombre de archivo de la siguiente parte `name`, o None si el formulario no la trae"""
+        while not self._complete:
+            event = self._event()
+            if isinstance(event, Field):
+                value = b''
+                for data in self._part_data():
+                    value += data
+                    if len(value) > MAX_FIELD_SIZE:
+                        raise RequestEntityTooLarge()
+                self.fields[event.name] = value.decode('utf-8', 'replace')
+            elif isinstance(event, File):
+                if event.name == name:
+                    self._in_file = True
+                    return event.filename
+                for _ in self._part_data():
+                    pass
+        return None
+
+    def read(self, size=-1):
+        while not self._pending and self._in_file:
+            event = self._event()
+            self._pending = event.data
+            self._in_file = event.more_data
+        if size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def finish(self):
+        """Lee lo que queda del formulario; los campos quedan en fields"""
+        while self.read(self.buffer_size):
+            pass
+        self.next_file(None)
@@ -0,0 +1,323 @@
+"""
+Cola de trabajos en segundo plano respaldada por la tabla jobs.
+
+Las rutas encolan con enqueue() dentro de la misma transacción que la
+escritura que origina el trabajo (un cursor de db.transaction() o, con el
+ORM, de db.session_cursor()) y responden sin esperar; los workers (flask --app app jobs-worker)
+reclaman trabajos con SELECT ... FOR UPDATE SKIP LOCKED, así varios procesos
+comparten la cola sin bloquearse entre sí. Un trabajo que falla se reintenta
+con espera exponencial y, agotados los intentos, queda en estado 'dead' para
+revisarlo y reencolarlo a mano.
+
+Los manejadores se registran con @job_handler('tipo') en tasks.py y reciben
+el payload como argumentos con nombre.
+"""
+import json
+import random
+import socket
+import threading
+import time
+import traceback
+from collections import defaultdict
+
+from config import Config
+from db import query_all, execute, transaction
+
+HANDLERS = {}
+
+CLAIM_SQL = """
+    SELECT id, type, payload, attempts, max_attempts
+    FROM jobs
+    WHERE status = 'pending' AND run_at <= UTC_TIMESTAMP()
+    ORDER BY run_at, id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+ENQUEUE_SQL = """
+    INSERT INTO jobs (type, payload, max_attempts, run_at)
+    VALUES (%s, %s, %s, DATE_ADD(UTC_TIMESTAMP(), INTERVAL %s SECOND))
+"""
+
+STATS_SQL = """
+    SELECT type,
+           SUM(status = 'pending') AS pending,
+           SUM(status = 'running') AS running,
+           SUM(status = 'dead') AS dead,
+           SUM(status = 'done' AND finished_at >= UTC_TIMESTAMP() - INTERVAL 1 HOUR) AS done_last_hour,
+           AVG(CASE WHEN status = 'done' AND finished_at >= UTC_TIMESTAMP() - INTERVAL 1 HOUR
+                    THEN duration_ms END) AS avg_ms_last_hour,
+           TIMESTAMPDIFF(SECOND, MIN(CASE WHEN status = 'pending' THEN run_at END), UTC_TIMESTAMP()) AS oldest_pending_seconds
+    FROM jobs
+    GROUP BY type
+    ORDER BY type
+"""
+
+MAX_ERROR_LENGTH = 2000
+
+
+def job_handler(job_type):
+    def decorator(func):
+        HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+def enqueue(job_type, payload=None, delay=0, max_attempts=None, cur=None):
+    """
+    Encola un trabajo y retorna su id. Con `cur` (de db.transaction()) el
+    trabajo se confirma o descarta junto con el resto de la transacción.
+    """
+    params = (
+        job_type,
+        json.dumps(payload or {}),
+        max_attempts or Config.JOB_MAX_ATTEMPTS,
+        int(delay)
+    )
+    if cur is not None:
+        cur.execute(ENQUEUE_SQL, params)
+        return cur.lastrowid
+    job_id, _ = execute(ENQUEUE_SQL, params)
+    return job_id
+
+
+def enqueue_many(job_type, payloads, cur=None, max_attempts=None):
+    """Encola un trabajo por payload en una sola sentencia"""
+    rows = [
+        (job_type, json.dumps(payload), max_attempts or Config.JOB_MAX_ATTEMPTS, 0)
+        for payload in payloads
+    ]
+    if not rows:
+        return 0
+    if cur is not None:
+        cur.executemany(ENQUEUE_SQL, rows)
+        return len(rows)
+    with transaction() as own_cur:
+        own_cur.executemany(ENQUEUE_SQL, rows)
+    return len(rows)
+
+
+def backoff_seconds(attempts):
+    """Espera exponencial con jitter: base * 2^(intento - 1), acotada a JOB_BACKOFF_MAX"""
+    delay = min(Config.JOB_BACKOFF_MAX, Config.JOB_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim_jobs(worker_id, limit=1):
+    """Marca como 'running' hasta `limit` trabajos vencidos y los retorna"""
+    with transaction() as cur:
+        cur.execute(CLAIM_SQL, (limit,))
+        jobs = cur.fetchall()
+        if not jobs:
+            return []
+        placeholders = ', '.join(['%s'] * len(jobs))
+        cur.execute(f"""
+            UPDATE jobs
+            SET status = 'running', attempts = attempts + 1,
+                locked_by = %s, locked_at = UTC_TIMESTAMP()
+            WHERE id IN ({placeholders})
+        """, (worker_id, *[job['id'] for job in jobs]))
+    for job in jobs:
+        job['attempts'] += 1
+    return jobs
+
+
+def complete_job(job, duration_ms):
+    execute("""
+        UPDATE jobs
+        SET status = 'done', finished_at = UTC_TIMESTAMP(), duration_ms = %s,
+            locked_by = NULL, locked_at = NULL, last_error = NULL
+        WHERE id = %s
+    """, (duration_ms, job['id']))
+
+
+def fail_job(job, error, duration_ms):
+    """Reprograma el trabajo con espera exponencial o lo pasa a 'dead'. Retorna el estado final."""
+    error = error[-MAX_ERROR_LENGTH:]
+    if job['attempts'] >= job['max_attempts']:
+        execute("""
+            UPDATE jobs
+            SET status = 'dead', finished_at = UTC_TIMESTAMP(), duration_ms = %s,
+                locked_by = NULL, locked_at = NULL, last_error = %s
+            WHERE id = %s
+        """, (duration_ms, error, job['id']))
+        return 'dead'
+    execute("""
+        UPDATE jobs
+        SET status = 'pending', run_at = DATE_ADD(UTC_TIMESTAMP(), INTERVAL %s SECOND),
+            locked_by = NULL, locked_at = NULL, last_error = %s
+        WHERE id = %s
+    """, (int(backoff_seconds(job['attempts'])), error, job['id']))
+    return 'retry'
+
+
+def heartbeat(worker_ids):
+    """Renueva locked_at de los trabajos que estos workers siguen ejecutando"""
+    if not worker_ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(worker_ids))
+    _, count = execute(f"""
+        UPDATE jobs
+        SET locked_at = UTC_TIMESTAMP()
+        WHERE status = 'running' AND locked_by IN ({placeholders})
+    """, tuple(worker_ids))
+    return count
+
+
+def requeue_stale(lock_timeout=None):
+    """
+    Devuelve a la cola los trabajos de workers que murieron a mitad de camino.
+    Un worker vivo renueva locked_at con heartbeat(), así que sólo vencen los
+    huérfanos; como en fail_job(), los que agotaron sus intentos pasan a 'dead'.
+    """
+    _, count = execute("""
+        UPDATE jobs
+        SET finished_at = IF(attempts >= max_attempts, UTC_TIMESTAMP(), NULL),
+            status = IF(attempts >= max_attempts, 'dead', 'pending'),
+            locked_by = NULL, locked_at = NULL,
+            last_error = 'Worker detenido durante la ejecución'
+        WHERE status = 'running'
+          AND locked_at < UTC_TIMESTAMP() - INTERVAL %s SECOND
+    """, (lock_timeout or Config.JOB_LOCK_TIMEOUT,))
+    return count
+
+
+def retry_dead(job_type=None):
+    """Reencola los trabajos en 'dead' (todos o de un tipo) con sus intentos en cero"""
+    sql = """
+        UPDATE jobs
+        SET status = 'pending', attempts = 0, run_at = UTC_TIMESTAMP(), finished_at = NULL
+        WHERE status = 'dead'
+    """
+    params = ()
+    if job_type:
+        sql += " AND type = %s"
+        params = (job_type,)
+    _, count = execute(sql, params)
+    return count
+
+
+def purge_finished(days, batch_size=1000):
+    """Borra por lotes los trabajos terminados hace más de `days` días"""
+    removed = 0
+    while True:
+        _, count = execute("""
+            DELETE FROM jobs
+            WHERE status = 'done' AND finished_at < UTC_TIMESTAMP() - INTERVAL %s DAY
+            LIMIT %s
+        """, (days, batch_size))
+        removed += count
+        if count < batch_size:
+            return removed
+
+
+def queue_stats():
+    """Estado de la cola por tipo, compartido por todos los workers"""
+    return query_all(STATS_SQL)
+
+
+class JobMetrics:
+    """Contadores por tipo de trabajo del proceso actual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'done': 0, 'retry': 0, 'dead': 0, 'total_ms': 0, 'max_ms': 0})
+
+    def record(self, job_type, outcome, duration_ms):
+        with self._lock:
+            stats = self._stats[job_type]
+            stats[outcome] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {job_type: dict(stats) for job_type, stats in self._stats.items()}
+
+
+def run_job(app, job, metrics):
+    """Ejecuta un trabajo reclamado y registra el resultado"""
+    started = time.monotonic()
+    handler = HANDLERS.get(job['type'])
+    try:
+        if handler is None:
+            raise LookupError(f"No hay manejador para el tipo '{job['type']}'")
+        payload = job['payload']
+        payload = json.loads(payload) if isinstance(payload, (str, bytes, bytearray)) else payload
+        with app.app_context():
+            handler(**(payload or {}))
+    except Exception:
+        duration_ms = int((time.monotonic() - started) * 1000)
+        outcome = fail_job(job, traceback.format_exc(), duration_ms)
+        print(f"Trabajo {job['id']} ({job['type']}) falló, intento {job['attempts']}: {outcome}")
+    else:
+        duration_ms = int((time.monotonic() - started) * 1000)
+        complete_job(job, duration_ms)
+        outcome = 'done'
+    metrics.record(job['type'], outcome, duration_ms)
+
+
+def worker_loop(app, worker_id, stop, metrics, poll_interval):
+    while not stop.is_set():
+        try:
+            jobs = claim_jobs(worker_id)
+        except Exception as e:
+            print(f"Error reclamando trabajos: {e}")
+            jobs = []
+        if not jobs:
+            stop.wait(poll_interval)
+            continue
+        for job in jobs:
+            run_job(app, job, metrics)
+
+
+def run_worker(app, concurrency=None, poll_interval=None, stop=None, report_interval=60):
+    """
+    Atiende la cola con `concurrency` hilos hasta que se active `stop`.
+    El hilo principal renueva el bloqueo de los trabajos en curso, reencola
+    los huérfanos de otros workers y reporta métricas.
+    """
+    concurrency = concurrency or Config.JOB_WORKERS
+    poll_interval = poll_interval or Config.JOB_POLL_INTERVAL
+    stop = stop or threading.Event()
+    metrics = JobMetrics()
+    prefix = f"{socket.gethostname()}:{threading.get_native_id()}"
+
+    worker_ids = [f"{prefix}:{i}" for i in range(concurrency)]
+
+    threads = [
+        threading.Thread(
+            target=worker_loop,
+            args=(app, worker_id, stop, metrics, poll_interval),
+            name=f"jobs-{i}",
+            daemon=True
+        )
+        for i, worker_id in enumerate(worker_ids)
+    ]
+    for thread in threads:
+        thread.start()
+
+    # Varios latidos por cada JOB_LOCK_TIMEOUT: un trabajo largo nunca parece huérfano
+    maintenance_interval = max(1, min(report_interval, Config.JOB_LOCK_TIMEOUT // 3))
+    last_report = time.monotonic()
+    while not stop.wait(maintenance_interval):
+        try:
+            heartbeat(worker_ids)
+        except Exception as e:
+            print(f"Error renovando el bloqueo de los trabajos: {e}")
+        try:
+            requeued = requeue_stale()
+            if requeued:
+                print(f"Trabajos reencolados tras vencer su bloqueo: {requeued}")
+        except Exception as e:
+            print(f"Error reencolando trabajos: {e}")
+        if time.monotonic() - last_report >= report_interval:
+            last_report = time.monotonic()
+            for job_type, stats in sorted(metrics.snapshot().items()):
+                runs = stats['done'] + stats['retry'] + stats['dead']
+                print(f"[jobs] {job_type}: {stats['done']} ok, {stats['retry']} reintentos, "
+                      f"{stats['dead']} muertos, {stats['total_ms'] / runs:.0f} ms prom., {stats['max_ms']} ms máx.")
+
+    for thread in threads:
+        thread.join()
+    return metrics.snapshot()
@@ -0,0 +1,66 @@
+"""
+Proveedor JSON de Flask respaldado por orjson.
+
+orjson serializa datetime, date, dataclasses y UUID sin ayuda; Decimal (las
+columnas DECIMAL de MySQL) se convierte a float en default(). Así las rutas
+pueden pasar filas de query_all tal cual a jsonify, sin isoformat() ni
+float() por campo. Las claves salen ordenadas como con el proveedor de Flask
+y las fechas en ISO 8601, igual que las armaban las rutas con isoformat()
+(el proveedor de Flask las convertiría al formato HTTP).
+
+Sin orjson se usa IsoJSONProvider: la biblioteca estándar con las mismas
+conversiones, para que la salida no cambie.
+"""
+from datetime import date
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+
+def default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return DefaultJSONProvider.default(value)
+
+
+class IsoJSONProvider(DefaultJSONProvider):
+    default = staticmethod(default)
+
+
+class OrjsonProvider(IsoJSONProvider):
+    options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps_bytes(self, obj, indent=False):
+        options = self.options | orjson.OPT_INDENT_2 if indent else self.options
+        return orjson.dumps(obj, default=default, option=options)
+
+    def dumps(self, obj, **kwargs):
+        # Con argumentos propios de json.dumps (indent, separators...) se
+        # respeta el comportamiento de la biblioteca estándar
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(
+            self.dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype
+        )
+
+
+def init_json(app):
+    """Instala el proveedor en la app: orjson si está disponible"""
+    app.json = OrjsonProvider(app) if orjson is not None else IsoJSONProvider(app)
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import FetchedValue
 from datetime import datetime
 from decimal import Decimal
 
@@ -13,8 +14,15 @@ class User(db.Model):
     first_name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
     role = db.Column(db.Enum('student', 'teacher', 'admin'), nullable=False, default='student')
+    avatar = db.Column(db.String(255))
+    unread_messages = db.Column(db.Integer, nullable=False, default=0)  # contador mantenido al enviar/leer
+    email_notifications = db.Column(db.Boolean, nullable=False, default=True)
+    assignment_reminders = db.Column(db.Boolean, nullable=False, default=True)
+    grade_notifications = db.Column(db.Boolean, nullable=False, default=True)
+    announcement_notifications = db.Column(db.Boolean, nullable=False, default=True)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue())  # lo asigna MySQL
     
     # Relaciones
     courses_taught = db.relationship('Course', backref='teacher', lazy=True)
@@ -45,6 +53,7 @@ class Course(db.Model):
     teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue())  # lo asigna MySQL
     
     # Relaciones
     enrollments = db.relationship('CourseEnrollment', backref='course', lazy=True, cascade='all, delete-orphan')
@@ -75,6 +84,7 @@ class Assignment(db.Model):
     # Nuevo: soporte de archivado suave
     is_archived = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue())  # lo asigna MySQL
     
     # Relaciones
     submissions = db.relationship('AssignmentSubmission', backref='assignment', lazy=True, cascade='all, delete-orphan')
@@ -93,6 +103,7 @@ class AssignmentSubmission(db.Model):
     graded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     graded_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue())  # lo asigna MySQL
     
     # Relaciones
     grader = db.relationship('User', foreign_keys=[graded_by], backref='graded_submissions')
@@ -107,6 +118,7 @@ class Announcement(db.Model):
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue())  # lo asigna MySQL
     
     # Relaciones
     comments = db.relationship('Comment', backref='announcement', lazy=True, cascade='all, delete-orphan')
@@ -137,6 +149,14 @@ class Message(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class Conversation(db.Model):
+    __tablename__ = 'conversations'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    other_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('messages.id', ondelete='CASCADE'), nullable=False)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)  # mantenido al enviar/leer
+
 class Notification(db.Model):
     __tablename__ = 'notifications'
     
@@ -148,10 +168,22 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     related_id = db.Column(db.Integer)  # ID del objeto relacionado (assignment, grade, etc.)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue())  # lo asigna MySQL
     
     # Relaciones
     user = db.relationship('User', back_populates='notifications')
 
+class FileBlob(db.Model):
+    __tablename__ = 'file_blobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    file_size = db.Column(db.BigInteger, nullable=False)
+    content_encoding = db.Column(db.String(20))  # 'zstd' si se guarda comprimido
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class FileAttachment(db.Model):
     __tablename__ = 'file_attachments'
     
@@ -161,6 +193,9 @@ class FileAttachment(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.BigInteger, nullable=False)
     mime_type = db.Column(db.String(100), nullable=False)
+    # Blob compartido por contenido (NULL en adjuntos anteriores a la deduplicación)
+    blob_id = db.Column(db.Integer, db.ForeignKey('file_blobs.id'))
+    thumbnail_path = db.Column(db.String(500))  # miniatura WebP generada en segundo plano
     submission_id = db.Column(db.Integer, db.ForeignKey('assignment_submissions.id'))
     assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.id'))
     announcement_id = db.Column(db.Integer, db.ForeignKey('announcements.id'))
@@ -171,4 +206,76 @@ class FileAttachment(db.Model):
     submission = db.relationship('AssignmentSubmission', backref='attachments')
     assignment = db.relationship('Assignment', backref='attachments')
     announcement = db.relationship('Announcement', backref='attachments')
-    uploader = db.relationship('User', backref='uploaded_files')
\ No newline at end of file
+    blob = db.relationship('FileBlob', backref='attachments')
+    uploader = db.relationship('User', backref='uploaded_files')
+
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4().hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    original_filename = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    submission_id = db.Column(db.Integer, db.ForeignKey('assignment_submissions.id'))
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.id'))
+    announcement_id = db.Column(db.Integer, db.ForeignKey('announcements.id'))
+    status = db.Column(db.Enum('pending', 'completed'), nullable=False, default='pending')
+    file_id = db.Column(db.Integer, db.ForeignKey('file_attachments.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class MaintenanceCursor(db.Model):
+    __tablename__ = 'maintenance_cursors'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    position = db.Column(db.String(500), nullable=False, default='')
+    updated_at = db.Column(db.DateTime, server_default=FetchedValue(), server_onupdate=FetchedValue())  # lo asigna MySQL
+
+class StreamItem(db.Model):
+    __tablename__ = 'stream_items'
+    
+    id = db.Column(db.BigInteger, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
+    item_type = db.Column(db.Enum('announcement', 'assignment', 'grade'), nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'))  # NULL = todo el curso
+    actor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    title = db.Column(db.String(255), nullable=False)
+    summary = db.Column(db.String(255), nullable=False, default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StreamEntry(db.Model):
+    __tablename__ = 'stream_entries'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    stream_item_id = db.Column(db.BigInteger, db.ForeignKey('stream_items.id', ondelete='CASCADE'), primary_key=True)
+    course_id = db.Column(db.Integer, nullable=False)
+
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    
+    id = db.Column(db.BigInteger, primary_key=True)
+    entity_type = db.Column(db.Enum('assignment', 'submission', 'announcement', 'notification', 'enrollment'), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    course_id = db.Column(db.Integer)
+    user_id = db.Column(db.Integer)  # NULL = cambio visible para todo el curso
+    operation = db.Column(db.Enum('upsert', 'delete'), nullable=False, default='upsert')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.BigInteger, primary_key=True)
+    type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.Enum('pending', 'running', 'done', 'dead'), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    duration_ms = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
@@ -0,0 +1,44 @@
+"""
+Parámetros comunes de paginación por cursor (keyset).
+
+Las listas se piden con ?limit=N&before=<cursor>; la respuesta incluye
+next_cursor, que es None cuando no quedan más elementos. A diferencia de
+OFFSET, el costo de cada página no crece con lo que ya se recorrió.
+"""
+from flask import request
+
+DEFAULT_LIMIT = 30
+MAX_LIMIT = 100
+
+
+def page_limit(default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    try:
+        limit = int(request.args.get('limit', default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
+
+
+def cursor_id(param):
+    """Cursor numérico (id del último elemento recibido) o None para la primera página"""
+    try:
+        value = int(request.args.get(param, ''))
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+
+def before_id():
+    return cursor_id('before')
+
+
+def after_id():
+    """Para listas en orden ascendente (p. ej. comentarios): ?after=<cursor>"""
+    return cursor_id('after')
+
+
+def next_cursor(rows, limit, key='id'):
+    """Cursor de la página siguiente: se pide limit + 1 filas para saber si hay más"""
+    if len(rows) <= limit:
+        return None
+    return rows[limit - 1][key]
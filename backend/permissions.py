@@ -0,0 +1,114 @@
+"""
+Resolución de permisos de lectura sobre adjuntos en una sola consulta SQL.
+
+Las reglas son las mismas que aplicaban las cadenas de consultas del ORM:
+  - adjunto de una entrega: el estudiante que entregó o el profesor del curso
+  - adjunto de una tarea o anuncio: el profesor del curso o un estudiante inscrito
+  - adjunto sin padre: nadie
+"""
+from db import query_one
+
+FILE_ACCESS_SQL = """
+    SELECT
+        f.id, f.file_path, f.original_filename, f.mime_type, f.file_size,
+        f.created_at, f.blob_id, f.thumbnail_path, b.sha256, b.content_encoding,
+        CASE
+            WHEN f.submission_id IS NOT NULL
+                THEN COALESCE(s.student_id = %(user_id)s OR sc.teacher_id = %(user_id)s, FALSE)
+            WHEN f.assignment_id IS NOT NULL OR f.announcement_id IS NOT NULL
+                THEN COALESCE(c.teacher_id = %(user_id)s OR ce.student_id IS NOT NULL, FALSE)
+            ELSE FALSE
+        END AS can_read
+    FROM file_attachments f
+    LEFT JOIN file_blobs b ON b.id = f.blob_id
+    LEFT JOIN assignment_submissions s ON s.id = f.submission_id
+    LEFT JOIN assignments sa ON sa.id = s.assignment_id
+    LEFT JOIN courses sc ON sc.id = sa.course_id
+    LEFT JOIN assignments a ON a.id = f.assignment_id
+    LEFT JOIN announcements an ON an.id = f.announcement_id
+    LEFT JOIN courses c ON c.id = COALESCE(a.course_id, an.course_id)
+    LEFT JOIN course_enrollments ce ON ce.course_id = c.id AND ce.student_id = %(user_id)s
+    WHERE f.id = %(file_id)s
+"""
+
+SUBMISSION_ACCESS_SQL = """
+    SELECT COALESCE(s.student_id = %(user_id)s OR c.teacher_id = %(user_id)s, FALSE) AS can_read
+    FROM assignment_submissions s
+    JOIN assignments a ON a.id = s.assignment_id
+    JOIN courses c ON c.id = a.course_id
+    WHERE s.id = %(submission_id)s
+"""
+
+ASSIGNMENT_ACCESS_SQL = """
+    SELECT COALESCE(c.teacher_id = %(user_id)s OR ce.student_id IS NOT NULL, FALSE) AS can_read
+    FROM assignments a
+    JOIN courses c ON c.id = a.course_id
+    LEFT JOIN course_enrollments ce ON ce.course_id = c.id AND ce.student_id = %(user_id)s
+    WHERE a.id = %(assignment_id)s
+"""
+
+ANNOUNCEMENT_ACCESS_SQL = """
+    SELECT COALESCE(c.teacher_id = %(user_id)s OR ce.student_id IS NOT NULL, FALSE) AS can_read
+    FROM announcements an
+    JOIN courses c ON c.id = an.course_id
+    LEFT JOIN course_enrollments ce ON ce.course_id = c.id AND ce.student_id = %(user_id)s
+    WHERE an.id = %(announcement_id)s
+"""
+
+# Cursos visibles para el usuario (índices idx_courses_teacher y unique_enrollment),
+# para usar como subconsulta en un JOIN
+MY_COURSES_SQL = """
+    SELECT id AS course_id FROM courses WHERE teacher_id = %(user_id)s
+    UNION
+    SELECT course_id FROM course_enrollments WHERE student_id = %(user_id)s
+"""
+
+# Cursos propios; los administradores ven todos, como en /api/courses
+VISIBLE_COURSES_SQL = f"""
+    {MY_COURSES_SQL}
+    UNION
+    SELECT c.id FROM courses c
+    WHERE EXISTS (SELECT 1 FROM users WHERE id = %(user_id)s AND role = 'admin')
+"""
+
+COURSE_ACCESS_SQL = """
+    SELECT COALESCE(c.teacher_id = %(user_id)s OR ce.student_id IS NOT NULL, FALSE) AS can_read
+    FROM courses c
+    LEFT JOIN course_enrollments ce ON ce.course_id = c.id AND ce.student_id = %(user_id)s
+    WHERE c.id = %(course_id)s
+"""
+
+
+def resolve_file_access(user_id, file_id):
+    """
+    Datos del adjunto más la columna can_read, o None si el adjunto no existe.
+    Incluye lo necesario para responder la descarga sin más consultas.
+    """
+    row = query_one(FILE_ACCESS_SQL, {'user_id': user_id, 'file_id': file_id})
+    if row:
+        row['can_read'] = bool(row['can_read'])
+    return row
+
+
+def resolve_submission_access(user_id, submission_id):
+    """True/False según el acceso a los adjuntos de la entrega, o None si no existe"""
+    row = query_one(SUBMISSION_ACCESS_SQL, {'user_id': user_id, 'submission_id': submission_id})
+    return bool(row['can_read']) if row else None
+
+
+def resolve_course_access(user_id, course_id):
+    """True/False según si el usuario dicta o cursa el curso, o None si no existe"""
+    row = query_one(COURSE_ACCESS_SQL, {'user_id': user_id, 'course_id': course_id})
+    return bool(row['can_read']) if row else None
+
+
+def resolve_announcement_access(user_id, announcement_id):
+    """True/False según el acceso al curso del anuncio, o None si no existe"""
+    row = query_one(ANNOUNCEMENT_ACCESS_SQL, {'user_id': user_id, 'announcement_id': announcement_id})
+    return bool(row['can_read']) if row else None
+
+
+def resolve_assignment_access(user_id, assignment_id):
+    """True/False según el acceso a los adjuntos de la tarea, o None si no existe"""
+    row = query_one(ASSIGNMENT_ACCESS_SQL, {'user_id': user_id, 'assignment_id': assignment_id})
+    return bool(row['can_read']) if row else None
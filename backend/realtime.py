@@ -0,0 +1,19 @@
+"""
+Envío de eventos Socket.IO desde las rutas.
+
+Los blueprints no tienen acceso a la instancia de SocketIO creada en app.py;
+se obtiene de la app activa, así los eventos salen por el mismo servidor (y
+por el message queue, si se configura) que atiende las conexiones.
+"""
+from flask import current_app
+
+
+def user_room(user_id):
+    return f'user_{user_id}'
+
+
+def emit_to_user(user_id, event, payload):
+    """Emite a todas las conexiones del usuario (sala user_<id>); sin SocketIO no hace nada"""
+    socketio = current_app.extensions.get('socketio')
+    if socketio is not None:
+        socketio.emit(event, payload, room=user_room(user_id))
@@ -0,0 +1,272 @@
+"""
+Caché de respuestas de lectura que son iguales para todo un curso.
+
+Las rutas decoradas con @cached_response guardan el cuerpo JSON ya serializado
+bajo una clave formada por el endpoint, los argumentos de la ruta, la query
+string y un alcance de autorización: la verificación de acceso de cada usuario
+se sigue haciendo en cada petición, pero todos los que tienen acceso comparten
+la misma entrada. Cuarenta estudiantes abriendo la misma tarea hacen una sola
+vez las consultas del listado.
+
+Cada entrada se etiqueta ('course:3', 'assignment:7', 'user:12'). Una etiqueta
+guarda un número de versión que forma parte de la clave; invalidate() le
+asigna una versión nueva y las entradas anteriores dejan de encontrarse y
+vencen solas. Las rutas de escritura llaman a invalidate() después de
+confirmar la transacción.
+
+Backends (CACHE_BACKEND):
+  - 'memory': LRU dentro del proceso; sirve con un solo proceso web
+  - 'redis':  cualquier servidor compatible con Redis (CACHE_REDIS_URL),
+              compartido entre procesos web y workers
+  - '':       desactivada
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, current_app, g
+from flask_jwt_extended import get_jwt_identity
+
+from config import Config
+from permissions import resolve_course_access, resolve_assignment_access
+
+# Cabeceras de la respuesta que se guardan junto al cuerpo
+CACHED_HEADERS = ('X-Next-Cursor',)
+
+
+class MemoryBackend:
+    """LRU en memoria con vencimiento por entrada; las versiones de etiqueta no se desalojan"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def versions(self, tags):
+        with self._lock:
+            return [self._versions.setdefault(tag, new_version()) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = new_version()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class RedisBackend:
+    """Servidor compatible con Redis; las entradas vencen con EX y las versiones no vencen"""
+
+    def __init__(self, url, prefix='infoclass:cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def versions(self, tags):
+        keys = [f"{self.prefix}tag:{tag}" for tag in tags]
+        values = self.client.mget(keys)
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if missing:
+            # Una versión desalojada nunca vuelve a un valor anterior; SETNX
+            # resuelve la carrera entre dos lectores que la crean a la vez
+            pipe = self.client.pipeline()
+            for key in missing:
+                pipe.set(key, new_version(), nx=True)
+            pipe.execute()
+            values = self.client.mget(keys)
+        return [value.decode() for value in values]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.set(f"{self.prefix}tag:{tag}", new_version())
+        pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+def new_version():
+    return uuid.uuid4().hex[:12]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Backend configurado, creado la primera vez que se usa; None si la caché está desactivada"""
+    global _backend
+    if _backend is None and Config.CACHE_BACKEND:
+        with _backend_lock:
+            if _backend is None:
+                if Config.CACHE_BACKEND == 'redis':
+                    _backend = RedisBackend(Config.CACHE_REDIS_URL)
+                else:
+                    _backend = MemoryBackend(Config.CACHE_MAX_ENTRIES)
+    return _backend
+
+
+def course_tag(course_id):
+    return f"course:{course_id}"
+
+
+def assignment_tag(assignment_id):
+    return f"assignment:{assignment_id}"
+
+
+def user_tag(user_id):
+    return f"user:{user_id}"
+
+
+def invalidate(*tags):
+    """Descarta todo lo guardado bajo estas etiquetas; una falla de la caché no frena la escritura"""
+    backend = get_backend()
+    tags = [tag for tag in tags if tag]
+    if backend is None or not tags:
+        return
+    try:
+        backend.bump(tags)
+    except Exception as e:
+        current_app.logger.warning(f"No se pudo invalidar la caché {tags}: {e}")
+
+
+def cache_key(name, tags, backend, *parts):
+    versions = backend.versions(tags)
+    material = json.dumps([parts, sorted(zip(tags, versions))], default=str, sort_keys=True)
+    return f"{name}:{hashlib.sha1(material.encode()).hexdigest()}"
+
+
+def remember(name, tags, produce, *parts):
+    """
+    Valor JSON de produce() guardado bajo (name, parts) y las etiquetas dadas.
+    Para la parte compartida de una respuesta que también tiene datos por usuario.
+    """
+    backend = get_backend()
+    if backend is None:
+        return produce()
+    try:
+        key = cache_key(name, tags, backend, *parts)
+        stored = backend.get(key)
+    except Exception as e:
+        current_app.logger.warning(f"Caché no disponible: {e}")
+        return produce()
+    if stored is not None:
+        return current_app.json.loads(stored)
+
+    encoded = current_app.json.dumps(produce())
+    try:
+        backend.set(key, encoded, Config.CACHE_TTL)
+    except Exception as e:
+        current_app.logger.warning(f"No se pudo guardar en la caché: {e}")
+    # Con fechas y Decimal ya convertidos, igual que cuando se lee de la caché
+    return current_app.json.loads(encoded)
+
+
+def cached_response(tags, scope):
+    """
+    Guarda las respuestas 200 de la vista. Va debajo de @jwt_required().
+
+    tags(user_id, **view_args)  -> etiquetas de la entrada
+    scope(user_id, **view_args) -> alcance compartido por quienes ven lo mismo
+                                   ('course', 'user:12'), o None si el usuario
+                                   no tiene acceso: entonces se ejecuta la vista
+                                   y responde el error como siempre
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            backend = get_backend()
+            if backend is None:
+                return view(**view_args)
+
+            user_id = int(get_jwt_identity())
+            access = scope(user_id, **view_args)
+            if access is None:
+                return view(**view_args)
+
+            try:
+                # Con @conditional_get encima, la versión del ETag es parte de
+                # la clave: el cuerpo servido siempre corresponde a ese ETag
+                key = cache_key(
+                    f"response:{request.endpoint}", tags(user_id, **view_args), backend,
+                    view_args, sorted(request.args.items(multi=True)), access,
+                    g.get('response_version')
+                )
+                stored = backend.get(key)
+            except Exception as e:
+                current_app.logger.warning(f"Caché no disponible: {e}")
+                return view(**view_args)
+
+            if stored is not None:
+                entry = json.loads(stored)
+                response = current_app.response_class(entry['body'], mimetype='application/json')
+                response.headers.extend(entry['headers'])
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(view(**view_args))
+            if response.status_code == 200 and response.is_json:
+                entry = {
+                    'body': response.get_data(as_text=True),
+                    'headers': {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+                }
+                try:
+                    backend.set(key, json.dumps(entry), Config.CACHE_TTL)
+                except Exception as e:
+                    current_app.logger.warning(f"No se pudo guardar en la caché: {e}")
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+# Alcances de uso común
+
+def course_scope(user_id, course_id, **_):
+    """Profesor o estudiante del curso; todos ven la misma respuesta"""
+    return 'course' if resolve_course_access(user_id, course_id) else None
+
+
+def assignment_scope(user_id, assignment_id, **_):
+    return 'course' if resolve_assignment_access(user_id, assignment_id) else None
+
+
+def own_scope(user_id, **_):
+    """Respuesta propia de cada usuario"""
+    return user_tag(user_id)
+
@@ -5,5 +5,14 @@ from .courses import courses_bp
 from .assignments import assignments_bp
 from .files import files_bp
 from .notifications import notifications_bp
+from .uploads import uploads_bp
+from .messages import messages_bp
+from .search import search_bp
+from .announcement import announcements_bp
+from .comments import comments_bp
+from .stream import stream_bp
+from .dashboard import dashboard_bp
+from .batch import batch_bp
+from .changes import changes_bp
 
-__all__ = ['auth_bp', 'users_bp', 'courses_bp', 'assignments_bp', 'notifications_bp','files_bp']
+__all__ = ['auth_bp', 'users_bp', 'courses_bp', 'assignments_bp', 'notifications_bp','files_bp', 'uploads_bp', 'messages_bp', 'search_bp', 'announcements_bp', 'comments_bp', 'stream_bp', 'dashboard_bp', 'batch_bp', 'changes_bp']
@@ -10,15 +10,24 @@ import uuid
 import mimetypes
 from functools import wraps
 from config import Config
-from db import query_one, query_all, execute
+from db import query_one, query_all, execute, session_cursor
 import bcrypt
 from routes.roles import role_required
 from routes.files import allowed_file
+from avatars import avatar_url
+from pagination import page_limit, before_id, next_cursor
+from permissions import resolve_course_access
+from routes.comments import first_comments, MAX_COMMENTS_PER_PARENT
+from jobs import enqueue
+from response_cache import cached_response, invalidate, course_scope, course_tag
+from conditional import conditional_get
+import stream
 
 
 from models import (
     db as models_db,
-    Comment
+    Announcement,
+    Course
 )
 
 app = Flask(__name__)
@@ -30,47 +39,158 @@ db = models_db
 
 announcements_bp = Blueprint('announcements', __name__)
 
+# Feed de anuncios: fijados primero y luego por fecha, paginado por cursor sobre
+# el índice (course_id, is_pinned, created_at). Un is_pinned NULL cuenta como
+# no fijado, tanto al ordenar como en el cursor. Autor y cantidades de
+# comentarios y adjuntos vienen en la misma consulta.
+FEED_KEYSET = """
+    AND (COALESCE(a.is_pinned, FALSE) < %(pinned)s
+         OR (COALESCE(a.is_pinned, FALSE) = %(pinned)s AND (a.created_at < %(before_at)s
+             OR (a.created_at = %(before_at)s AND a.id < %(before)s))))
+"""
 
-# Rutas de gestión de comentarios
-@app.route('/api/announcements/<int:announcement_id>/comments', methods=['GET'])
-@jwt_required()
-def get_announcement_comments(announcement_id):
-    comments = Comment.query.filter_by(announcement_id=announcement_id).order_by(Comment.created_at.asc()).all()
-    
-    return jsonify([{
-        'id': comment.id,
-        'content': comment.content,
+FEED_SQL = """
+    SELECT a.id, a.title, a.content, a.is_pinned, a.created_at,
+           u.id AS author_id, u.first_name, u.last_name, u.avatar,
+           (SELECT COUNT(*) FROM comments cm WHERE cm.announcement_id = a.id) AS comment_count,
+           (SELECT COUNT(*) FROM file_attachments f WHERE f.announcement_id = a.id) AS attachment_count
+    FROM announcements a
+    JOIN users u ON u.id = a.author_id
+    WHERE a.course_id = %(course_id)s {keyset}
+    ORDER BY COALESCE(a.is_pinned, FALSE) DESC, a.created_at DESC, a.id DESC
+    LIMIT %(limit)s
+"""
+
+
+# Versión del feed para el ETag, con la verificación de acceso incluida.
+# Cada subconsulta recorre el índice por curso o por anuncio.
+FEED_VERSION_SQL = """
+    SELECT COALESCE(c.teacher_id = %(user_id)s OR ce.student_id IS NOT NULL, FALSE) AS can_read,
+           (SELECT COUNT(*) FROM announcements a WHERE a.course_id = c.id) AS count,
+           (SELECT MAX(a.updated_at) FROM announcements a WHERE a.course_id = c.id) AS updated_at,
+           (SELECT MAX(u.updated_at) FROM announcements a JOIN users u ON u.id = a.author_id
+            WHERE a.course_id = c.id) AS authors_updated_at,
+           (SELECT COUNT(*) FROM announcements a JOIN comments cm ON cm.announcement_id = a.id
+            WHERE a.course_id = c.id) AS comments,
+           (SELECT COUNT(*) FROM announcements a JOIN file_attachments f ON f.announcement_id = a.id
+            WHERE a.course_id = c.id) AS attachments
+    FROM courses c
+    LEFT JOIN course_enrollments ce ON ce.course_id = c.id AND ce.student_id = %(user_id)s
+    WHERE c.id = %(course_id)s
+"""
+
+
+def feed_version(user_id, course_id):
+    row = query_one(FEED_VERSION_SQL, {'user_id': user_id, 'course_id': course_id})
+    return row if row and row['can_read'] else None
+
+
+def serialize_feed_item(row):
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'content': row['content'],
+        'is_pinned': bool(row['is_pinned']),
         'author': {
-            'id': comment.author.id,
-            'first_name': comment.author.first_name,
-            'last_name': comment.author.last_name
+            'id': row['author_id'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'avatar': avatar_url(row['avatar'], 64)
         },
-        'created_at': comment.created_at.isoformat()
-    } for comment in comments])
+        'comment_count': row['comment_count'],
+        'attachment_count': row['attachment_count'],
+        'created_at': row['created_at'].isoformat()
+    }
+
 
-@app.route('/api/announcements/<int:announcement_id>/comments', methods=['POST'])
+# Rutas de gestión de anuncios
+@announcements_bp.route('/api/courses/<int:course_id>/announcements', methods=['GET'])
 @jwt_required()
-def create_announcement_comment(announcement_id):
+@conditional_get(feed_version)
+@cached_response(tags=lambda user_id, course_id: [course_tag(course_id)], scope=course_scope)
+def get_announcements(course_id):
+    """
+    Feed del curso; la página siguiente se pide con ?before=<X-Next-Cursor>.
+    Con ?comments=N cada anuncio incluye sus primeros N comentarios, cargados
+    para toda la página en una sola consulta.
+    """
+    current_user_id = int(get_jwt_identity())
+    has_access = resolve_course_access(current_user_id, course_id)
+    if has_access is None:
+        return jsonify({'message': 'Curso no encontrado'}), 404
+    if not has_access:
+        return jsonify({'message': 'No tienes acceso a este curso'}), 403
+    
+    limit = page_limit()
+    params = {'course_id': course_id, 'limit': limit + 1}
+    keyset = ''
+    cursor_id = before_id()
+    if cursor_id:
+        cursor = query_one(
+            "SELECT COALESCE(is_pinned, FALSE) AS is_pinned, created_at FROM announcements WHERE id = %s AND course_id = %s",
+            (cursor_id, course_id)
+        )
+        if cursor:
+            keyset = FEED_KEYSET
+            params.update(pinned=cursor['is_pinned'], before_at=cursor['created_at'], before=cursor_id)
+    
+    rows = query_all(FEED_SQL.format(keyset=keyset), params)
+    items = [serialize_feed_item(row) for row in rows[:limit]]
+    
+    per_announcement = min(request.args.get('comments', 0, type=int), MAX_COMMENTS_PER_PARENT)
+    if per_announcement > 0:
+        threads = first_comments('announcement', [item['id'] for item in items], per_announcement)
+        for item in items:
+            item['comments'] = threads[item['id']]['comments']
+            item['comments_cursor'] = threads[item['id']]['next_cursor']
+    
+    response = jsonify(items)
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers['X-Next-Cursor'] = str(cursor)
+    return response
+
+@announcements_bp.route('/api/courses/<int:course_id>/announcements', methods=['POST'])
+@jwt_required()
+@role_required(['teacher', 'admin'])
+def create_announcement(course_id):
     data = request.get_json()
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
+    
+    # Verificar que el usuario sea el profesor del curso
+    course = Course.query.get_or_404(course_id)
+    if course.teacher_id != current_user_id:
+        return jsonify({'message': 'No tienes permisos para crear anuncios en este curso'}), 403
     
-    comment = Comment(
+    announcement = Announcement(
+        title=data['title'],
         content=data['content'],
-        author_id=current_user_id,
-        announcement_id=announcement_id
+        is_pinned=bool(data.get('is_pinned')),
+        course_id=course_id,
+        author_id=current_user_id
     )
     
     try:
-        db.session.add(comment)
+        db.session.add(announcement)
+        db.session.flush()
+        # Notificaciones y correos a los estudiantes los envía un worker; el
+        # trabajo y el evento del stream se confirman junto con el anuncio
+        with session_cursor(db.session) as cur:
+            enqueue('announcement_created', {'announcement_id': announcement.id}, cur=cur)
+            stream.publish(course_id, 'announcement', announcement.id, current_user_id,
+                           announcement.title, announcement.content, cur=cur)
         db.session.commit()
         
+        invalidate(course_tag(course_id))
+        
         return jsonify({
-            'message': 'Comentario creado exitosamente',
-            'comment': {
-                'id': comment.id,
-                'content': comment.content
+            'message': 'Anuncio creado exitosamente',
+            'announcement': {
+                'id': announcement.id,
+                'title': announcement.title
             }
         }), 201
     except Exception as e:
         db.session.rollback()
-        return jsonify({'message': 'Error al crear comentario'}), 500
+        return jsonify({'message': 'Error al crear anuncio'}), 500
+
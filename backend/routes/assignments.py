@@ -10,11 +10,25 @@ import uuid
 import mimetypes
 from functools import wraps
 from config import Config
-from db import query_one, query_all, execute
+from db import query_one, query_all, execute, session_cursor
 import bcrypt
 from email_config import init_mail, send_verification_email, send_notification_email, generate_verification_token
 from routes.roles import role_required
-from routes.notifications import create_notification
+from jobs import enqueue
+import stream
+from permissions import resolve_assignment_access, VISIBLE_COURSES_SQL
+from routes.files import thumbnail_url
+from conditional import conditional_get
+from serializers import serialize_assignment, serialize_submission
+from response_cache import (
+    cached_response,
+    remember,
+    invalidate,
+    course_scope,
+    assignment_scope,
+    course_tag,
+    assignment_tag
+)
 
 assignments_bp = Blueprint('assignments', __name__)
 
@@ -37,80 +51,95 @@ models_db.init_app(app)
 db = models_db
 
 
+# Versión de /api/assignments para el ETag: tareas de los cursos visibles,
+# nombres de esos cursos y mis entregas
+ALL_ASSIGNMENTS_VERSION_SQL = f"""
+    SELECT COUNT(*) AS count, SUM(a.id) AS ids, MAX(a.updated_at) AS updated_at,
+           MAX(c.updated_at) AS courses_updated_at,
+           (SELECT MAX(s.updated_at) FROM assignment_submissions s
+            WHERE s.student_id = %(user_id)s) AS submissions_updated_at
+    FROM ({VISIBLE_COURSES_SQL}) AS mine
+    JOIN courses c ON c.id = mine.course_id
+    JOIN assignments a ON a.course_id = c.id
+"""
+
+
+ALL_ASSIGNMENTS_SQL = f"""
+    SELECT a.id, a.title, a.description, a.due_date, a.max_points, a.allow_late_submissions,
+           a.is_archived, a.created_at, c.id AS course_id, c.name AS course_name,
+           s.status AS submission_status, s.submitted_at
+    FROM ({VISIBLE_COURSES_SQL}) AS mine
+    JOIN courses c ON c.id = mine.course_id
+    JOIN assignments a ON a.course_id = c.id
+    LEFT JOIN assignment_submissions s ON s.assignment_id = a.id AND s.student_id = %(user_id)s
+    WHERE a.is_archived = FALSE OR %(include_archived)s
+"""
+
+SUBMISSIONS_SQL = """
+    SELECT s.id, s.content, s.points_earned, s.feedback, s.status,
+           s.submitted_at, s.graded_at, s.created_at,
+           u.id AS student_id, u.first_name, u.last_name, u.email
+    FROM assignment_submissions s
+    JOIN users u ON u.id = s.student_id
+    WHERE s.assignment_id = %s
+"""
+
+
+def all_assignments_version(user_id):
+    return query_one(ALL_ASSIGNMENTS_VERSION_SQL, {'user_id': user_id})
+
    
 # Rutas de gestión de tareas
 @assignments_bp.route('/api/assignments', methods=['GET'])
 @jwt_required()
+@conditional_get(all_assignments_version)
 def get_all_assignments():
     current_user_id = int(get_jwt_identity())
-    user = User.query.get(current_user_id)
+    user = query_one("SELECT role FROM users WHERE id = %s", (current_user_id,))
+    if not user:
+        return jsonify({'message': 'Usuario no encontrado'}), 404
     include_archived = request.args.get('include_archived', 'false').lower() == 'true'
 
-    assignments = []
-    if user.role == 'teacher':
-        # Profesores: tareas de sus cursos
-        courses = Course.query.filter_by(teacher_id=current_user_id).all()
-        course_ids = [c.id for c in courses]
-        q = Assignment.query.filter(Assignment.course_id.in_(course_ids))
-        if not include_archived:
-            q = q.filter_by(is_archived=False)
-        assignments = q.all()
-    elif user.role == 'student':
-        # Estudiantes: tareas de cursos donde están inscritos
-        enrollments = CourseEnrollment.query.filter_by(student_id=current_user_id).all()
-        course_ids = [e.course_id for e in enrollments]
-        q = Assignment.query.filter(Assignment.course_id.in_(course_ids))
-        if not include_archived:
-            q = q.filter_by(is_archived=False)
-        assignments = q.all()
-        # Cargar estado de mi entrega para cada tarea
-        assignment_ids = [a.id for a in assignments]
-        submissions = AssignmentSubmission.query.with_entities(
-            AssignmentSubmission.assignment_id,
-            AssignmentSubmission.status,
-            AssignmentSubmission.submitted_at
-        ).filter(
-            AssignmentSubmission.student_id == current_user_id,
-            AssignmentSubmission.assignment_id.in_(assignment_ids)
-        ).all()
-        sub_map = {aid: {'status': status, 'submitted_at': (submitted_at.isoformat() if submitted_at else None)} for aid, status, submitted_at in submissions}
-    else:  # admin
-        q = Assignment.query
-        if not include_archived:
-            q = q.filter_by(is_archived=False)
-        assignments = q.all()
+    # Tareas de los cursos que dicto, curso o (admin) de todos, con mi entrega
+    rows = query_all(ALL_ASSIGNMENTS_SQL, {'user_id': current_user_id, 'include_archived': include_archived})
+    is_student = user['role'] == 'student'
 
-    return jsonify([{
-        'id': a.id,
-        'title': a.title,
-        'description': a.description,
-        'due_date': a.due_date.isoformat(),
-        'max_points': float(a.max_points),
-        'allow_late_submissions': a.allow_late_submissions,
-        'is_archived': a.is_archived,
-        'course': {
-            'id': a.course.id,
-            'name': a.course.name
-        },
-        'created_at': a.created_at.isoformat() if a.created_at else None,
+    assignments = []
+    for row in rows:
+        assignment = serialize_assignment(row)
+        assignment['course'] = {'id': row['course_id'], 'name': row['course_name']}
         # Incluir mi entrega solo si soy estudiante
-        **({'submission': sub_map.get(a.id)} if user.role == 'student' else {})
-    } for a in assignments])
+        if is_student:
+            assignment['submission'] = {
+                'status': row['submission_status'],
+                'submitted_at': row['submitted_at']
+            } if row['submission_status'] else None
+        assignments.append(assignment)
+    return jsonify(assignments)
+
+def course_assignments(course_id, include_archived):
+    q = Assignment.query.filter_by(course_id=course_id)
+    if not include_archived:
+        q = q.filter_by(is_archived=False)
+    return [serialize_assignment(assignment) for assignment in q.all()]
 
 @assignments_bp.route('/api/courses/<int:course_id>/assignments', methods=['GET'])
 @jwt_required()
 def get_assignments(course_id):
     include_archived = request.args.get('include_archived', 'false').lower() == 'true'
-    q = Assignment.query.filter_by(course_id=course_id)
-    if not include_archived:
-        q = q.filter_by(is_archived=False)
-    assignments = q.all()
+    # El listado es el mismo para todo el curso y sale de la caché; la entrega
+    # de cada estudiante se agrega después
+    assignments = remember(
+        'course_assignments', [course_tag(course_id)],
+        lambda: course_assignments(course_id, include_archived),
+        course_id, include_archived
+    )
     # Si es estudiante, adjuntar su estado de entrega
     current_user_id = int(get_jwt_identity())
     user = User.query.get(current_user_id)
     sub_map = {}
     if user and user.role == 'student' and assignments:
-        assignment_ids = [a.id for a in assignments]
+        assignment_ids = [a['id'] for a in assignments]
         submissions = AssignmentSubmission.query.with_entities(
             AssignmentSubmission.assignment_id,
             AssignmentSubmission.status,
@@ -122,15 +151,8 @@ def get_assignments(course_id):
         sub_map = {aid: {'status': status, 'submitted_at': (submitted_at.isoformat() if submitted_at else None)} for aid, status, submitted_at in submissions}
     
     return jsonify([{
-        'id': assignment.id,
-        'title': assignment.title,
-        'description': assignment.description,
-        'due_date': assignment.due_date.isoformat(),
-        'max_points': float(assignment.max_points),
-        'allow_late_submissions': assignment.allow_late_submissions,
-        'is_archived': assignment.is_archived,
-        'created_at': assignment.created_at.isoformat(),
-        **({'submission': sub_map.get(assignment.id)} if user and user.role == 'student' else {})
+        **assignment,
+        **({'submission': sub_map.get(assignment['id'])} if user and user.role == 'student' else {})
     } for assignment in assignments])
 
 @assignments_bp.route('/api/courses/<int:course_id>/assignments', methods=['POST'])
@@ -156,22 +178,16 @@ def create_assignment(course_id):
     
     try:
         db.session.add(assignment)
+        db.session.flush()
+        # Notificaciones y correos a los estudiantes los envía un worker; el
+        # trabajo y el evento del stream se confirman junto con la tarea
+        with session_cursor(db.session) as cur:
+            enqueue('assignment_created', {'assignment_id': assignment.id}, cur=cur)
+            stream.publish(course_id, 'assignment', assignment.id, current_user_id,
+                           assignment.title, assignment.description, cur=cur)
         db.session.commit()
         
-        # Crear notificaciones para todos los estudiantes del curso
-        students = query_all(
-            "SELECT student_id FROM course_enrollments WHERE course_id = %s",
-            (course_id,)
-        )
-        
-        for student in students:
-            create_notification(
-                user_id=student['student_id'],
-                title=f"Nueva tarea: {assignment.title}",
-                message=f"Se ha creado una nueva tarea en {course.name}. Fecha límite: {assignment.due_date.strftime('%d/%m/%Y %H:%M')}",
-                notification_type='assignment',
-                related_id=assignment.id
-            )
+        invalidate(course_tag(course_id))
         
         return jsonify({
             'message': 'Tarea creada exitosamente',
@@ -205,7 +221,10 @@ def update_assignment(assignment_id):
     if 'allow_late_submissions' in data:
         assignment.allow_late_submissions = data.get('allow_late_submissions')
     try:
+        with session_cursor(db.session) as cur:
+            stream.update_item('assignment', assignment.id, assignment.title, assignment.description, cur=cur)
         db.session.commit()
+        invalidate(course_tag(assignment.course_id), assignment_tag(assignment.id))
         return jsonify({'message': 'Tarea actualizada'}), 200
     except Exception:
         db.session.rollback()
@@ -224,6 +243,7 @@ def archive_assignment(assignment_id):
     assignment.is_archived = bool(data.get('is_archived', True))
     try:
         db.session.commit()
+        invalidate(course_tag(assignment.course_id), assignment_tag(assignment.id))
         return jsonify({'message': 'Estado de archivo actualizado', 'is_archived': assignment.is_archived}), 200
     except Exception:
         db.session.rollback()
@@ -238,9 +258,13 @@ def delete_assignment(assignment_id):
     assignment = Assignment.query.get_or_404(assignment_id)
     if assignment.course.teacher_id != current_user_id:
         return jsonify({'message': 'No tienes permisos para borrar esta tarea'}), 403
+    course_id = assignment.course_id
     try:
         db.session.delete(assignment)
+        with session_cursor(db.session) as cur:
+            stream.retract(('assignment', 'grade'), assignment_id, cur=cur)
         db.session.commit()
+        invalidate(course_tag(course_id), assignment_tag(assignment_id))
         return jsonify({'message': 'Tarea eliminada'}), 200
     except Exception:
         db.session.rollback()
@@ -351,6 +375,14 @@ def grade_submission(submission_id):
     submission.status = 'graded'
     
     try:
+        assignment = submission.assignment
+        with session_cursor(db.session) as cur:
+            enqueue('submission_graded', {'submission_id': submission.id}, cur=cur)
+            stream.publish(
+                assignment.course_id, 'grade', assignment.id, current_user_id, assignment.title,
+                f"Calificación: {submission.points_earned if submission.points_earned is not None else 'N/A'}/{assignment.max_points}",
+                user_id=submission.student_id, cur=cur
+            )
         db.session.commit()
         return jsonify({'message': 'Calificación guardada exitosamente'})
     except Exception as e:
@@ -360,6 +392,7 @@ def grade_submission(submission_id):
 # Rutas adicionales para detalles
 @assignments_bp.route('/api/courses/<int:course_id>', methods=['GET'])
 @jwt_required()
+@cached_response(tags=lambda user_id, course_id: [course_tag(course_id)], scope=course_scope)
 def get_course_detail(course_id):
     try:
         current_user_id = int(get_jwt_identity())
@@ -424,6 +457,7 @@ def get_course_detail(course_id):
 
 @assignments_bp.route('/api/assignments/<int:assignment_id>', methods=['GET'])
 @jwt_required()
+@cached_response(tags=lambda user_id, assignment_id: [assignment_tag(assignment_id)], scope=assignment_scope)
 def get_assignment_detail(assignment_id):
     try:
         current_user_id = int(get_jwt_identity())
@@ -485,97 +519,31 @@ def get_assignment_submissions(assignment_id):
     if assignment.course.teacher_id != current_user_id:
         return jsonify({'message': 'No tienes permisos para ver las entregas de esta tarea'}), 403
     
-    submissions = AssignmentSubmission.query.filter_by(assignment_id=assignment_id).all()
+    # Entregas y estudiantes en una sola consulta
+    submissions = query_all(SUBMISSIONS_SQL, (assignment_id,))
     
     return jsonify([{
-        'id': submission.id,
+        **serialize_submission(submission),
         'student': {
-            'id': submission.student.id,
-            'first_name': submission.student.first_name,
-            'last_name': submission.student.last_name,
-            'email': submission.student.email
-        },
-        'content': submission.content,
-        'points_earned': float(submission.points_earned) if submission.points_earned else None,
-        'feedback': submission.feedback,
-        'status': submission.status,
-        'submitted_at': submission.submitted_at.isoformat() if submission.submitted_at else None,
-        'graded_at': submission.graded_at.isoformat() if submission.graded_at else None,
-        'created_at': submission.created_at.isoformat()
+            'id': submission['student_id'],
+            'first_name': submission['first_name'],
+            'last_name': submission['last_name'],
+            'email': submission['email']
+        }
     } for submission in submissions])
 
-# Rutas de gestión de anuncios
-@app.route('/api/courses/<int:course_id>/announcements', methods=['GET'])
-@jwt_required()
-def get_announcements(course_id):
-    announcements = Announcement.query.filter_by(course_id=course_id).order_by(Announcement.created_at.desc()).all()
-    
-    return jsonify([{
-        'id': announcement.id,
-        'title': announcement.title,
-        'content': announcement.content,
-        'is_pinned': announcement.is_pinned,
-        'author': {
-            'id': announcement.author.id,
-            'first_name': announcement.author.first_name,
-            'last_name': announcement.author.last_name
-        },
-        'created_at': announcement.created_at.isoformat()
-    } for announcement in announcements])
-
-@app.route('/api/courses/<int:course_id>/announcements', methods=['POST'])
-@jwt_required()
-@role_required(['teacher', 'admin'])
-def create_announcement(course_id):
-    data = request.get_json()
-    current_user_id = int(get_jwt_identity())
-    
-    # Verificar que el usuario sea el profesor del curso
-    course = Course.query.get_or_404(course_id)
-    if course.teacher_id != current_user_id:
-        return jsonify({'message': 'No tienes permisos para crear anuncios en este curso'}), 403
-    
-    announcement = Announcement(
-        title=data['title'],
-        content=data['content'],
-        is_pinned=data.get('is_pinned', False),
-        course_id=course_id,
-        author_id=current_user_id
-    )
-    
-    try:
-        db.session.add(announcement)
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Anuncio creado exitosamente',
-            'announcement': {
-                'id': announcement.id,
-                'title': announcement.title
-            }
-        }), 201
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'message': 'Error al crear anuncio'}), 500
-
-
 @assignments_bp.route('/api/assignments/<int:assignment_id>/files', methods=['GET'])
 @jwt_required()
+@cached_response(tags=lambda user_id, assignment_id: [assignment_tag(assignment_id)], scope=assignment_scope)
 def get_assignment_files(assignment_id):
     current_user_id = int(get_jwt_identity())
     
-    # Verificar acceso a la tarea
-    assignment = Assignment.query.get_or_404(assignment_id)
-    
-    # Verificar permisos
-    if assignment.course.teacher_id != current_user_id:
-        # Verificar si el usuario está inscrito en el curso
-        enrollment = CourseEnrollment.query.filter_by(
-            student_id=current_user_id,
-            course_id=assignment.course_id
-        ).first()
-        if not enrollment:
-            return jsonify({'message': 'No tienes permisos para ver estos archivos'}), 403
+    # Verificar acceso a la tarea en una sola consulta
+    has_access = resolve_assignment_access(current_user_id, assignment_id)
+    if has_access is None:
+        return jsonify({'message': 'Tarea no encontrada'}), 404
+    if not has_access:
+        return jsonify({'message': 'No tienes permisos para ver estos archivos'}), 403
     
     files = FileAttachment.query.filter_by(assignment_id=assignment_id).all()
     
@@ -584,5 +552,6 @@ def get_assignment_files(assignment_id):
         'filename': file.original_filename,
         'size': file.file_size,
         'mime_type': file.mime_type,
+        'thumbnail_url': thumbnail_url(file),
         'uploaded_at': file.created_at.isoformat()
     } for file in files])
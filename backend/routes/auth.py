@@ -12,6 +12,7 @@ from functools import wraps
 from config import Config
 from db import query_one, query_all, execute
 import bcrypt
+from avatars import avatar_urls
 from email_config import init_mail, send_verification_email, send_notification_email, generate_verification_token
 
 
@@ -207,23 +208,33 @@ def login():
             pass
     return jsonify({'message': 'Credenciales inválidas'}), 401
 
+
+CURRENT_USER_SQL = (
+    "SELECT id, email, first_name, last_name, role, avatar, unread_messages, created_at FROM users WHERE id=%s"
+)
+
+
+def serialize_current_user(user):
+    return {
+        'id': user['id'],
+        'email': user['email'],
+        'first_name': user['first_name'],
+        'last_name': user['last_name'],
+        'role': user['role'],
+        'avatar': user['avatar'],
+        'avatar_urls': avatar_urls(user['avatar']),
+        'unread_messages': user['unread_messages'],
+        'created_at': user['created_at'].isoformat() if user['created_at'] else None
+    }
+
+
 @auth_bp.route('/api/auth/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
     current_user_id = get_jwt_identity()
-    user = query_one(
-        "SELECT id, email, first_name, last_name, role, created_at FROM users WHERE id=%s",
-        (current_user_id,)
-    )
+    user = query_one(CURRENT_USER_SQL, (current_user_id,))
 
     if not user:
         return jsonify({'message': 'Usuario no encontrado'}), 404
     
-    return jsonify({
-        'id': user['id'],
-        'email': user['email'],
-        'first_name': user['first_name'],
-        'last_name': user['last_name'],
-        'role': user['role'],
-        'created_at': user['created_at'].isoformat() if user['created_at'] else None
-    })
\ No newline at end of file
+    return jsonify(serialize_current_user(user))
\ No newline at end of file
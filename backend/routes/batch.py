@@ -0,0 +1,97 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from db import pinned_connection
+
+
+batch_bp = Blueprint('batch', __name__)
+
+# Varias llamadas a la API en una sola petición HTTP. Cada sub-petición pasa
+# por el despacho normal de Flask (mismas rutas, permisos y errores) dentro de
+# este proceso, con el token de la petición externa, su propio contexto de
+# aplicación y una sola conexión del pool para todas. La verificación del
+# token se repite en cada ruta, pero es una comprobación local de la firma; lo
+# que se ahorra es el ida y vuelta.
+
+MAX_BATCH_REQUESTS = 20
+BATCH_METHODS = {'GET', 'POST', 'PUT', 'DELETE'}
+BATCH_PATH = '/api/batch'
+# Cabeceras de la sub-respuesta que le sirven al cliente
+FORWARDED_HEADERS = ('Content-Type', 'ETag', 'Cache-Control', 'Location', 'X-Next-Cursor')
+
+
+def invalid_sub_request(sub):
+    if not isinstance(sub, dict):
+        return 'Cada sub-petición debe ser un objeto'
+    method = str(sub.get('method', 'GET')).upper()
+    path = sub.get('path')
+    if method not in BATCH_METHODS:
+        return f"Método no permitido: {method}"
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        return 'La ruta debe comenzar con /api/'
+    if 'headers' in sub and not isinstance(sub['headers'], dict):
+        return 'headers debe ser un objeto'
+    return None
+
+
+def dispatch(sub):
+    """Ejecuta una sub-petición y retorna (status, cabeceras, cuerpo)"""
+    # Sin Accept-Encoding: el cuerpo se lee como JSON y la respuesta del lote se comprime entera
+    headers = {name: value for name, value in (sub.get('headers') or {}).items()
+               if name.lower() != 'accept-encoding'}
+    if 'Authorization' in request.headers:
+        headers['Authorization'] = request.headers['Authorization']
+
+    # Contexto de aplicación propio: g y la sesión del ORM no se comparten con
+    # la petición externa ni con las demás sub-peticiones, así un error en una
+    # no deja la sesión fallida para las siguientes
+    with current_app.app_context(), current_app.test_request_context(
+        sub['path'],
+        method=str(sub.get('method', 'GET')).upper(),
+        headers=headers,
+        json=sub.get('body')
+    ):
+        # Se compara la ruta resuelta, no el texto: '/api/%62atch' o '/api//batch'
+        # también llegan a esta vista
+        if request.endpoint == 'batch.batch':
+            return 400, {}, {'message': 'No se puede anidar /api/batch'}
+        try:
+            response = current_app.full_dispatch_request()
+        except Exception as e:
+            current_app.logger.exception(e)
+            return 500, {}, {'message': 'Error interno del servidor'}
+        try:
+            # Sólo se devuelven cuerpos JSON; las descargas se piden por separado
+            body = response.get_json(silent=True) if response.is_json else None
+            forwarded = {name: response.headers[name] for name in FORWARDED_HEADERS if name in response.headers}
+            return response.status_code, forwarded, body
+        finally:
+            response.close()
+
+
+@batch_bp.route(BATCH_PATH, methods=['POST'])
+@jwt_required()
+def batch():
+    """
+    {"requests": [{"id": "a", "method": "GET", "path": "/api/assignments/1"}, ...]}
+    -> {"responses": [{"id": "a", "status": 200, "headers": {...}, "body": {...}}, ...]}
+    Las sub-peticiones se ejecutan en orden; una falla no detiene a las demás.
+    """
+    data = request.get_json(silent=True) or {}
+    subs = data.get('requests')
+    if not isinstance(subs, list) or not subs:
+        return jsonify({'message': 'Se requiere una lista de sub-peticiones en "requests"'}), 400
+    if len(subs) > MAX_BATCH_REQUESTS:
+        return jsonify({'message': f'Máximo {MAX_BATCH_REQUESTS} sub-peticiones por lote'}), 400
+
+    responses = []
+    with pinned_connection():
+        for index, sub in enumerate(subs):
+            sub_id = sub.get('id', index) if isinstance(sub, dict) else index
+            error = invalid_sub_request(sub)
+            if error:
+                responses.append({'id': sub_id, 'status': 400, 'headers': {}, 'body': {'message': error}})
+                continue
+            status, headers, body = dispatch(sub)
+            responses.append({'id': sub_id, 'status': status, 'headers': headers, 'body': body})
+
+    return jsonify({'responses': responses})
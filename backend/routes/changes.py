@@ -0,0 +1,97 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from db import query_one, query_all
+from config import Config
+from pagination import page_limit
+from permissions import MY_COURSES_SQL
+from changes import purged_up_to
+
+
+changes_bp = Blueprint('changes', __name__)
+
+# Cambios visibles para el usuario después de un cursor (id de change_log).
+# Cada rama recorre su propio índice y se corta a limit + 1 antes de mezclar:
+#   - cambios de todo el curso en sus cursos (course_id, id)
+#   - cambios que le conciernen a él (user_id, id)
+#   - entregas e inscripciones de otros en los cursos que dicta
+# Los ids se asignan al insertar y no al confirmar: una transacción más lenta
+# puede confirmar un id menor que otro ya entregado. Sólo se entregan filas
+# con CHANGES_SETTLE_SECONDS de antigüedad para no saltearlas.
+SETTLED = "l.created_at < NOW() - INTERVAL %(settle)s SECOND"
+
+CHANGE_COLUMNS = "l.id, l.entity_type, l.entity_id, l.course_id, l.operation"
+
+CHANGES_SQL = f"""
+    SELECT * FROM (
+        (SELECT {CHANGE_COLUMNS}
+         FROM change_log l
+         JOIN ({MY_COURSES_SQL}) AS mine ON mine.course_id = l.course_id
+         WHERE l.id > %(since)s AND l.user_id IS NULL AND {SETTLED}
+         ORDER BY l.id LIMIT %(limit)s)
+        UNION
+        (SELECT {CHANGE_COLUMNS}
+         FROM change_log l
+         WHERE l.user_id = %(user_id)s AND l.id > %(since)s AND {SETTLED}
+         ORDER BY l.id LIMIT %(limit)s)
+        UNION
+        (SELECT {CHANGE_COLUMNS}
+         FROM courses c
+         JOIN change_log l ON l.course_id = c.id
+         WHERE c.teacher_id = %(user_id)s AND l.id > %(since)s AND l.user_id IS NOT NULL AND {SETTLED}
+         ORDER BY l.id LIMIT %(limit)s)
+    ) AS visible
+    ORDER BY id
+    LIMIT %(limit)s
+"""
+
+def head_cursor():
+    # Recorre la clave primaria desde el final; sólo salta las filas más recientes
+    row = query_one(
+        f"SELECT l.id FROM change_log l WHERE {SETTLED} ORDER BY l.id DESC LIMIT 1",
+        {'settle': Config.CHANGES_SETTLE_SECONDS}
+    )
+    return row['id'] if row else 0
+
+
+@changes_bp.route('/api/changes', methods=['GET'])
+@jwt_required()
+def get_changes():
+    """
+    Sin ?since= retorna sólo el cursor actual (el cliente acaba de cargar todo).
+    Con ?since=<cursor> retorna lo que cambió después, una referencia por
+    entidad con su última operación, y el cursor para la siguiente llamada.
+    Si el cursor es anterior a lo que se conserva responde 410 y el cliente
+    debe volver a cargar todo.
+    """
+    current_user_id = int(get_jwt_identity())
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'changes': [], 'cursor': head_cursor(), 'has_more': False})
+    if since < purged_up_to():
+        return jsonify({'message': 'El cursor es demasiado antiguo; recarga los datos', 'reset': True}), 410
+
+    limit = page_limit(default=500, maximum=1000)
+    rows = query_all(CHANGES_SQL, {
+        'user_id': current_user_id,
+        'since': since,
+        'settle': Config.CHANGES_SETTLE_SECONDS,
+        'limit': limit + 1
+    })
+    page = rows[:limit]
+
+    # Varias escrituras sobre la misma entidad se reducen a la última
+    latest = {}
+    for row in page:
+        latest[(row['entity_type'], row['entity_id'])] = row
+    changes = sorted(latest.values(), key=lambda row: row['id'])
+
+    return jsonify({
+        'changes': [{
+            'type': row['entity_type'],
+            'id': row['entity_id'],
+            'course_id': row['course_id'],
+            'operation': row['operation']
+        } for row in changes],
+        'cursor': page[-1]['id'] if page else since,
+        'has_more': len(rows) > limit
+    })
@@ -0,0 +1,254 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from db import query_one, query_all, execute
+from avatars import avatar_url
+from response_cache import invalidate, course_tag
+from pagination import page_limit, after_id, next_cursor
+from permissions import (
+    MY_COURSES_SQL,
+    resolve_announcement_access,
+    resolve_assignment_access,
+    resolve_submission_access
+)
+
+
+comments_bp = Blueprint('comments', __name__)
+
+# La tabla comments se comparte entre anuncios, tareas y entregas. Cada padre
+# se recorre por su índice (columna, created_at) en orden ascendente, y los
+# autores de una página se cargan en una sola consulta.
+
+# padre -> (columna en comments, verificación de acceso, mensaje si no existe)
+COMMENT_PARENTS = {
+    'announcement': ('announcement_id', resolve_announcement_access, 'Anuncio no encontrado'),
+    'assignment': ('assignment_id', resolve_assignment_access, 'Tarea no encontrada'),
+    'submission': ('submission_id', resolve_submission_access, 'Entrega no encontrada'),
+}
+
+COMMENT_KEYSET = "AND (created_at > %(after_at)s OR (created_at = %(after_at)s AND id > %(after)s))"
+
+COMMENTS_PAGE_SQL = """
+    SELECT id, content, author_id, created_at
+    FROM comments
+    WHERE {column} = %(parent_id)s {keyset}
+    ORDER BY created_at ASC, id ASC
+    LIMIT %(limit)s
+"""
+
+# Primeros comentarios de varios padres a la vez: una rama por padre, cada una
+# recorre el índice (columna, created_at) de ese padre y se corta con LIMIT a
+# per_parent + 1 filas para saber si quedan más. Así no se leen todos los
+# comentarios de los padres pedidos.
+FIRST_COMMENTS_BRANCH_SQL = """
+    (SELECT id, content, author_id, created_at, {column} AS parent_id
+     FROM comments
+     WHERE {column} = %({param})s
+     ORDER BY created_at ASC, id ASC
+     LIMIT %(per_parent)s)
+"""
+
+VISIBLE_ANNOUNCEMENTS_SQL = f"""
+    SELECT an.id
+    FROM announcements an
+    JOIN ({MY_COURSES_SQL}) AS mine ON mine.course_id = an.course_id
+    WHERE an.id IN ({{placeholders}})
+"""
+
+MAX_BATCH_PARENTS = 50
+MAX_COMMENTS_PER_PARENT = 20
+
+
+def in_params(values, prefix='id'):
+    """Placeholders nombrados para un IN (...) y sus valores"""
+    params = {f"{prefix}{i}": value for i, value in enumerate(values)}
+    return ', '.join(f"%({name})s" for name in params), params
+
+
+def load_authors(rows):
+    """{id: autor} de todos los autores de las filas, en una sola consulta"""
+    author_ids = sorted({row['author_id'] for row in rows})
+    if not author_ids:
+        return {}
+    placeholders, params = in_params(author_ids)
+    users = query_all(
+        f"SELECT id, first_name, last_name, avatar FROM users WHERE id IN ({placeholders})",
+        params
+    )
+    return {user['id']: {
+        'id': user['id'],
+        'first_name': user['first_name'],
+        'last_name': user['last_name'],
+        'avatar': avatar_url(user['avatar'], 32)
+    } for user in users}
+
+
+def serialize_comment(row, authors):
+    return {
+        'id': row['id'],
+        'content': row['content'],
+        'author': authors.get(row['author_id']),
+        'created_at': row['created_at'].isoformat()
+    }
+
+
+def first_comments(parent, parent_ids, per_parent):
+    """
+    {id del padre: {'comments': [...], 'next_cursor': ...}} con los primeros
+    per_parent comentarios de cada padre. No verifica acceso: el llamador ya
+    filtró parent_ids.
+    """
+    result = {parent_id: {'comments': [], 'next_cursor': None} for parent_id in parent_ids}
+    if not parent_ids:
+        return result
+
+    column = COMMENT_PARENTS[parent][0]
+    _, params = in_params(parent_ids)
+    sql = ' UNION ALL '.join(
+        FIRST_COMMENTS_BRANCH_SQL.format(column=column, param=name) for name in params
+    ) + ' ORDER BY parent_id, created_at, id'
+    params['per_parent'] = per_parent + 1
+    rows = query_all(sql, params)
+    authors = load_authors(rows)
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row['parent_id'], []).append(row)
+    for parent_id, parent_rows in grouped.items():
+        result[parent_id] = {
+            'comments': [serialize_comment(row, authors) for row in parent_rows[:per_parent]],
+            'next_cursor': next_cursor(parent_rows, per_parent)
+        }
+    return result
+
+
+def check_parent_access(parent, parent_id):
+    """None si el usuario puede ver el padre, o la respuesta de error"""
+    _, resolve_access, not_found = COMMENT_PARENTS[parent]
+    has_access = resolve_access(int(get_jwt_identity()), parent_id)
+    if has_access is None:
+        return jsonify({'message': not_found}), 404
+    if not has_access:
+        return jsonify({'message': 'No tienes acceso a estos comentarios'}), 403
+    return None
+
+
+def list_comments(parent, parent_id):
+    """Página de comentarios, más antiguo primero; la siguiente se pide con ?after=<X-Next-Cursor>"""
+    denied = check_parent_access(parent, parent_id)
+    if denied:
+        return denied
+
+    column = COMMENT_PARENTS[parent][0]
+    limit = page_limit(default=50)
+    params = {'parent_id': parent_id, 'limit': limit + 1}
+    keyset = ''
+    cursor_id = after_id()
+    if cursor_id:
+        cursor = query_one(
+            f"SELECT created_at FROM comments WHERE id = %s AND {column} = %s",
+            (cursor_id, parent_id)
+        )
+        if cursor:
+            keyset = COMMENT_KEYSET
+            params.update(after_at=cursor['created_at'], after=cursor_id)
+
+    rows = query_all(COMMENTS_PAGE_SQL.format(column=column, keyset=keyset), params)
+    page = rows[:limit]
+    authors = load_authors(page)
+
+    response = jsonify([serialize_comment(row, authors) for row in page])
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers['X-Next-Cursor'] = str(cursor)
+    return response
+
+
+def create_comment(parent, parent_id):
+    denied = check_parent_access(parent, parent_id)
+    if denied:
+        return denied
+
+    data = request.get_json() or {}
+    content = (data.get('content') or '').strip()
+    if not content:
+        return jsonify({'message': 'El comentario no puede estar vacío'}), 400
+
+    column = COMMENT_PARENTS[parent][0]
+    try:
+        comment_id, _ = execute(
+            f"INSERT INTO comments (content, author_id, {column}) VALUES (%s, %s, %s)",
+            (content, int(get_jwt_identity()), parent_id)
+        )
+    except Exception:
+        return jsonify({'message': 'Error al crear comentario'}), 500
+
+    if parent == 'announcement':
+        # El feed de anuncios del curso incluye comentarios y su cantidad
+        row = query_one("SELECT course_id FROM announcements WHERE id = %s", (parent_id,))
+        if row:
+            invalidate(course_tag(row['course_id']))
+
+    return jsonify({
+        'message': 'Comentario creado exitosamente',
+        'comment': {
+            'id': comment_id,
+            'content': content
+        }
+    }), 201
+
+
+# Rutas de comentarios por padre
+@comments_bp.route('/api/announcements/<int:announcement_id>/comments', methods=['GET'])
+@jwt_required()
+def get_announcement_comments(announcement_id):
+    return list_comments('announcement', announcement_id)
+
+@comments_bp.route('/api/announcements/<int:announcement_id>/comments', methods=['POST'])
+@jwt_required()
+def create_announcement_comment(announcement_id):
+    return create_comment('announcement', announcement_id)
+
+@comments_bp.route('/api/assignments/<int:assignment_id>/comments', methods=['GET'])
+@jwt_required()
+def get_assignment_comments(assignment_id):
+    return list_comments('assignment', assignment_id)
+
+@comments_bp.route('/api/assignments/<int:assignment_id>/comments', methods=['POST'])
+@jwt_required()
+def create_assignment_comment(assignment_id):
+    return create_comment('assignment', assignment_id)
+
+@comments_bp.route('/api/submissions/<int:submission_id>/comments', methods=['GET'])
+@jwt_required()
+def get_submission_comments(submission_id):
+    return list_comments('submission', submission_id)
+
+@comments_bp.route('/api/submissions/<int:submission_id>/comments', methods=['POST'])
+@jwt_required()
+def create_submission_comment(submission_id):
+    return create_comment('submission', submission_id)
+
+@comments_bp.route('/api/announcements/comments', methods=['GET'])
+@jwt_required()
+def get_announcements_comments():
+    """Primeros comentarios de varios anuncios: ?ids=1,2,3&limit=3"""
+    current_user_id = int(get_jwt_identity())
+    try:
+        requested = [int(value) for value in request.args.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return jsonify({'message': 'ids debe ser una lista de números separados por coma'}), 400
+    requested = list(dict.fromkeys(requested))
+    if not requested:
+        return jsonify({'message': 'Se requiere al menos un anuncio'}), 400
+    if len(requested) > MAX_BATCH_PARENTS:
+        return jsonify({'message': f'Máximo {MAX_BATCH_PARENTS} anuncios por solicitud'}), 400
+
+    placeholders, params = in_params(requested)
+    params['user_id'] = current_user_id
+    visible = {row['id'] for row in query_all(VISIBLE_ANNOUNCEMENTS_SQL.format(placeholders=placeholders), params)}
+    # Los anuncios inexistentes o ajenos simplemente no aparecen en la respuesta
+    announcement_ids = [announcement_id for announcement_id in requested if announcement_id in visible]
+
+    per_parent = page_limit(default=3, maximum=MAX_COMMENTS_PER_PARENT)
+    threads = first_comments('announcement', announcement_ids, per_parent)
+    return jsonify({str(announcement_id): thread for announcement_id, thread in threads.items()})
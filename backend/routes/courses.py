@@ -10,10 +10,16 @@ import uuid
 import mimetypes
 from functools import wraps
 from config import Config
-from db import query_one, query_all, execute
+from db import query_one, query_all, execute, transaction, session_cursor
+from changes import record, change_entry
 import bcrypt
 from routes.roles import role_required
 from routes.files import allowed_file
+from avatars import avatar_url
+from jobs import enqueue
+from response_cache import cached_response, invalidate, own_scope, course_tag, user_tag
+from conditional import conditional_get
+from permissions import VISIBLE_COURSES_SQL
 
 
 from models import (
@@ -32,8 +38,47 @@ db = models_db
 courses_bp = Blueprint('courses', __name__)
 
 
+def serialize_course(r):
+    return {
+        'id': r['id'],
+        'name': r['name'],
+        'description': r.get('description'),
+        'section': r.get('section'),
+        'subject': r.get('subject'),
+        'room': r.get('room'),
+        'access_code': r.get('access_code'),
+        'is_active': bool(r.get('is_active')) if r.get('is_active') is not None else True,
+        'teacher': {
+            'id': r['teacher_id'],
+            'first_name': r['teacher_first_name'],
+            'last_name': r['teacher_last_name']
+        },
+        'created_at': r['created_at'].isoformat() if r.get('created_at') else None
+    }
+
+
+# Los administradores ven todos los cursos: crear uno invalida todos los listados
+ALL_COURSES_TAG = 'courses'
+
+# Versión de /api/courses para el ETag: qué cursos ve el usuario y la última
+# modificación de esos cursos y de sus profesores
+COURSES_VERSION_SQL = f"""
+    SELECT COUNT(*) AS count, SUM(c.id) AS ids,
+           MAX(c.updated_at) AS updated_at, MAX(t.updated_at) AS teachers_updated_at
+    FROM ({VISIBLE_COURSES_SQL}) AS mine
+    JOIN courses c ON c.id = mine.course_id
+    JOIN users t ON t.id = c.teacher_id
+"""
+
+
+def courses_version(user_id):
+    return query_one(COURSES_VERSION_SQL, {'user_id': user_id})
+
+
 @courses_bp.route('/api/courses', methods=['GET'])
 @jwt_required()
+@conditional_get(courses_version)
+@cached_response(tags=lambda user_id: [user_tag(user_id), ALL_COURSES_TAG], scope=own_scope)
 def get_courses():
     current_user_id = int(get_jwt_identity())
     # Resolver rol del usuario actual
@@ -76,25 +121,7 @@ def get_courses():
             """
         )
 
-    def map_course(r):
-        return {
-            'id': r['id'],
-            'name': r['name'],
-            'description': r.get('description'),
-            'section': r.get('section'),
-            'subject': r.get('subject'),
-            'room': r.get('room'),
-            'access_code': r.get('access_code'),
-            'is_active': bool(r.get('is_active')) if r.get('is_active') is not None else True,
-            'teacher': {
-                'id': r['teacher_id'],
-                'first_name': r['teacher_first_name'],
-                'last_name': r['teacher_last_name']
-            },
-            'created_at': r['created_at'].isoformat() if r.get('created_at') else None
-        }
-
-    return jsonify([map_course(r) for r in rows])
+    return jsonify([serialize_course(r) for r in rows])
 
 @courses_bp.route('/api/courses', methods=['POST'])
 @jwt_required()
@@ -124,6 +151,7 @@ def create_course():
                 current_user_id,
             )
         )
+        invalidate(ALL_COURSES_TAG)
 
         return jsonify({
             'message': 'Curso creado exitosamente',
@@ -168,10 +196,14 @@ def enroll_by_code():
         return jsonify({'message': 'Ya estás inscrito en este curso'}), 400
 
     try:
-        execute(
-            "INSERT INTO course_enrollments (student_id, course_id) VALUES (%s, %s)",
-            (current_user_id, course_id)
-        )
+        with transaction() as cur:
+            cur.execute(
+                "INSERT INTO course_enrollments (student_id, course_id) VALUES (%s, %s)",
+                (current_user_id, course_id)
+            )
+            record(cur, [change_entry('enrollment', cur.lastrowid, course_id, current_user_id)])
+            enqueue('stream_backfill', {'user_id': current_user_id, 'course_id': course_id}, cur=cur)
+        invalidate(user_tag(current_user_id), course_tag(course_id))
         return jsonify({'message': 'Inscripción exitosa', 'course_id': course_id}), 201
     except Exception as e:
         return jsonify({'message': 'Error al inscribirse'}), 500
@@ -205,14 +237,17 @@ def enroll_in_course(course_id):
     
     try:
         db.session.add(enrollment)
+        with session_cursor(db.session) as cur:
+            enqueue('stream_backfill', {'user_id': current_user_id, 'course_id': course_id}, cur=cur)
         db.session.commit()
+        invalidate(user_tag(current_user_id), course_tag(course_id))
         
         return jsonify({'message': 'Inscripción exitosa'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'Error al inscribirse'}), 500
 
-@app.route('/api/courses/<int:course_id>/students', methods=['GET'])
+@courses_bp.route('/api/courses/<int:course_id>/students', methods=['GET'])
 @jwt_required()
 @role_required(['teacher', 'admin'])
 def get_course_students(course_id):
@@ -223,12 +258,20 @@ def get_course_students(course_id):
     if course.teacher_id != current_user_id:
         return jsonify({'message': 'No tienes permisos para ver los estudiantes de este curso'}), 403
     
-    enrollments = CourseEnrollment.query.filter_by(course_id=course_id).all()
+    # Estudiantes y avatares en una sola consulta
+    students = query_all("""
+        SELECT u.id, u.first_name, u.last_name, u.email, u.avatar, ce.enrolled_at
+        FROM course_enrollments ce
+        JOIN users u ON u.id = ce.student_id
+        WHERE ce.course_id = %s
+        ORDER BY u.last_name, u.first_name
+    """, (course_id,))
     
     return jsonify([{
-        'id': enrollment.student.id,
-        'first_name': enrollment.student.first_name,
-        'last_name': enrollment.student.last_name,
-        'email': enrollment.student.email,
-        'enrolled_at': enrollment.enrolled_at.isoformat()
-    } for enrollment in enrollments])
+        'id': student['id'],
+        'first_name': student['first_name'],
+        'last_name': student['last_name'],
+        'email': student['email'],
+        'avatar': avatar_url(student['avatar'], 64),
+        'enrolled_at': student['enrolled_at'].isoformat()
+    } for student in students])
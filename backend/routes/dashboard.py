@@ -0,0 +1,89 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from config import Config
+from db import query_one, query_all, gather
+from permissions import VISIBLE_COURSES_SQL
+from routes.auth import CURRENT_USER_SQL, serialize_current_user
+from routes.courses import serialize_course
+from routes.users import USER_STATS_SQL, serialize_stats
+
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+# Todo lo que la pantalla inicial pedía en cinco llamadas. Las consultas no
+# dependen entre sí (el rol se resuelve dentro del SQL), así que corren en
+# paralelo, cada una con su conexión del pool.
+
+DASHBOARD_COURSES_SQL = f"""
+    SELECT c.*, t.id AS teacher_id, t.first_name AS teacher_first_name, t.last_name AS teacher_last_name
+    FROM ({VISIBLE_COURSES_SQL}) AS mine
+    JOIN courses c ON c.id = mine.course_id
+    JOIN users t ON t.id = c.teacher_id
+    ORDER BY c.created_at DESC
+"""
+
+UPCOMING_ASSIGNMENTS_SQL = f"""
+    SELECT a.id, a.title, a.due_date, a.max_points, a.course_id, c.name AS course_name,
+           s.status, s.submitted_at, s.points_earned
+    FROM ({VISIBLE_COURSES_SQL}) AS mine
+    JOIN assignments a ON a.course_id = mine.course_id
+    JOIN courses c ON c.id = a.course_id
+    LEFT JOIN assignment_submissions s ON s.assignment_id = a.id AND s.student_id = %(user_id)s
+    WHERE a.is_archived = FALSE AND a.due_date >= UTC_TIMESTAMP()
+    ORDER BY a.due_date ASC
+    LIMIT %(limit)s
+"""
+
+UNREAD_NOTIFICATIONS_SQL = """
+    SELECT COUNT(*) AS count FROM notifications WHERE user_id = %(user_id)s AND is_read = FALSE
+"""
+
+UPCOMING_LIMIT = 10
+
+
+def serialize_upcoming(row):
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'due_date': row['due_date'].isoformat(),
+        'max_points': float(row['max_points']),
+        'course': {
+            'id': row['course_id'],
+            'name': row['course_name']
+        },
+        'submission': {
+            'status': row['status'],
+            'submitted_at': row['submitted_at'].isoformat() if row['submitted_at'] else None,
+            'points_earned': float(row['points_earned']) if row['points_earned'] is not None else None
+        } if row['status'] else None
+    }
+
+
+@dashboard_bp.route('/api/dashboard', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    """Usuario, cursos, próximas tareas con mi entrega, notificaciones sin leer y estadísticas"""
+    current_user_id = int(get_jwt_identity())
+    params = {'user_id': current_user_id, 'limit': UPCOMING_LIMIT}
+    results = gather(
+        user=lambda: query_one(CURRENT_USER_SQL, (current_user_id,)),
+        courses=lambda: query_all(DASHBOARD_COURSES_SQL, params),
+        upcoming=lambda: query_all(UPCOMING_ASSIGNMENTS_SQL, params),
+        unread=lambda: query_one(UNREAD_NOTIFICATIONS_SQL, params),
+        stats=lambda: query_one(USER_STATS_SQL, params)
+    )
+    if not results['user']:
+        return jsonify({'message': 'Usuario no encontrado'}), 404
+
+    response = jsonify({
+        'user': serialize_current_user(results['user']),
+        'courses': [serialize_course(row) for row in results['courses']],
+        'upcoming_assignments': [serialize_upcoming(row) for row in results['upcoming']],
+        'unread_notifications': results['unread']['count'],
+        'stats': serialize_stats(results['stats'])
+    })
+    # Privado y de vida corta: al volver a la pantalla el navegador revalida con If-None-Match
+    response.cache_control.private = True
+    response.cache_control.max_age = Config.DASHBOARD_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
@@ -1,10 +1,11 @@
-from flask import Flask, request, Blueprint, jsonify, send_file
+from flask import Flask, request, Blueprint, jsonify, send_file, Response, redirect
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
+from contextlib import closing
 import os
 import uuid
 import mimetypes
@@ -15,7 +16,16 @@ import bcrypt
 from email_config import init_mail, send_verification_email, send_notification_email, generate_verification_token
 from routes.roles import role_required
 from utils import allowed_file
-from routes.notifications import create_notification
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import get_input_stream
+import storage
+from blobs import store_blob, release_blob, remove_blob_file, open_blob, BUFFER_SIZE
+from ingest import ingest_stream, resolve_content_type, MultipartReader
+from permissions import resolve_file_access
+from zipstream import stream_zip
+from thumbnails import schedule_thumbnail
+from response_cache import invalidate, course_tag, assignment_tag
 
 from models import(
     db as models_db,
@@ -27,7 +37,12 @@ from models import(
     User
 )
 
-# Inicializar la instancia de models.db con la app y usarla localmente como d
+app = Flask(__name__)
+app.config.from_object(Config)
+
+# Inicializar la instancia de models.db con la app y usarla localmente como db
+models_db.init_app(app)
+db = models_db
 
 files_bp = Blueprint('files', __name__)
 
@@ -74,83 +89,293 @@ def get_mime_type_by_extension(extension):
     }
     return mime_types.get(extension.lower(), 'application/octet-stream')
 
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'zip', 'rar'}
+ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'zip', 'rar', 'mp4', 'mov'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Videos y comprimidos pueden superar MAX_FILE_SIZE usando la subida reanudable
+LARGE_FILE_EXTENSIONS = {'zip', 'rar', 'mp4', 'mov'}
+# Separadores y cabeceras del multipart, además del archivo
+MULTIPART_OVERHEAD = 64 * 1024
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def max_size_for(filename):
+    """Tamaño máximo permitido para un archivo según su extensión"""
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if extension in LARGE_FILE_EXTENSIONS:
+        return Config.MAX_LARGE_FILE_SIZE
+    return MAX_FILE_SIZE
+
+
+def detect_mime_type(filename):
+    """Detectar tipo MIME usando múltiples métodos"""
+    mime_type, _ = mimetypes.guess_type(filename)
+    if not mime_type:
+        # Fallback: detectar por extensión
+        file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        mime_type = get_mime_type_by_extension(file_extension)
+    return mime_type
+
+
+def parse_optional_id(value):
+    """Convierte un ID opcional recibido como texto o número"""
+    return int(value) if value else None
+
+
+def create_attachment(temp_path, sha256, size, mime_type, original_filename, uploaded_by,
+                      submission_id=None, assignment_id=None, announcement_id=None):
+    """Registra un archivo ya escrito en disco como referencia a su blob de contenido"""
+    blob = store_blob(temp_path, sha256, size, mime_type=mime_type)
+    attachment = FileAttachment(
+        filename=blob.sha256,
+        original_filename=original_filename,
+        file_path=blob.file_path,
+        file_size=blob.file_size,
+        mime_type=mime_type,
+        blob_id=blob.id,
+        submission_id=submission_id,
+        assignment_id=assignment_id,
+        announcement_id=announcement_id,
+        uploaded_by=uploaded_by
+    )
+    db.session.add(attachment)
+    db.session.commit()
+    invalidate(*attachment_tags(attachment))
+    return attachment
+
+
+def attachment_tags(attachment):
+    """Etiquetas de caché de los listados que muestran el adjunto o lo cuentan"""
+    tags = []
+    if attachment.assignment_id:
+        tags.append(assignment_tag(attachment.assignment_id))
+    if attachment.announcement_id:
+        # El feed de anuncios del curso incluye la cantidad de adjuntos
+        row = query_one("SELECT course_id FROM announcements WHERE id = %s", (attachment.announcement_id,))
+        if row:
+            tags.append(course_tag(row['course_id']))
+    return tags
+
+
+def thumbnail_url(attachment):
+    return f"/api/files/{attachment.id}/thumbnail" if attachment.thumbnail_path else None
+
+
+def serialize_attachment(attachment):
+    return {
+        'id': attachment.id,
+        'filename': attachment.original_filename,
+        'size': attachment.file_size,
+        'mime_type': attachment.mime_type,
+        'thumbnail_url': thumbnail_url(attachment)
+    }
+
+
+def offloaded_response(attachment, file_path):
+    """Respuesta vacía que le indica al servidor web qué archivo enviar (FILE_OFFLOAD_MODE)"""
+    response = Response(mimetype=attachment['mime_type'])
+    response.headers.set('Content-Disposition', 'attachment', filename=attachment['original_filename'])
+    if app.config['FILE_OFFLOAD_MODE'] == 'x-accel':
+        relative_path = os.path.relpath(file_path, app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = f"{app.config['FILE_OFFLOAD_PREFIX'].rstrip('/')}/{relative_path}"
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(file_path)
+    return response
+
+
+def attachment_response(attachment):
+    """
+    Respuesta de descarga con soporte de Range, If-None-Match e If-Modified-Since.
+    Con FILE_OFFLOAD_MODE el worker sólo autoriza y el servidor web envía los bytes.
+    Recibe la fila de resolve_file_access; el ETag es el SHA-256 del blob.
+    """
+    etag = attachment['sha256']
+    last_modified = attachment['created_at']
+    offload_mode = app.config['FILE_OFFLOAD_MODE']
+    file_path = storage.local_path(attachment['file_path'])
+    
+    if attachment['content_encoding']:
+        response = encoded_attachment_response(attachment, file_path)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.private = True
+        return response
+    
+    if file_path and not offload_mode:
+        response = send_file(
+            file_path,
+            as_attachment=True,
+            download_name=attachment['original_filename'],
+            mimetype=attachment['mime_type'],
+            conditional=True,
+            etag=etag or True,
+            last_modified=last_modified
+        )
+        response.cache_control.private = True
+        return response
+    
+    # Responder 304 sin involucrar al servidor web si el cliente ya tiene esta versión
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    elif not file_path:
+        # Backend remoto (S3/MinIO): el cliente descarga directo con una URL firmada
+        response = redirect(storage.presigned_url(
+            attachment['file_path'],
+            download_name=attachment['original_filename'],
+            mime_type=attachment['mime_type']
+        ))
+    else:
+        response = offloaded_response(attachment, file_path)
+    
+    if etag:
+        response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def encoded_attachment_response(attachment, file_path):
+    """
+    Descarga de un blob guardado comprimido. Si el cliente acepta la codificación
+    se envían los bytes tal como están (Content-Encoding), también a través del
+    servidor web con FILE_OFFLOAD_MODE; si no, se descomprime al vuelo y la
+    respuesta no admite Range.
+    """
+    encoding = attachment['content_encoding']
+    last_modified = attachment['created_at']
+    
+    if request.accept_encodings[encoding]:
+        # Representación distinta del mismo contenido: ETag propio
+        etag = f"{attachment['sha256']}.{encoding}"
+        if file_path and app.config['FILE_OFFLOAD_MODE']:
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = Response(status=304)
+            else:
+                response = offloaded_response(attachment, file_path)
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+        elif file_path:
+            response = send_file(
+                file_path,
+                as_attachment=True,
+                download_name=attachment['original_filename'],
+                mimetype=attachment['mime_type'],
+                conditional=True,
+                etag=etag,
+                last_modified=last_modified
+            )
+        elif not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response = Response(status=304)
+            response.set_etag(etag)
+        else:
+            response = redirect(storage.presigned_url(
+                attachment['file_path'],
+                download_name=attachment['original_filename'],
+                mime_type=attachment['mime_type'],
+                content_encoding=encoding
+            ))
+        if response.status_code != 302:
+            response.headers['Content-Encoding'] = encoding
+        return response
+    
+    etag = attachment['sha256']
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        def generate(source):
+            with closing(source):
+                for chunk in iter(lambda: source.read(BUFFER_SIZE), b''):
+                    yield chunk
+        
+        source = open_blob(attachment['file_path'], encoding)
+        response = Response(generate(source), mimetype=attachment['mime_type'])
+        response.headers.set('Content-Disposition', 'attachment', filename=attachment['original_filename'])
+        response.headers['Content-Length'] = str(attachment['file_size'])
+        response.headers['Accept-Ranges'] = 'none'
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+
 # Rutas para manejo de archivos
 @files_bp.route('/api/files/upload', methods=['POST'])
 @jwt_required()
 def upload_file():
     current_user_id = int(get_jwt_identity())
     
-    if 'file' not in request.files:
+    if request.mimetype != 'multipart/form-data' or not request.mimetype_params.get('boundary'):
         return jsonify({'message': 'No se seleccionó ningún archivo'}), 400
     
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'message': 'No se seleccionó ningún archivo'}), 400
-    
-    if not allowed_file(file.filename):
-        return jsonify({'message': 'Tipo de archivo no permitido'}), 400
-    
     try:
-        # Generar nombre único para el archivo
-        original_filename = secure_filename(file.filename)
-        file_extension = original_filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
+        # El formulario se lee una sola vez del stream de la petición (sin
+        # request.files). MAX_CONTENT_LENGTH no aplica aquí: el tope de la
+        # petición es el del tipo más grande y el de cada tipo se verifica al
+        # conocer el nombre y mientras llega el archivo
+        form = MultipartReader(
+            get_input_stream(
+                request.environ,
+                max_content_length=max(MAX_FILE_SIZE, Config.MAX_LARGE_FILE_SIZE) + MULTIPART_OVERHEAD
+            ),
+            request.mimetype_params['boundary'].encode()
+        )
+        filename = form.next_file('file')
+        if not filename:
+            return jsonify({'message': 'No se seleccionó ningún archivo'}), 400
         
-        # Guardar archivo
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
+        if not allowed_file(filename):
+            return jsonify({'message': 'Tipo de archivo no permitido'}), 400
         
-        # Obtener información del archivo
-        file_size = os.path.getsize(file_path)
+        original_filename = secure_filename(filename)
+        max_size = max_size_for(original_filename)
+        # Con Content-Length se rechaza antes de leer el archivo
+        if request.content_length and request.content_length > max_size + MULTIPART_OVERHEAD:
+            raise RequestEntityTooLarge()
         
-        # Detectar tipo MIME usando múltiples métodos
-        mime_type, _ = mimetypes.guess_type(file_path)
-        if not mime_type:
-            # Fallback: detectar por extensión
-            file_extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
-            mime_type = get_mime_type_by_extension(file_extension)
+        # Una sola lectura: temporal, SHA-256, límite de tamaño y tipo real del contenido
+        ingested = ingest_stream(form, storage.temp_folder(), max_size)
+        file_path = ingested.temp_path
+        form.finish()
         
-        # Obtener IDs opcionales de la request
-        submission_id = request.form.get('submission_id')
-        assignment_id = request.form.get('assignment_id')
-        announcement_id = request.form.get('announcement_id')
+        mime_type = resolve_content_type(ingested.mime_type, detect_mime_type(original_filename))
+        if not mime_type:
+            os.remove(file_path)
+            return jsonify({'message': 'El contenido del archivo no corresponde a su tipo'}), 400
         
-        # Crear registro en la base de datos
-        attachment = FileAttachment(
-            filename=unique_filename,
-            original_filename=original_filename,
-            file_path=file_path,
-            file_size=file_size,
-            mime_type=mime_type,
-            submission_id=int(submission_id) if submission_id else None,
-            assignment_id=int(assignment_id) if assignment_id else None,
-            announcement_id=int(announcement_id) if announcement_id else None,
-            uploaded_by=current_user_id
+        # Crear registro en la base de datos (reutiliza el blob si el contenido ya existe)
+        attachment = create_attachment(
+            file_path,
+            ingested.sha256,
+            ingested.size,
+            mime_type,
+            original_filename,
+            current_user_id,
+            submission_id=parse_optional_id(form.fields.get('submission_id')),
+            assignment_id=parse_optional_id(form.fields.get('assignment_id')),
+            announcement_id=parse_optional_id(form.fields.get('announcement_id'))
         )
-        
-        db.session.add(attachment)
-        db.session.commit()
+        schedule_thumbnail(attachment)
         
         return jsonify({
             'message': 'Archivo subido exitosamente',
-            'file': {
-                'id': attachment.id,
-                'filename': attachment.original_filename,
-                'size': attachment.file_size,
-                'mime_type': attachment.mime_type
-            }
+            'file': serialize_attachment(attachment)
         }), 201
         
+    except RequestEntityTooLarge:
+        if 'file_path' in locals() and os.path.exists(file_path):
+            os.remove(file_path)
+        return jsonify({'message': 'El archivo excede el tamaño permitido'}), 413
+    
+    except BadRequest:
+        if 'file_path' in locals() and os.path.exists(file_path):
+            os.remove(file_path)
+        return jsonify({'message': 'Formulario de subida inválido'}), 400
+        
     except Exception as e:
+        db.session.rollback()
         # Limpiar archivo si hay error
         if 'file_path' in locals() and os.path.exists(file_path):
             os.remove(file_path)
@@ -161,60 +386,106 @@ def upload_file():
 def download_file(file_id):
     current_user_id = int(get_jwt_identity())
     
-    attachment = FileAttachment.query.get_or_404(file_id)
+    # Verificar permisos de acceso y obtener los datos del archivo en una sola consulta
+    attachment = resolve_file_access(current_user_id, file_id)
+    if not attachment:
+        return jsonify({'message': 'Archivo no encontrado'}), 404
     
-    # Verificar permisos de acceso
-    has_access = False
+    if not attachment['can_read']:
+        return jsonify({'message': 'No tienes permisos para acceder a este archivo'}), 403
     
-    if attachment.submission_id:
-        # Verificar si es el estudiante que subió el archivo o el profesor del curso
-        submission = AssignmentSubmission.query.get(attachment.submission_id)
-        if submission:
-            if submission.student_id == current_user_id:
-                has_access = True
-            elif submission.assignment.course.teacher_id == current_user_id:
-                has_access = True
+    if not storage.exists(attachment['file_path']):
+        return jsonify({'message': 'Archivo no encontrado'}), 404
     
-    elif attachment.assignment_id:
-        # Verificar si es el profesor del curso o estudiante inscrito
-        assignment = Assignment.query.get(attachment.assignment_id)
-        if assignment:
-            if assignment.course.teacher_id == current_user_id:
-                has_access = True
-            else:
-                enrollment = CourseEnrollment.query.filter_by(
-                    student_id=current_user_id,
-                    course_id=assignment.course_id
-                ).first()
-                if enrollment:
-                    has_access = True
+    return attachment_response(attachment)
+
+@files_bp.route('/api/files/<int:file_id>/thumbnail', methods=['GET'])
+@jwt_required()
+def get_file_thumbnail(file_id):
+    current_user_id = int(get_jwt_identity())
     
-    elif attachment.announcement_id:
-        # Verificar acceso al anuncio
-        announcement = Announcement.query.get(attachment.announcement_id)
-        if announcement:
-            if announcement.course.teacher_id == current_user_id:
-                has_access = True
-            else:
-                enrollment = CourseEnrollment.query.filter_by(
-                    student_id=current_user_id,
-                    course_id=announcement.course_id
-                ).first()
-                if enrollment:
-                    has_access = True
+    attachment = resolve_file_access(current_user_id, file_id)
+    if not attachment:
+        return jsonify({'message': 'Archivo no encontrado'}), 404
     
-    if not has_access:
+    if not attachment['can_read']:
         return jsonify({'message': 'No tienes permisos para acceder a este archivo'}), 403
     
-    if not os.path.exists(attachment.file_path):
-        return jsonify({'message': 'Archivo no encontrado'}), 404
+    thumbnail = attachment['thumbnail_path']
+    if not thumbnail or not storage.exists(thumbnail):
+        return jsonify({'message': 'Vista previa no disponible'}), 404
+    
+    thumbnail_file = storage.local_path(thumbnail)
+    if not thumbnail_file:
+        return redirect(storage.presigned_url(thumbnail, mime_type='image/webp'))
     
-    return send_file(
-        attachment.file_path,
-        as_attachment=True,
-        download_name=attachment.original_filename,
-        mimetype=attachment.mime_type
+    # El contenido es inmutable para el adjunto: se puede cachear en el navegador
+    response = send_file(
+        thumbnail_file,
+        mimetype='image/webp',
+        conditional=True,
+        etag=f"{attachment['sha256']}-thumb" if attachment['sha256'] else True,
+        max_age=app.config['THUMBNAIL_MAX_AGE']
     )
+    response.cache_control.public = None
+    response.cache_control.private = True
+    return response
+
+@files_bp.route('/api/assignments/<int:assignment_id>/submissions/archive', methods=['GET'])
+@jwt_required()
+@role_required(['teacher', 'admin'])
+def download_submissions_archive(assignment_id):
+    """Descarga en un ZIP todos los adjuntos entregados para una tarea, por estudiante"""
+    current_user_id = int(get_jwt_identity())
+    
+    assignment = query_one("""
+        SELECT a.id, a.title, c.teacher_id
+        FROM assignments a
+        JOIN courses c ON c.id = a.course_id
+        WHERE a.id = %s
+    """, (assignment_id,))
+    
+    if not assignment:
+        return jsonify({'message': 'Tarea no encontrada'}), 404
+    
+    if assignment['teacher_id'] != current_user_id:
+        return jsonify({'message': 'No tienes permisos para ver las entregas de esta tarea'}), 403
+    
+    files = query_all("""
+        SELECT f.original_filename, f.file_path, f.created_at, b.content_encoding,
+               u.id AS student_id, u.first_name, u.last_name
+        FROM assignment_submissions s
+        JOIN users u ON u.id = s.student_id
+        JOIN file_attachments f ON f.submission_id = s.id
+        LEFT JOIN file_blobs b ON b.id = f.blob_id
+        WHERE s.assignment_id = %s
+        ORDER BY u.last_name, u.first_name, f.id
+    """, (assignment_id,))
+    
+    def archive_entries():
+        used_names = set()
+        for f in files:
+            folder = secure_filename(f"{f['last_name']} {f['first_name']}") or 'estudiante'
+            directory = f"{folder}_{f['student_id']}"
+            arcname = f"{directory}/{f['original_filename']}"
+            # Evitar nombres repetidos dentro de la carpeta del estudiante
+            base, extension = os.path.splitext(f['original_filename'])
+            counter = 1
+            while arcname in used_names:
+                counter += 1
+                arcname = f"{directory}/{base} ({counter}){extension}"
+            used_names.add(arcname)
+            yield arcname, (f['file_path'], f['content_encoding']), f['created_at']
+    
+    archive_name = secure_filename(f"{assignment['title']}_entregas.zip") or 'entregas.zip'
+    response = Response(
+        stream_zip(archive_entries(), opener=lambda source: open_blob(*source)),
+        mimetype='application/zip'
+    )
+    response.headers.set('Content-Disposition', 'attachment', filename=archive_name)
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
 
 @files_bp.route('/api/files/<int:file_id>', methods=['DELETE'])
 @jwt_required()
@@ -228,17 +499,24 @@ def delete_file(file_id):
         return jsonify({'message': 'No tienes permisos para eliminar este archivo'}), 403
     
     try:
-        # Eliminar archivo físico
-        if os.path.exists(attachment.file_path):
-            os.remove(attachment.file_path)
-        
-        # Eliminar registro de la base de datos
+        # Eliminar registro de la base de datos y soltar la referencia al blob
+        blob_id = attachment.blob_id
+        orphan_path = release_blob(blob_id) if blob_id else attachment.file_path
+        tags = attachment_tags(attachment)
         db.session.delete(attachment)
         db.session.commit()
+        invalidate(*tags)
+        
+        # Eliminar archivo físico sólo cuando nadie más lo referencia
+        if blob_id:
+            remove_blob_file(orphan_path)
+        else:
+            storage.delete(orphan_path)
         
         return jsonify({'message': 'Archivo eliminado exitosamente'})
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'message': 'Error al eliminar archivo'}), 500
 
 @files_bp.route('/api/files/<int:file_id>', methods=['PUT'])
@@ -256,6 +534,9 @@ def update_file(file_id):
         if attachment.uploaded_by != current_user_id and user.role not in ['admin', 'teacher']:
             return jsonify({'message': 'No tienes permisos para modificar este archivo'}), 403
         
+        # Los listados donde estaba y donde queda
+        tags = attachment_tags(attachment)
+        
         # Actualizar campos permitidos
         if 'assignment_id' in data:
             attachment.assignment_id = data['assignment_id']
@@ -265,6 +546,7 @@ def update_file(file_id):
             attachment.announcement_id = data['announcement_id']
         
         db.session.commit()
+        invalidate(*tags, *attachment_tags(attachment))
         
         return jsonify({
             'message': 'Archivo actualizado exitosamente',
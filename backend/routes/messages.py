@@ -1,100 +1,334 @@
-from flask import Flask,request, Blueprint, jsonify
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from flask_cors import CORS
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
-import os
-import uuid
-import mimetypes
-from functools import wraps
-from config import Config
-from db import query_one, query_all, execute
-import bcrypt
-from routes.roles import role_required
-from routes.files import allowed_file
-
-
-from models import (
-    db as models_db,
-    Message
-)
-
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Inicializar la instancia de models.db con la app y usarla localmente como db
-models_db.init_app(app)
-db = models_db
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime
+from db import query_one, query_all, transaction
+from realtime import emit_to_user
+from avatars import avatar_url
+from pagination import page_limit, before_id, next_cursor
+
 
 messages_bp = Blueprint('messages', __name__)
 
-@app.route('/api/messages', methods=['GET'])
-@jwt_required()
-def get_messages():
-    current_user_id = get_jwt_identity()
-    messages = Message.query.filter(
-        (Message.sender_id == current_user_id) | (Message.receiver_id == current_user_id)
-    ).order_by(Message.created_at.desc()).all()
-    
-    return jsonify([{
-        'id': message.id,
+# Un hilo es el par (usuario actual, otro participante). La tabla conversations
+# guarda una fila por participante con el último mensaje y los no leídos; se
+# actualiza en la misma transacción que send_message y mark_read. La lista de
+# hilos recorre el índice (user_id, last_message_id) y los mensajes los índices
+# (sender_id, created_at) y (receiver_id, created_at), así que el costo de una
+# página no depende del historial completo del usuario.
+
+MESSAGE_COLUMNS = """
+    m.id, m.sender_id, m.receiver_id, m.subject, m.content, m.is_read, m.created_at,
+    s.first_name AS sender_first_name, s.last_name AS sender_last_name,
+    r.first_name AS receiver_first_name, r.last_name AS receiver_last_name
+"""
+
+THREADS_SQL = """
+    SELECT c.other_id, c.last_message_id AS last_id, c.unread_count,
+           u.first_name, u.last_name, u.avatar,
+           m.sender_id, m.subject, m.content, m.is_read, m.created_at
+    FROM conversations c
+    JOIN messages m ON m.id = c.last_message_id
+    JOIN users u ON u.id = c.other_id
+    WHERE c.user_id = %(user_id)s AND c.last_message_id < %(before)s
+    ORDER BY c.last_message_id DESC
+    LIMIT %(limit)s
+"""
+
+# El remitente ve el hilo sin pendientes; el destinatario suma uno
+UPSERT_CONVERSATION_SQL = """
+    INSERT INTO conversations (user_id, other_id, last_message_id, unread_count)
+    VALUES (%(user_id)s, %(other_id)s, %(message_id)s, %(unread)s)
+    ON DUPLICATE KEY UPDATE
+        last_message_id = GREATEST(last_message_id, VALUES(last_message_id)),
+        unread_count = unread_count + VALUES(unread_count)
+"""
+
+# Cada rama recorre su índice (columna, created_at) en orden y se corta a limit + 1
+KEYSET = "(created_at < %(before_at)s OR (created_at = %(before_at)s AND id < %(before)s))"
+
+THREAD_MESSAGES_SQL = f"""
+    SELECT {MESSAGE_COLUMNS}
+    FROM (
+        (SELECT id FROM messages
+         WHERE sender_id = %(user_id)s AND receiver_id = %(other_id)s AND {KEYSET}
+         ORDER BY created_at DESC, id DESC LIMIT %(limit)s)
+        UNION ALL
+        (SELECT id FROM messages
+         WHERE sender_id = %(other_id)s AND receiver_id = %(user_id)s AND {KEYSET}
+         ORDER BY created_at DESC, id DESC LIMIT %(limit)s)
+    ) AS page
+    JOIN messages m ON m.id = page.id
+    JOIN users s ON s.id = m.sender_id
+    JOIN users r ON r.id = m.receiver_id
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT %(limit)s
+"""
+
+MAILBOX_SQL = f"""
+    SELECT {MESSAGE_COLUMNS}
+    FROM (
+        (SELECT id FROM messages WHERE sender_id = %(user_id)s AND {KEYSET}
+         ORDER BY created_at DESC, id DESC LIMIT %(limit)s)
+        UNION ALL
+        (SELECT id FROM messages WHERE receiver_id = %(user_id)s AND {KEYSET}
+         ORDER BY created_at DESC, id DESC LIMIT %(limit)s)
+    ) AS page
+    JOIN messages m ON m.id = page.id
+    JOIN users s ON s.id = m.sender_id
+    JOIN users r ON r.id = m.receiver_id
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT %(limit)s
+"""
+
+NO_CURSOR = 2 ** 31 - 1
+PREVIEW_LENGTH = 140
+LATEST = datetime(9999, 12, 31)
+
+
+def serialize_message(row):
+    return {
+        'id': row['id'],
         'sender': {
-            'id': message.sender.id,
-            'first_name': message.sender.first_name,
-            'last_name': message.sender.last_name
+            'id': row['sender_id'],
+            'first_name': row['sender_first_name'],
+            'last_name': row['sender_last_name']
         },
         'receiver': {
-            'id': message.receiver.id,
-            'first_name': message.receiver.first_name,
-            'last_name': message.receiver.last_name
+            'id': row['receiver_id'],
+            'first_name': row['receiver_first_name'],
+            'last_name': row['receiver_last_name']
         },
-        'subject': message.subject,
-        'content': message.content,
-        'is_read': message.is_read,
-        'created_at': message.created_at.isoformat()
-    } for message in messages])
+        'subject': row['subject'],
+        'content': row['content'],
+        'is_read': bool(row['is_read']),
+        'created_at': row['created_at'].isoformat()
+    }
 
-@app.route('/api/messages', methods=['POST'])
+
+def page_params(user_id, limit, **extra):
+    # Se pide una fila de más para saber si existe otra página
+    return dict(user_id=user_id, before=before_id() or NO_CURSOR, limit=limit + 1, **extra)
+
+
+def message_page_params(user_id, limit, **extra):
+    """Como page_params, más la fecha del mensaje cursor para recorrer por (created_at, id)"""
+    params = page_params(user_id, limit, **extra)
+    params['before_at'] = LATEST
+    if params['before'] != NO_CURSOR:
+        cursor = query_one("SELECT created_at FROM messages WHERE id = %s", (params['before'],))
+        if cursor:
+            params['before_at'] = cursor['created_at']
+    return params
+
+
+@messages_bp.route('/api/messages', methods=['GET'])
 @jwt_required()
-def send_message():
-    data = request.get_json()
-    current_user_id = get_jwt_identity()
-    
-    message = Message(
-        sender_id=current_user_id,
-        receiver_id=data['receiver_id'],
-        subject=data.get('subject', ''),
-        content=data['content']
+def get_messages():
+    """Buzón completo (enviados y recibidos), más reciente primero, paginado por cursor"""
+    current_user_id = int(get_jwt_identity())
+    limit = page_limit(default=50)
+    rows = query_all(MAILBOX_SQL, message_page_params(current_user_id, limit))
+
+    response = jsonify([serialize_message(row) for row in rows[:limit]])
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers['X-Next-Cursor'] = str(cursor)
+    return response
+
+@messages_bp.route('/api/messages/threads', methods=['GET'])
+@jwt_required()
+def get_threads():
+    """Conversaciones con su último mensaje y cantidad de no leídos"""
+    current_user_id = int(get_jwt_identity())
+    limit = page_limit()
+    rows = query_all(THREADS_SQL, page_params(current_user_id, limit))
+
+    return jsonify({
+        'threads': [{
+            'participant': {
+                'id': row['other_id'],
+                'first_name': row['first_name'],
+                'last_name': row['last_name'],
+                'avatar': avatar_url(row['avatar'], 64)
+            },
+            'last_message': {
+                'id': row['last_id'],
+                'sender_id': row['sender_id'],
+                'subject': row['subject'],
+                'content': row['content'],
+                'is_read': bool(row['is_read']),
+                'created_at': row['created_at'].isoformat()
+            },
+            'unread_count': int(row['unread_count'] or 0)
+        } for row in rows[:limit]],
+        'next_cursor': next_cursor(rows, limit, key='last_id')
+    })
+
+@messages_bp.route('/api/messages/threads/<int:other_id>', methods=['GET'])
+@jwt_required()
+def get_thread_messages(other_id):
+    """Mensajes intercambiados con otro usuario, más reciente primero"""
+    current_user_id = int(get_jwt_identity())
+    participant = query_one(
+        "SELECT id, first_name, last_name, avatar FROM users WHERE id = %s",
+        (other_id,)
     )
-    
+    if not participant:
+        return jsonify({'message': 'Usuario no encontrado'}), 404
+
+    limit = page_limit()
+    rows = query_all(THREAD_MESSAGES_SQL, message_page_params(current_user_id, limit, other_id=other_id))
+
+    return jsonify({
+        'participant': {
+            'id': participant['id'],
+            'first_name': participant['first_name'],
+            'last_name': participant['last_name'],
+            'avatar': avatar_url(participant['avatar'], 64)
+        },
+        'messages': [serialize_message(row) for row in rows[:limit]],
+        'next_cursor': next_cursor(rows, limit)
+    })
+
+@messages_bp.route('/api/messages/unread-count', methods=['GET'])
+@jwt_required()
+def get_unread_count():
+    current_user_id = int(get_jwt_identity())
+    user = query_one("SELECT unread_messages FROM users WHERE id = %s", (current_user_id,))
+    if not user:
+        return jsonify({'message': 'Usuario no encontrado'}), 404
+    return jsonify({'unread_messages': user['unread_messages']})
+
+@messages_bp.route('/api/messages', methods=['POST'])
+@jwt_required()
+def send_message():
+    data = request.get_json() or {}
+    current_user_id = int(get_jwt_identity())
+
+    if not data.get('receiver_id') or not data.get('content'):
+        return jsonify({'message': 'Destinatario y contenido son requeridos'}), 400
+
     try:
-        db.session.add(message)
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Mensaje enviado exitosamente',
-            'message_id': message.id
-        }), 201
+        # El mensaje y el contador del destinatario se confirman juntos
+        with transaction() as cur:
+            cur.execute("SELECT id FROM users WHERE id = %s FOR UPDATE", (data['receiver_id'],))
+            if not cur.fetchone():
+                return jsonify({'message': 'Destinatario no encontrado'}), 404
+            cur.execute("""
+                INSERT INTO messages (sender_id, receiver_id, subject, content)
+                VALUES (%s, %s, %s, %s)
+            """, (current_user_id, data['receiver_id'], data.get('subject', ''), data['content']))
+            message_id = cur.lastrowid
+            cur.execute(
+                "UPDATE users SET unread_messages = unread_messages + 1 WHERE id = %s",
+                (data['receiver_id'],)
+            )
+            for user_id, other_id, unread in (
+                (current_user_id, data['receiver_id'], 0),
+                (data['receiver_id'], current_user_id, 1),
+            ):
+                cur.execute(UPSERT_CONVERSATION_SQL, {
+                    'user_id': user_id, 'other_id': other_id,
+                    'message_id': message_id, 'unread': unread
+                })
+            cur.execute("""
+                SELECT m.created_at, u.unread_messages, s.first_name, s.last_name
+                FROM messages m
+                JOIN users u ON u.id = m.receiver_id
+                JOIN users s ON s.id = m.sender_id
+                WHERE m.id = %s
+            """, (message_id,))
+            created = cur.fetchone()
     except Exception as e:
-        db.session.rollback()
         return jsonify({'message': 'Error al enviar mensaje'}), 500
 
-@app.route('/api/messages/<int:message_id>/read', methods=['PUT'])
+    # Evento compacto: el cliente pide el hilo completo sólo si lo abre
+    emit_to_user(data['receiver_id'], 'new_message', {
+        'id': message_id,
+        'sender': {
+            'id': current_user_id,
+            'first_name': created['first_name'],
+            'last_name': created['last_name']
+        },
+        'subject': data.get('subject', ''),
+        'preview': data['content'][:PREVIEW_LENGTH],
+        'created_at': created['created_at'].isoformat(),
+        'unread_messages': created['unread_messages']
+    })
+
+    return jsonify({
+        'message': 'Mensaje enviado exitosamente',
+        'message_id': message_id
+    }), 201
+
+
+def mark_read(reader_id, where_sql, params):
+    """
+    Marca como leídos los mensajes recibidos que cumplan la condición, descuenta
+    el contador y envía el acuse a cada remitente. Retorna los ids actualizados.
+    """
+    with transaction() as cur:
+        cur.execute(f"""
+            SELECT id, sender_id FROM messages
+            WHERE receiver_id = %s AND is_read = FALSE AND {where_sql}
+            FOR UPDATE
+        """, (reader_id, *params))
+        unread = cur.fetchall()
+        if not unread:
+            return []
+        ids = [row['id'] for row in unread]
+        placeholders = ', '.join(['%s'] * len(ids))
+        cur.execute(f"UPDATE messages SET is_read = TRUE WHERE id IN ({placeholders})", tuple(ids))
+        cur.execute(
+            "UPDATE users SET unread_messages = GREATEST(unread_messages - %s, 0) WHERE id = %s",
+            (len(ids), reader_id)
+        )
+        by_sender = {}
+        for row in unread:
+            by_sender.setdefault(row['sender_id'], []).append(row['id'])
+        for sender_id, message_ids in by_sender.items():
+            cur.execute("""
+                UPDATE conversations SET unread_count = GREATEST(unread_count - %s, 0)
+                WHERE user_id = %s AND other_id = %s
+            """, (len(message_ids), reader_id, sender_id))
+        cur.execute("SELECT unread_messages FROM users WHERE id = %s", (reader_id,))
+        remaining = cur.fetchone()['unread_messages']
+
+    read_at = datetime.utcnow().isoformat()
+    for sender_id, message_ids in by_sender.items():
+        emit_to_user(sender_id, 'message_read', {
+            'message_ids': message_ids,
+            'reader_id': reader_id,
+            'read_at': read_at
+        })
+    # Las otras pestañas del lector actualizan su contador
+    emit_to_user(reader_id, 'unread_messages', {'unread_messages': remaining})
+    return ids
+
+@messages_bp.route('/api/messages/<int:message_id>/read', methods=['PUT'])
 @jwt_required()
 def mark_message_read(message_id):
-    current_user_id = get_jwt_identity()
-    message = Message.query.filter_by(
-        id=message_id,
-        receiver_id=current_user_id
-    ).first_or_404()
-    
-    message.is_read = True
-    
+    current_user_id = int(get_jwt_identity())
+    message = query_one(
+        "SELECT id FROM messages WHERE id = %s AND receiver_id = %s",
+        (message_id, current_user_id)
+    )
+    if not message:
+        return jsonify({'message': 'Mensaje no encontrado'}), 404
+
     try:
-        db.session.commit()
+        mark_read(current_user_id, "id = %s", (message_id,))
         return jsonify({'message': 'Mensaje marcado como leído'})
     except Exception as e:
-        db.session.rollback()
         return jsonify({'message': 'Error al actualizar mensaje'}), 500
+
+@messages_bp.route('/api/messages/threads/<int:other_id>/read', methods=['PUT'])
+@jwt_required()
+def mark_thread_read(other_id):
+    """Marca como leídos todos los mensajes recibidos de otro usuario"""
+    current_user_id = int(get_jwt_identity())
+    try:
+        updated = mark_read(current_user_id, "sender_id = %s", (other_id,))
+        return jsonify({'message': 'Conversación marcada como leída', 'updated': len(updated)})
+    except Exception as e:
+        return jsonify({'message': 'Error al actualizar mensajes'}), 500
@@ -14,6 +14,8 @@ from db import query_one, query_all, execute
 import bcrypt
 from routes.roles import role_required
 from utils import allowed_file
+from realtime import emit_to_user
+from conditional import conditional_get
 
 from models import (
     db as models_db,
@@ -25,7 +27,6 @@ from models import (
 
 app = Flask(__name__)
 app.config.from_object(Config)
-socketio = SocketIO(app, cors_allowed_origins=app.config['CORS_ORIGINS'])
 
 
 db = models_db
@@ -33,6 +34,17 @@ models_db.init_app(app)
 
 notifications_bp = Blueprint('notifications', __name__)
 
+# Versión de /api/notifications para el ETag (índice idx_notifications_user)
+NOTIFICATIONS_VERSION_SQL = """
+    SELECT COUNT(*) AS count, MAX(id) AS last_id, MAX(updated_at) AS updated_at
+    FROM notifications
+    WHERE user_id = %(user_id)s
+"""
+
+
+def notifications_version(user_id):
+    return query_one(NOTIFICATIONS_VERSION_SQL, {'user_id': user_id})
+
 def create_notification(user_id, title, message, notification_type, related_id=None):
     """Crear una nueva notificación"""
     try:
@@ -47,14 +59,14 @@ def create_notification(user_id, title, message, notification_type, related_id=N
         db.session.commit()
         
         # Emitir notificación en tiempo real
-        socketio.emit('new_notification', {
+        emit_to_user(user_id, 'new_notification', {
             'id': notification.id,
             'title': title,
             'message': message,
             'type': notification_type,
             'related_id': related_id,
             'created_at': notification.created_at.isoformat()
-        }, room=f'user_{user_id}')
+        })
         
         return notification
     except Exception as e:
@@ -92,8 +104,10 @@ def mark_all_notifications_read():
     current_user_id = int(get_jwt_identity())
     
     try:
-        Notification.query.filter_by(user_id=current_user_id, is_read=False)\
-            .update({'is_read': True})
+        # Se cargan las filas para que cada una quede en el registro de cambios
+        unread = Notification.query.filter_by(user_id=current_user_id, is_read=False).all()
+        for notification in unread:
+            notification.is_read = True
         db.session.commit()
         
         return jsonify({'message': 'Todas las notificaciones marcadas como leídas'})
@@ -105,6 +119,7 @@ def mark_all_notifications_read():
 
 @notifications_bp.route('/api/notifications', methods=['GET'])
 @jwt_required()
+@conditional_get(notifications_version)
 def get_notifications():
     current_user_id = int(get_jwt_identity())
     
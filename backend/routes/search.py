@@ -0,0 +1,103 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+import re
+from db import query_all
+from pagination import page_limit
+from permissions import MY_COURSES_SQL
+
+
+search_bp = Blueprint('search', __name__)
+
+# Búsqueda con los índices FULLTEXT de MySQL (ver database_schema.sql). El
+# acceso se resuelve dentro de la misma consulta: cada rama sólo ve los cursos
+# que el usuario dicta o en los que está inscrito, y los mensajes propios.
+# Cada rama se corta a su propio LIMIT antes de mezclar por relevancia.
+
+SEARCH_TYPES = ('course', 'assignment', 'announcement', 'message')
+
+SEARCH_BRANCHES = {
+    'course': f"""
+        SELECT 'course' AS type, c.id, c.name AS title, LEFT(c.description, 200) AS snippet,
+               c.id AS course_id, c.name AS course_name, c.created_at,
+               MATCH(c.name, c.subject) AGAINST (%(query)s IN BOOLEAN MODE) AS score
+        FROM courses c
+        JOIN ({MY_COURSES_SQL}) AS mine ON mine.course_id = c.id
+        WHERE MATCH(c.name, c.subject) AGAINST (%(query)s IN BOOLEAN MODE)
+        ORDER BY score DESC LIMIT %(limit)s
+    """,
+    'assignment': f"""
+        SELECT 'assignment' AS type, a.id, a.title, LEFT(a.description, 200) AS snippet,
+               c.id AS course_id, c.name AS course_name, a.created_at,
+               MATCH(a.title, a.description) AGAINST (%(query)s IN BOOLEAN MODE) AS score
+        FROM assignments a
+        JOIN ({MY_COURSES_SQL}) AS mine ON mine.course_id = a.course_id
+        JOIN courses c ON c.id = a.course_id
+        WHERE MATCH(a.title, a.description) AGAINST (%(query)s IN BOOLEAN MODE)
+        ORDER BY score DESC LIMIT %(limit)s
+    """,
+    'announcement': f"""
+        SELECT 'announcement' AS type, an.id, an.title, LEFT(an.content, 200) AS snippet,
+               c.id AS course_id, c.name AS course_name, an.created_at,
+               MATCH(an.title, an.content) AGAINST (%(query)s IN BOOLEAN MODE) AS score
+        FROM announcements an
+        JOIN ({MY_COURSES_SQL}) AS mine ON mine.course_id = an.course_id
+        JOIN courses c ON c.id = an.course_id
+        WHERE MATCH(an.title, an.content) AGAINST (%(query)s IN BOOLEAN MODE)
+        ORDER BY score DESC LIMIT %(limit)s
+    """,
+    'message': """
+        SELECT 'message' AS type, m.id, m.subject AS title, LEFT(m.content, 200) AS snippet,
+               NULL AS course_id, NULL AS course_name, m.created_at,
+               MATCH(m.subject, m.content) AGAINST (%(query)s IN BOOLEAN MODE) AS score
+        FROM messages m
+        WHERE MATCH(m.subject, m.content) AGAINST (%(query)s IN BOOLEAN MODE)
+          AND (m.sender_id = %(user_id)s OR m.receiver_id = %(user_id)s)
+        ORDER BY score DESC LIMIT %(limit)s
+    """,
+}
+
+# Operadores del modo booleano que no deben llegar desde el usuario
+BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+MIN_TERM_LENGTH = 3  # innodb_ft_min_token_size por defecto
+
+
+def boolean_query(text):
+    """'tarea álgebra' -> '+tarea* +álgebra*': todos los términos, con prefijo"""
+    terms = [term for term in BOOLEAN_OPERATORS.sub(' ', text).split() if len(term) >= MIN_TERM_LENGTH]
+    return ' '.join(f'+{term}*' for term in terms)
+
+
+@search_bp.route('/api/search', methods=['GET'])
+@jwt_required()
+def search():
+    """Busca en cursos, tareas, anuncios y mensajes visibles para el usuario"""
+    current_user_id = int(get_jwt_identity())
+    query = boolean_query(request.args.get('q', ''))
+    if not query:
+        return jsonify({'message': f'La búsqueda debe tener al menos un término de {MIN_TERM_LENGTH} letras'}), 400
+
+    requested = request.args.get('types')
+    types = [t for t in requested.split(',') if t in SEARCH_TYPES] if requested else list(SEARCH_TYPES)
+    if not types:
+        return jsonify({'message': 'Tipos de búsqueda no válidos'}), 400
+
+    limit = page_limit(default=20, maximum=50)
+    branches = ' UNION ALL '.join(f"({SEARCH_BRANCHES[t]})" for t in types)
+    rows = query_all(
+        f"SELECT * FROM ({branches}) AS results ORDER BY score DESC, created_at DESC LIMIT %(limit)s",
+        {'user_id': current_user_id, 'query': query, 'limit': limit}
+    )
+
+    return jsonify({
+        'query': request.args.get('q', ''),
+        'results': [{
+            'type': row['type'],
+            'id': row['id'],
+            'title': row['title'],
+            'snippet': row['snippet'],
+            'course_id': row['course_id'],
+            'course_name': row['course_name'],
+            'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+            'score': float(row['score'])
+        } for row in rows]
+    })
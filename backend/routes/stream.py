@@ -0,0 +1,74 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from db import query_all
+from pagination import page_limit, before_id, next_cursor
+from permissions import resolve_course_access
+from stream import ITEM_COLUMNS, serialize_item
+
+
+stream_bp = Blueprint('stream', __name__)
+
+NO_CURSOR = 2 ** 63 - 1
+
+# Stream combinado del usuario: un rango de la clave primaria (user_id, stream_item_id)
+USER_STREAM_SQL = f"""
+    SELECT {ITEM_COLUMNS}
+    FROM stream_entries e
+    JOIN stream_items s ON s.id = e.stream_item_id
+    JOIN courses c ON c.id = s.course_id
+    LEFT JOIN users u ON u.id = s.actor_id
+    WHERE e.user_id = %(user_id)s AND e.stream_item_id < %(before)s
+    ORDER BY e.stream_item_id DESC
+    LIMIT %(limit)s
+"""
+
+# Stream de un curso: índice (course_id, id); las notas sólo las ve su estudiante
+COURSE_STREAM_SQL = f"""
+    SELECT {ITEM_COLUMNS}
+    FROM stream_items s
+    JOIN courses c ON c.id = s.course_id
+    LEFT JOIN users u ON u.id = s.actor_id
+    WHERE s.course_id = %(course_id)s AND s.id < %(before)s
+      AND (s.user_id IS NULL OR s.user_id = %(user_id)s)
+    ORDER BY s.id DESC
+    LIMIT %(limit)s
+"""
+
+
+@stream_bp.route('/api/stream', methods=['GET'])
+@jwt_required()
+def get_stream():
+    """Novedades de todos los cursos del usuario, más reciente primero"""
+    current_user_id = int(get_jwt_identity())
+    limit = page_limit()
+    rows = query_all(USER_STREAM_SQL, {
+        'user_id': current_user_id,
+        'before': before_id() or NO_CURSOR,
+        'limit': limit + 1
+    })
+    return jsonify({
+        'items': [serialize_item(row) for row in rows[:limit]],
+        'next_cursor': next_cursor(rows, limit)
+    })
+
+@stream_bp.route('/api/courses/<int:course_id>/stream', methods=['GET'])
+@jwt_required()
+def get_course_stream(course_id):
+    current_user_id = int(get_jwt_identity())
+    has_access = resolve_course_access(current_user_id, course_id)
+    if has_access is None:
+        return jsonify({'message': 'Curso no encontrado'}), 404
+    if not has_access:
+        return jsonify({'message': 'No tienes acceso a este curso'}), 403
+
+    limit = page_limit()
+    rows = query_all(COURSE_STREAM_SQL, {
+        'course_id': course_id,
+        'user_id': current_user_id,
+        'before': before_id() or NO_CURSOR,
+        'limit': limit + 1
+    })
+    return jsonify({
+        'items': [serialize_item(row) for row in rows[:limit]],
+        'next_cursor': next_cursor(rows, limit)
+    })
@@ -0,0 +1,282 @@
+from flask import Flask, request, Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.utils import secure_filename
+from werkzeug.exceptions import ClientDisconnected
+from datetime import datetime, timedelta
+import os
+import uuid
+from config import Config
+import storage
+from blobs import hash_file
+from thumbnails import schedule_thumbnail
+from ingest import sniff_content_type, resolve_content_type, read_head
+from routes.files import (
+    allowed_file,
+    max_size_for,
+    detect_mime_type,
+    parse_optional_id,
+    create_attachment,
+    serialize_attachment
+)
+
+from models import (
+    db as models_db,
+    UploadSession
+)
+
+app = Flask(__name__)
+app.config.from_object(Config)
+
+# Inicializar la instancia de models.db con la app y usarla localmente como db
+models_db.init_app(app)
+db = models_db
+
+uploads_bp = Blueprint('uploads', __name__)
+
+# Protocolo de subida reanudable (similar a tus):
+#   POST   /api/files/uploads               -> crea la sesión
+#   HEAD   /api/files/uploads/<id>          -> consulta el desplazamiento actual
+#   PATCH  /api/files/uploads/<id>          -> agrega un fragmento en Upload-Offset
+#   POST   /api/files/uploads/<id>/complete -> registra el archivo terminado
+#   DELETE /api/files/uploads/<id>          -> cancela la subida
+# Cada fragmento se escribe a disco mientras llega, así que ninguna petición
+# necesita más memoria que UPLOAD_BUFFER_SIZE sin importar el tamaño total. Un
+# fragmento requiere Content-Length y no puede superar MAX_CONTENT_LENGTH; si
+# la conexión se corta a mitad, lo recibido queda confirmado y el cliente
+# consulta Upload-Offset para continuar.
+
+
+def incoming_folder():
+    folder = os.path.join(storage.temp_folder(), 'incoming')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def part_path(session):
+    return os.path.join(incoming_folder(), f"{session.id}.part")
+
+
+def upload_headers(session):
+    return {
+        'Upload-Offset': str(session.received_bytes),
+        'Upload-Length': str(session.total_size),
+        'Cache-Control': 'no-store'
+    }
+
+
+def serialize_session(session):
+    return {
+        'id': session.id,
+        'filename': session.original_filename,
+        'size': session.total_size,
+        'offset': session.received_bytes,
+        'status': session.status,
+        'expires_at': session.expires_at.isoformat()
+    }
+
+
+def get_own_session(session_id, user_id, lock=False):
+    """
+    Obtiene una sesión de subida del usuario, o None si no existe o expiró.
+    Con lock=True la fila queda bloqueada hasta el commit o rollback.
+    """
+    query = UploadSession.query.filter_by(id=session_id, user_id=user_id)
+    session = (query.with_for_update() if lock else query).first()
+    if not session or session.expires_at < datetime.utcnow():
+        return None
+    return session
+
+
+@uploads_bp.route('/api/files/uploads', methods=['POST'])
+@jwt_required()
+def create_upload():
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+
+    original_filename = secure_filename(data.get('filename') or '')
+    if not original_filename or not allowed_file(original_filename):
+        return jsonify({'message': 'Tipo de archivo no permitido'}), 400
+
+    try:
+        total_size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'El tamaño del archivo es requerido'}), 400
+
+    if total_size <= 0 or total_size > max_size_for(original_filename):
+        return jsonify({'message': 'El archivo excede el tamaño permitido'}), 413
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=current_user_id,
+        original_filename=original_filename,
+        total_size=total_size,
+        received_bytes=0,
+        submission_id=parse_optional_id(data.get('submission_id')),
+        assignment_id=parse_optional_id(data.get('assignment_id')),
+        announcement_id=parse_optional_id(data.get('announcement_id')),
+        expires_at=datetime.utcnow() + timedelta(hours=app.config['UPLOAD_SESSION_TTL_HOURS'])
+    )
+
+    try:
+        # Reservar el archivo parcial antes de aceptar fragmentos
+        open(part_path(session), 'wb').close()
+        db.session.add(session)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(part_path(session)):
+            os.remove(part_path(session))
+        return jsonify({'message': 'Error al iniciar la subida'}), 500
+
+    headers = upload_headers(session)
+    headers['Location'] = f"/api/files/uploads/{session.id}"
+    return jsonify(serialize_session(session)), 201, headers
+
+
+@uploads_bp.route('/api/files/uploads/<session_id>', methods=['GET'])
+@jwt_required()
+def get_upload(session_id):
+    current_user_id = int(get_jwt_identity())
+    session = get_own_session(session_id, current_user_id)
+    if not session:
+        return jsonify({'message': 'Sesión de subida no encontrada'}), 404
+
+    return jsonify(serialize_session(session)), 200, upload_headers(session)
+
+
+@uploads_bp.route('/api/files/uploads/<session_id>', methods=['PATCH'])
+@jwt_required()
+def append_upload_chunk(session_id):
+    current_user_id = int(get_jwt_identity())
+
+    # request.stream está limitado por MAX_CONTENT_LENGTH: se valida antes de leer
+    max_chunk_size = app.config['MAX_CONTENT_LENGTH']
+    if request.content_length is None:
+        return jsonify({'message': 'El encabezado Content-Length es requerido'}), 411
+    if request.content_length > max_chunk_size:
+        return jsonify({
+            'message': f'El fragmento excede el tamaño máximo de {max_chunk_size} bytes',
+            'max_chunk_size': max_chunk_size
+        }), 413
+
+    # La fila queda bloqueada durante la escritura: un PATCH concurrente en el
+    # mismo desplazamiento espera y luego recibe 409
+    session = get_own_session(session_id, current_user_id, lock=True)
+    if not session or session.status != 'pending':
+        db.session.rollback()
+        return jsonify({'message': 'Sesión de subida no encontrada'}), 404
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        db.session.rollback()
+        return jsonify({'message': 'El encabezado Upload-Offset es requerido'}), 400
+
+    # El cliente debe continuar exactamente donde quedó la última escritura confirmada
+    if offset != session.received_bytes:
+        headers = upload_headers(session)
+        db.session.rollback()
+        return jsonify({'message': 'Desplazamiento inválido'}), 409, headers
+
+    if offset + request.content_length > session.total_size:
+        headers = upload_headers(session)
+        db.session.rollback()
+        return jsonify({'message': 'El fragmento excede el tamaño declarado'}), 413, headers
+
+    buffer_size = app.config['UPLOAD_BUFFER_SIZE']
+    written = 0
+    try:
+        with open(part_path(session), 'r+b') as part:
+            # Descartar bytes de un fragmento anterior que no llegó a confirmarse
+            part.truncate(offset)
+            part.seek(offset)
+            try:
+                while True:
+                    chunk = request.stream.read(buffer_size)
+                    if not chunk:
+                        break
+                    part.write(chunk)
+                    written += len(chunk)
+            except ClientDisconnected:
+                # Lo que ya llegó a disco se conserva: el cliente reanuda desde ahí
+                part.flush()
+                session.received_bytes = offset + written
+                db.session.commit()
+                return jsonify({'message': 'Fragmento incompleto'}), 400, upload_headers(session)
+
+        session.received_bytes = offset + written
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Error al guardar el fragmento'}), 500, upload_headers(session)
+
+    return '', 204, upload_headers(session)
+
+
+@uploads_bp.route('/api/files/uploads/<session_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload(session_id):
+    current_user_id = int(get_jwt_identity())
+    session = get_own_session(session_id, current_user_id)
+    if not session or session.status != 'pending':
+        return jsonify({'message': 'Sesión de subida no encontrada'}), 404
+
+    if session.received_bytes != session.total_size:
+        return jsonify({'message': 'La subida aún no está completa'}), 409, upload_headers(session)
+
+    try:
+        # El SHA-256 se calcula al terminar, en una sola lectura secuencial del archivo parcial
+        file_path = part_path(session)
+        sha256 = hash_file(file_path)
+
+        mime_type = resolve_content_type(
+            sniff_content_type(read_head(file_path)),
+            detect_mime_type(session.original_filename)
+        )
+        if not mime_type:
+            return jsonify({'message': 'El contenido del archivo no corresponde a su tipo'}), 400
+
+        attachment = create_attachment(
+            file_path,
+            sha256,
+            session.total_size,
+            mime_type,
+            session.original_filename,
+            current_user_id,
+            submission_id=session.submission_id,
+            assignment_id=session.assignment_id,
+            announcement_id=session.announcement_id
+        )
+
+        session.status = 'completed'
+        session.file_id = attachment.id
+        db.session.commit()
+        schedule_thumbnail(attachment)
+
+        return jsonify({
+            'message': 'Archivo subido exitosamente',
+            'file': serialize_attachment(attachment)
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Error al completar la subida'}), 500
+
+
+@uploads_bp.route('/api/files/uploads/<session_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_upload(session_id):
+    current_user_id = int(get_jwt_identity())
+    session = get_own_session(session_id, current_user_id)
+    if not session or session.status != 'pending':
+        return jsonify({'message': 'Sesión de subida no encontrada'}), 404
+
+    try:
+        if os.path.exists(part_path(session)):
+            os.remove(part_path(session))
+        db.session.delete(session)
+        db.session.commit()
+        return jsonify({'message': 'Subida cancelada'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Error al cancelar la subida'}), 500
@@ -1,4 +1,4 @@
-from flask import Flask,request, Blueprint, jsonify
+from flask import Flask,request, Blueprint, jsonify, send_file, redirect
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
@@ -11,9 +11,13 @@ import mimetypes
 from functools import wraps
 from config import Config
 from db import query_one, query_all, execute
+from PIL import Image
+import storage
+from avatars import store_avatar, avatar_url, avatar_urls, avatar_location, delete_avatar_files, is_immutable
 import bcrypt
 from routes.roles import role_required
 from routes.files import allowed_file
+from serializers import serialize_user
 
 users_bp = Blueprint('users', __name__)
 
@@ -32,16 +36,11 @@ db = models_db
 @jwt_required()
 @role_required(['admin'])
 def get_users():
-    users = User.query.all()
-    return jsonify([{
-        'id': user.id,
-        'email': user.email,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'role': user.role,
-        'is_active': user.is_active,
-        'created_at': user.created_at.isoformat()
-    } for user in users])
+    users = query_all("""
+        SELECT id, email, first_name, last_name, role, avatar, is_active, created_at
+        FROM users
+    """)
+    return jsonify([serialize_user(user) for user in users])
 
 @users_bp.route('/api/users/<int:user_id>', methods=['PUT'])
 @jwt_required()
@@ -64,6 +63,26 @@ def update_user(user_id):
         return jsonify({'message': 'Error al actualizar usuario'}), 500
 
 # Endpoints para perfil de usuario
+USER_STATS_SQL = """
+    SELECT 
+        (SELECT COUNT(*) FROM course_enrollments WHERE student_id = %(user_id)s) as courses,
+        (SELECT COUNT(*) FROM assignments a
+         JOIN course_enrollments ce ON a.course_id = ce.course_id
+         WHERE ce.student_id = %(user_id)s) as assignments,
+        (SELECT COUNT(*) FROM assignment_submissions WHERE student_id = %(user_id)s) as submissions,
+        (SELECT AVG(points_earned) FROM assignment_submissions WHERE student_id = %(user_id)s AND points_earned IS NOT NULL) as average_grade
+"""
+
+
+def serialize_stats(stats):
+    return {
+        'courses': stats['courses'] or 0,
+        'assignments': stats['assignments'] or 0,
+        'submissions': stats['submissions'] or 0,
+        'average': round(float(stats['average_grade'] or 0), 2)
+    }
+
+
 @users_bp.route('/api/users/stats', methods=['GET'])
 @jwt_required()
 def get_user_stats():
@@ -71,28 +90,10 @@ def get_user_stats():
     try:
         user_id = int(get_jwt_identity())
         
-        # Obtener estadísticas del usuario
-        stats = query_one("""
-            SELECT 
-                (SELECT COUNT(*) FROM course_enrollments WHERE student_id = %s) as courses,
-                (SELECT COUNT(*) FROM assignment_submissions WHERE student_id = %s) as submissions,
-                (SELECT AVG(points_earned) FROM assignment_submissions WHERE student_id = %s AND points_earned IS NOT NULL) as average_grade
-        """, (user_id, user_id, user_id))
-        
-        # Obtener número de tareas asignadas
-        assignments_count = query_one("""
-            SELECT COUNT(*) as count
-            FROM assignments a
-            JOIN course_enrollments ce ON a.course_id = ce.course_id
-            WHERE ce.student_id = %s
-        """, (user_id,))
+        # Obtener estadísticas del usuario en una sola consulta
+        stats = query_one(USER_STATS_SQL, {'user_id': user_id})
         
-        return jsonify({
-            'courses': stats['courses'] or 0,
-            'assignments': assignments_count['count'] or 0,
-            'submissions': stats['submissions'] or 0,
-            'average': round(float(stats['average_grade'] or 0), 2)
-        })
+        return jsonify(serialize_stats(stats))
         
     except Exception as e:
         print(f"Error obteniendo estadísticas: {e}")
@@ -249,6 +250,26 @@ def update_user_password():
         print(f"Error actualizando contraseña: {e}")
         return jsonify({'message': 'Error al actualizar contraseña'}), 500
 
+@users_bp.route('/uploads/avatars/<filename>', methods=['GET'])
+def serve_avatar(filename):
+    """Sirve un avatar desde el backend de almacenamiento (URL pública estable)"""
+    location = avatar_location(secure_filename(filename))
+    if not location:
+        return jsonify({'message': 'Avatar no encontrado'}), 404
+    
+    file_path = storage.local_path(location)
+    if not file_path:
+        return redirect(storage.presigned_url(location))
+    
+    if not is_immutable(filename):
+        return send_file(file_path, max_age=app.config['THUMBNAIL_MAX_AGE'])
+    
+    # El nombre lleva el hash del contenido: nunca cambia, se cachea por un año
+    response = send_file(file_path, max_age=app.config['AVATAR_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @users_bp.route('/api/users/avatar', methods=['POST'])
 @jwt_required()
 def upload_avatar():
@@ -266,22 +287,17 @@ def upload_avatar():
         if not allowed_file(file.filename):
             return jsonify({'message': 'Tipo de archivo no permitido'}), 400
         
-        # Generar nombre único para el archivo
-        filename = secure_filename(file.filename)
-        file_extension = filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"avatar_{user_id}_{uuid.uuid4().hex}.{file_extension}"
+        # Recortar y guardar las versiones de 32/64/256 px
+        try:
+            new_avatar = store_avatar(file.stream, user_id)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return jsonify({'message': 'El archivo no es una imagen válida'}), 400
         
-        # Crear directorio de avatares si no existe
-        avatar_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'avatars')
-        os.makedirs(avatar_dir, exist_ok=True)
-        
-        # Guardar archivo
-        file_path = os.path.join(avatar_dir, unique_filename)
-        file.save(file_path)
-        
-        # Actualizar base de datos
-        avatar_url = f"/uploads/avatars/{unique_filename}"
-        execute("UPDATE users SET avatar = %s WHERE id = %s", (avatar_url, user_id))
+        # Actualizar base de datos y borrar el avatar anterior
+        previous = query_one("SELECT avatar FROM users WHERE id = %s", (user_id,))
+        execute("UPDATE users SET avatar = %s WHERE id = %s", (new_avatar, user_id))
+        if previous and previous['avatar'] and previous['avatar'] != new_avatar:
+            delete_avatar_files(previous['avatar'])
         
         # Obtener usuario actualizado
         updated_user = query_one("""
@@ -298,6 +314,7 @@ def upload_avatar():
                 'last_name': updated_user['last_name'],
                 'role': updated_user['role'],
                 'avatar': updated_user['avatar'],
+                'avatar_urls': avatar_urls(updated_user['avatar']),
                 'email_verified': bool(updated_user['email_verified']),
                 'created_at': updated_user['created_at'].isoformat() if updated_user['created_at'] else None
             }
@@ -321,9 +338,7 @@ def delete_avatar():
         
         # Eliminar archivo si existe
         if user['avatar']:
-            avatar_path = os.path.join(app.config['UPLOAD_FOLDER'], user['avatar'].replace('/uploads/', ''))
-            if os.path.exists(avatar_path):
-                os.remove(avatar_path)
+            delete_avatar_files(user['avatar'])
         
         # Actualizar base de datos
         execute("UPDATE users SET avatar = NULL WHERE id = %s", (user_id,))
@@ -343,6 +358,7 @@ def delete_avatar():
                 'last_name': updated_user['last_name'],
                 'role': updated_user['role'],
                 'avatar': updated_user['avatar'],
+                'avatar_urls': avatar_urls(updated_user['avatar']),
                 'email_verified': bool(updated_user['email_verified']),
                 'created_at': updated_user['created_at'].isoformat() if updated_user['created_at'] else None
             }
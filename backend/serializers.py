@@ -0,0 +1,47 @@
+"""
+Serialización compartida de usuarios, tareas y entregas.
+
+Las fechas y Decimal los convierte el proveedor JSON de la app
+(json_provider.py), así que aquí no se llama a isoformat() ni a float(): cada
+función elige los campos, normaliza los booleanos (MySQL los devuelve como
+0/1 en las filas de query_all) y arma los objetos anidados. Aceptan tanto
+filas de query_all como instancias del ORM.
+"""
+from avatars import avatar_url
+
+USER_FIELDS = ('id', 'email', 'first_name', 'last_name', 'role', 'is_active', 'created_at')
+ASSIGNMENT_FIELDS = (
+    'id', 'title', 'description', 'due_date', 'max_points',
+    'allow_late_submissions', 'is_archived', 'created_at'
+)
+SUBMISSION_FIELDS = (
+    'id', 'content', 'points_earned', 'feedback', 'status',
+    'submitted_at', 'graded_at', 'created_at'
+)
+BOOLEAN_FIELDS = {'is_active', 'allow_late_submissions', 'is_archived', 'is_pinned', 'is_read'}
+
+
+def field(source, name):
+    return source[name] if isinstance(source, dict) else getattr(source, name)
+
+
+def pick(source, names):
+    data = {}
+    for name in names:
+        value = field(source, name)
+        data[name] = bool(value) if name in BOOLEAN_FIELDS and value is not None else value
+    return data
+
+
+def serialize_user(source, avatar_size=32):
+    data = pick(source, USER_FIELDS)
+    data['avatar'] = avatar_url(field(source, 'avatar'), avatar_size)
+    return data
+
+
+def serialize_assignment(source):
+    return pick(source, ASSIGNMENT_FIELDS)
+
+
+def serialize_submission(source):
+    return pick(source, SUBMISSION_FIELDS)
@@ -0,0 +1,278 @@
+"""
+Almacenamiento de archivos con backends intercambiables.
+
+Las ubicaciones que se guardan en la base de datos tienen la forma
+"<backend>:<clave>", por ejemplo "local:blobs/ab/cd/abcd..." o
+"s3:blobs/ab/cd/abcd...". Las rutas sin prefijo son las rutas relativas que
+se guardaban antes y se siguen leyendo tal cual desde el disco local, así que
+ambos formatos conviven mientras corre la migración.
+"""
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import closing, contextmanager
+
+from config import Config
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # sólo se necesita con STORAGE_BACKEND=s3
+    boto3 = None
+    ClientError = Exception
+
+BUFFER_SIZE = 64 * 1024
+
+
+def shard_key(namespace, name):
+    """Clave repartida en dos niveles de directorios por el prefijo del nombre"""
+    return f"{namespace}/{name[:2]}/{name[2:4]}/{name}"
+
+
+class LocalStorage:
+    scheme = 'local'
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/')) if self.root else key
+
+    def save(self, temp_path, key):
+        """Mueve un temporal (en el mismo disco) a su clave de forma atómica"""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(temp_path, target)
+
+    def save_stream(self, stream, key):
+        temp_path = os.path.join(temp_folder(), f".{uuid.uuid4().hex}.tmp")
+        with open(temp_path, 'wb') as out:
+            shutil.copyfileobj(stream, out, BUFFER_SIZE)
+        self.save(temp_path, key)
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def delete(self, key):
+        if os.path.exists(self.path(key)):
+            os.remove(self.path(key))
+
+    def local_path(self, key):
+        return self.path(key)
+
+    def list_keys(self, prefix, start_after=''):
+        """(clave, tamaño, mtime) en orden lexicográfico, a partir de start_after"""
+        return self._walk(self.path(prefix.rstrip('/')), prefix.rstrip('/'), start_after)
+
+    def _walk(self, folder, key_prefix, start_after):
+        try:
+            # Los directorios ordenan como "nombre/" para coincidir con el orden de las claves
+            entries = sorted(os.scandir(folder), key=lambda e: e.name + '/' if e.is_dir() else e.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            key = f"{key_prefix}/{entry.name}"
+            if entry.is_dir():
+                subtree = key + '/'
+                if subtree < start_after and not start_after.startswith(subtree):
+                    continue
+                yield from self._walk(entry.path, key, start_after)
+            elif key > start_after:
+                stat = entry.stat()
+                yield key, stat.st_size, stat.st_mtime
+
+
+class S3Storage:
+    scheme = 's3'
+
+    def __init__(self, bucket, endpoint_url=None, access_key=None, secret_key=None, region=None):
+        if boto3 is None:
+            raise RuntimeError('STORAGE_BACKEND=s3 requiere instalar boto3')
+        self.bucket = bucket
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            region_name=region or None
+        )
+
+    def save(self, temp_path, key):
+        self.client.upload_file(temp_path, self.bucket, key)
+        os.remove(temp_path)
+
+    def save_stream(self, stream, key):
+        self.client.upload_fileobj(stream, self.bucket, key)
+
+    def open(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        except ClientError as e:
+            raise FileNotFoundError(key) from e
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def size(self, key):
+        return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def local_path(self, key):
+        return None
+
+    def list_keys(self, prefix, start_after=''):
+        paginator = self.client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(Bucket=self.bucket, Prefix=prefix, StartAfter=start_after)
+        for page in pages:
+            for item in page.get('Contents', []):
+                yield item['Key'], item['Size'], item['LastModified'].timestamp()
+
+    def presigned_url(self, key, download_name=None, mime_type=None, content_encoding=None, expires=None):
+        params = {'Bucket': self.bucket, 'Key': key}
+        if download_name:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+        if mime_type:
+            params['ResponseContentType'] = mime_type
+        if content_encoding:
+            params['ResponseContentEncoding'] = content_encoding
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params=params,
+            ExpiresIn=expires or Config.S3_URL_EXPIRES
+        )
+
+
+_backends = {}
+_legacy = LocalStorage('')
+
+
+def get_storage(scheme=None):
+    """Backend configurado (STORAGE_BACKEND) o el indicado, creado una sola vez"""
+    scheme = scheme or Config.STORAGE_BACKEND
+    if scheme not in _backends:
+        if scheme == 'local':
+            _backends[scheme] = LocalStorage(Config.UPLOAD_FOLDER)
+        elif scheme == 's3':
+            _backends[scheme] = S3Storage(
+                Config.S3_BUCKET,
+                endpoint_url=Config.S3_ENDPOINT_URL,
+                access_key=Config.S3_ACCESS_KEY,
+                secret_key=Config.S3_SECRET_KEY,
+                region=Config.S3_REGION
+            )
+        else:
+            raise ValueError(f"Backend de almacenamiento desconocido: {scheme}")
+    return _backends[scheme]
+
+
+def temp_folder():
+    """Carpeta para temporales, en el mismo disco que el backend local"""
+    folder = os.path.join(Config.UPLOAD_FOLDER, 'tmp')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def location_for(backend, key):
+    return f"{backend.scheme}:{key}"
+
+
+def resolve(location):
+    """(backend, clave) de una ubicación guardada; las rutas antiguas van al disco local"""
+    scheme, sep, key = location.partition(':')
+    if sep and scheme in ('local', 's3'):
+        return get_storage(scheme), key
+    return _legacy, location
+
+
+def store(temp_path, key, scheme=None):
+    """Guarda un temporal en el backend configurado y retorna su ubicación"""
+    backend = get_storage(scheme)
+    backend.save(temp_path, key)
+    return location_for(backend, key)
+
+
+def store_stream(stream, key, scheme=None):
+    """Guarda el contenido de un archivo abierto y retorna su ubicación"""
+    backend = get_storage(scheme)
+    backend.save_stream(stream, key)
+    return location_for(backend, key)
+
+
+def store_at(temp_path, location):
+    backend, key = resolve(location)
+    backend.save(temp_path, key)
+    return location
+
+
+def open_file(location):
+    backend, key = resolve(location)
+    return backend.open(key)
+
+
+def exists(location):
+    if not location:
+        return False
+    backend, key = resolve(location)
+    return backend.exists(key)
+
+
+def delete(location):
+    if not location:
+        return
+    backend, key = resolve(location)
+    backend.delete(key)
+
+
+def local_path(location):
+    """Ruta en disco si el backend es local, o None (p. ej. S3)"""
+    backend, key = resolve(location)
+    return backend.local_path(key)
+
+
+def presigned_url(location, download_name=None, mime_type=None, content_encoding=None):
+    backend, key = resolve(location)
+    return backend.presigned_url(
+        key,
+        download_name=download_name,
+        mime_type=mime_type,
+        content_encoding=content_encoding
+    )
+
+
+def find(key):
+    """Ubicación de una clave en el backend configurado o, si no está, en el local"""
+    for backend in (get_storage(), get_storage('local')):
+        if backend.exists(key):
+            return location_for(backend, key)
+    return None
+
+
+@contextmanager
+def fetch_to_temp(location):
+    """Ruta local legible del archivo; si el backend es remoto se descarga a un temporal"""
+    path = local_path(location)
+    if path:
+        yield path
+        return
+
+    fd, temp_path = tempfile.mkstemp(dir=temp_folder(), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out, closing(open_file(location)) as source:
+            shutil.copyfileobj(source, out, BUFFER_SIZE)
+        yield temp_path
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
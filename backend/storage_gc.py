@@ -0,0 +1,311 @@
+"""
+Recolección de archivos huérfanos.
+
+Cada fase recorre su tabla o el almacenamiento por lotes ordenados por clave y
+guarda la posición en maintenance_cursors, así una corrida interrumpida (o
+limitada con max_batches) continúa donde quedó. Nada más reciente que el
+periodo de gracia se toca: cubre las subidas en curso, los adjuntos que todavía
+se van a vincular a una entrega y las copias de una migración sin confirmar.
+
+Fases:
+  1. sesiones de subida vencidas y sus .part
+  2. adjuntos sin entrega, tarea ni anuncio
+  3. contadores de referencias de file_blobs (blobs sin adjuntos)
+  4. archivos del almacenamiento que ninguna fila referencia (blobs y avatares)
+  5. temporales abandonados
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+import storage
+from avatars import AVATAR_SIZES, AVATAR_URL_PREFIX, avatar_url, avatar_location
+from blobs import remove_blob_file, thumbnail_location
+from config import Config
+from db import query_one, query_all, execute, transaction
+
+THUMBNAIL_SUFFIX = '.thumb.webp'
+
+
+def load_cursor(name, default=''):
+    row = query_one("SELECT position FROM maintenance_cursors WHERE name = %s", (name,))
+    return row['position'] if row else default
+
+
+def save_cursor(name, position):
+    execute("""
+        INSERT INTO maintenance_cursors (name, position) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE position = VALUES(position)
+    """, (name, str(position)))
+
+
+def new_stats():
+    return {'rows': 0, 'files': 0, 'bytes': 0}
+
+
+def delete_local_file(path, stats):
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    stats['files'] += 1
+    stats['bytes'] += size
+
+
+def expire_upload_sessions(now, batch_size):
+    """Borra las sesiones vencidas; las pendientes también pierden su .part"""
+    from routes.uploads import incoming_folder
+
+    stats = new_stats()
+    for status in ('pending', 'completed'):
+        while True:
+            sessions = query_all("""
+                SELECT id FROM upload_sessions
+                WHERE status = %s AND expires_at < %s
+                ORDER BY expires_at LIMIT %s
+            """, (status, now, batch_size))
+            if not sessions:
+                break
+            ids = [session['id'] for session in sessions]
+            placeholders = ', '.join(['%s'] * len(ids))
+            _, deleted = execute(f"DELETE FROM upload_sessions WHERE id IN ({placeholders})", tuple(ids))
+            stats['rows'] += deleted
+            if status == 'pending':
+                for session_id in ids:
+                    delete_local_file(os.path.join(incoming_folder(), f"{session_id}.part"), stats)
+    return stats
+
+
+def purge_orphan_attachments(cutoff, batch_size, max_batches=None):
+    """Elimina los adjuntos sin padre más antiguos que el periodo de gracia"""
+    stats = new_stats()
+    last_id = int(load_cursor('gc:attachments', '0') or 0)
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = query_all("""
+            SELECT id, blob_id, file_path, thumbnail_path, file_size, created_at,
+                   submission_id, assignment_id, announcement_id
+            FROM file_attachments
+            WHERE id > %s
+            ORDER BY id LIMIT %s
+        """, (last_id, batch_size))
+        if not rows:
+            last_id = 0
+            break
+        last_id = rows[-1]['id']
+        batches += 1
+
+        orphans = [
+            row for row in rows
+            if row['submission_id'] is None and row['assignment_id'] is None
+            and row['announcement_id'] is None and row['created_at'] < cutoff
+        ]
+        released = []
+        with transaction() as cur:
+            for row in orphans:
+                # Se vuelve a verificar dentro de la transacción por si se vinculó recién
+                cur.execute("""
+                    DELETE FROM file_attachments
+                    WHERE id = %s AND submission_id IS NULL
+                      AND assignment_id IS NULL AND announcement_id IS NULL
+                """, (row['id'],))
+                if cur.rowcount == 0:
+                    continue
+                stats['rows'] += 1
+
+                if not row['blob_id']:
+                    released.append((None, row['file_path'], row['thumbnail_path'], row['file_size']))
+                    continue
+                cur.execute("SELECT ref_count, file_path FROM file_blobs WHERE id = %s FOR UPDATE", (row['blob_id'],))
+                blob = cur.fetchone()
+                if not blob:
+                    continue
+                if blob['ref_count'] > 1:
+                    cur.execute("UPDATE file_blobs SET ref_count = ref_count - 1 WHERE id = %s", (row['blob_id'],))
+                    continue
+                cur.execute("""
+                    DELETE FROM file_blobs
+                    WHERE id = %s AND NOT EXISTS (SELECT 1 FROM file_attachments WHERE blob_id = %s)
+                """, (row['blob_id'], row['blob_id']))
+                if cur.rowcount:
+                    released.append((row['blob_id'], blob['file_path'], None, row['file_size']))
+
+        # Los archivos se borran recién después del commit
+        for blob_id, location, thumbnail, size in released:
+            if blob_id:
+                remove_blob_file(location)
+            else:
+                storage.delete(location)
+                storage.delete(thumbnail)
+            stats['files'] += 1
+            stats['bytes'] += size or 0
+
+        save_cursor('gc:attachments', last_id)
+
+    save_cursor('gc:attachments', last_id)
+    return stats
+
+
+def reconcile_blobs(cutoff, batch_size, max_batches=None):
+    """Corrige ref_count según los adjuntos reales y elimina los blobs sin uso"""
+    stats = new_stats()
+    last_id = int(load_cursor('gc:blobs', '0') or 0)
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        blobs = query_all("""
+            SELECT b.id, b.file_path, b.file_size, b.ref_count, b.created_at,
+                   (SELECT COUNT(*) FROM file_attachments f WHERE f.blob_id = b.id) AS refs
+            FROM file_blobs b
+            WHERE b.id > %s
+            ORDER BY b.id LIMIT %s
+        """, (last_id, batch_size))
+        if not blobs:
+            last_id = 0
+            break
+        last_id = blobs[-1]['id']
+        batches += 1
+
+        for blob in blobs:
+            if blob['ref_count'] == blob['refs'] and blob['refs'] > 0:
+                continue
+
+            released = None
+            with transaction() as cur:
+                cur.execute("SELECT ref_count FROM file_blobs WHERE id = %s FOR UPDATE", (blob['id'],))
+                if not cur.fetchone():
+                    continue
+                cur.execute("SELECT COUNT(*) AS refs FROM file_attachments WHERE blob_id = %s", (blob['id'],))
+                refs = cur.fetchone()['refs']
+                if refs == 0 and blob['created_at'] < cutoff:
+                    cur.execute("DELETE FROM file_blobs WHERE id = %s", (blob['id'],))
+                    released = blob['file_path']
+                    stats['rows'] += 1
+                elif refs > 0:
+                    cur.execute("UPDATE file_blobs SET ref_count = %s WHERE id = %s", (refs, blob['id']))
+                    stats['rows'] += 1
+
+            if released:
+                remove_blob_file(released)
+                stats['files'] += 1
+                stats['bytes'] += blob['file_size']
+
+        save_cursor('gc:blobs', last_id)
+
+    save_cursor('gc:blobs', last_id)
+    return stats
+
+
+def referenced_blob_keys(backend, keys):
+    """Claves (blob o miniatura) que coinciden con la ubicación guardada en file_blobs"""
+    shas = {key.rsplit('/', 1)[-1].removesuffix(THUMBNAIL_SUFFIX) for key in keys}
+    placeholders = ', '.join(['%s'] * len(shas))
+    rows = query_all(f"SELECT file_path FROM file_blobs WHERE sha256 IN ({placeholders})", tuple(shas))
+    referenced = set()
+    for row in rows:
+        referenced.add(row['file_path'])
+        referenced.add(thumbnail_location(row['file_path']))
+    return {key for key in keys if storage.location_for(backend, key) in referenced}
+
+
+def referenced_avatar_keys(backend, keys):
+    """Claves de avatares (todas sus versiones) en uso y en su ubicación vigente"""
+    urls = {}
+    for key in keys:
+        # Cada versión pertenece a la URL registrada (la versión mayor)
+        stored_url = avatar_url(AVATAR_URL_PREFIX + key.rsplit('/', 1)[-1], AVATAR_SIZES[-1])
+        urls.setdefault(stored_url, []).append(key)
+    placeholders = ', '.join(['%s'] * len(urls))
+    rows = query_all(f"SELECT avatar FROM users WHERE avatar IN ({placeholders})", tuple(urls))
+    referenced = set()
+    for row in rows:
+        # Si quedó una copia vieja (carpeta plana u otro backend) sólo cuenta la vigente
+        current = avatar_location(row['avatar'].rsplit('/', 1)[-1])
+        for key in urls[row['avatar']]:
+            if storage.location_for(backend, key) == current:
+                referenced.add(key)
+    return referenced
+
+
+def sweep_storage(backend, prefix, referenced_keys, cutoff_ts, batch_size, max_batches=None):
+    """Recorre las claves de un prefijo y borra las que nadie referencia"""
+    stats = new_stats()
+    cursor_name = f"gc:storage:{backend.scheme}:{prefix}"
+    start_after = load_cursor(cursor_name)
+    listing = backend.list_keys(prefix, start_after)
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        batch = list(islice(listing, batch_size))
+        if not batch:
+            start_after = ''
+            break
+        start_after = batch[-1][0]
+        batches += 1
+
+        candidates = {key: size for key, size, modified in batch if modified < cutoff_ts}
+        if candidates:
+            in_use = referenced_keys(backend, list(candidates))
+            for key, size in candidates.items():
+                if key in in_use:
+                    continue
+                backend.delete(key)
+                stats['files'] += 1
+                stats['bytes'] += size
+
+        save_cursor(cursor_name, start_after)
+
+    save_cursor(cursor_name, start_after)
+    return stats
+
+
+def sweep_temp(cutoff_ts):
+    """Temporales de ingesta y miniaturas, y .part sin sesión, más viejos que la gracia"""
+    stats = new_stats()
+    folder = storage.temp_folder()
+    incoming = os.path.join(folder, 'incoming')
+
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.stat().st_mtime < cutoff_ts:
+            delete_local_file(entry.path, stats)
+
+    if os.path.isdir(incoming):
+        stale = {}
+        for entry in os.scandir(incoming):
+            if entry.is_file() and entry.name.endswith('.part') and entry.stat().st_mtime < cutoff_ts:
+                stale[entry.name[:-len('.part')]] = entry.path
+        for chunk_start in range(0, len(stale), 500):
+            ids = list(stale)[chunk_start:chunk_start + 500]
+            placeholders = ', '.join(['%s'] * len(ids))
+            live = query_all(f"SELECT id FROM upload_sessions WHERE id IN ({placeholders})", tuple(ids))
+            live_ids = {row['id'] for row in live}
+            for session_id in ids:
+                if session_id not in live_ids:
+                    delete_local_file(stale[session_id], stats)
+    return stats
+
+
+def run_gc(batch_size=500, max_batches=None, grace_hours=None):
+    """Ejecuta todas las fases y retorna las estadísticas por fase"""
+    grace = timedelta(hours=Config.GC_GRACE_HOURS if grace_hours is None else grace_hours)
+    now = datetime.utcnow()
+    cutoff = now - grace
+    cutoff_ts = time.time() - grace.total_seconds()
+
+    report = {
+        'upload_sessions': expire_upload_sessions(now, batch_size),
+        'attachments': purge_orphan_attachments(cutoff, batch_size, max_batches),
+        'blobs': reconcile_blobs(cutoff, batch_size, max_batches),
+    }
+
+    backends = {storage.get_storage(), storage.get_storage('local')}
+    for backend in backends:
+        report[f'{backend.scheme}:blobs'] = sweep_storage(
+            backend, 'blobs/', referenced_blob_keys, cutoff_ts, batch_size, max_batches
+        )
+        report[f'{backend.scheme}:avatars'] = sweep_storage(
+            backend, 'avatars/', referenced_avatar_keys, cutoff_ts, batch_size, max_batches
+        )
+
+    report['temp'] = sweep_temp(cutoff_ts)
+    return report
@@ -0,0 +1,129 @@
+"""
+Línea de tiempo ("stream") materializada al escribir.
+
+Cada evento de un curso (anuncio, tarea, calificación) agrega una fila
+compacta a stream_items con lo necesario para mostrarla sin consultar la tabla
+de origen, dentro de la transacción de la escritura de origen (`cur`). Un
+trabajo 'stream_fanout' copia la referencia a stream_entries para cada miembro
+del curso (o sólo para el estudiante, en el caso de una nota), así que el
+stream de un usuario se lee con un solo rango del índice
+(user_id, stream_item_id) sin importar en cuántos cursos participe.
+"""
+from avatars import avatar_url
+from db import execute, transaction
+from jobs import enqueue
+
+SUMMARY_LENGTH = 200
+BACKFILL_ITEMS = 50  # elementos recientes que recibe quien se inscribe
+
+ITEM_COLUMNS = """
+    s.id, s.course_id, s.item_type, s.item_id, s.user_id, s.title, s.summary, s.created_at,
+    c.name AS course_name, u.id AS actor_id, u.first_name, u.last_name, u.avatar
+"""
+
+FANOUT_COURSE_SQL = """
+    INSERT IGNORE INTO stream_entries (user_id, stream_item_id, course_id)
+    SELECT student_id, %(item_id)s, course_id FROM course_enrollments WHERE course_id = %(course_id)s
+    UNION
+    SELECT teacher_id, %(item_id)s, id FROM courses WHERE id = %(course_id)s
+"""
+
+BACKFILL_SQL = """
+    INSERT IGNORE INTO stream_entries (user_id, stream_item_id, course_id)
+    SELECT %(user_id)s, id, course_id
+    FROM stream_items
+    WHERE course_id = %(course_id)s AND user_id IS NULL
+    ORDER BY id DESC
+    LIMIT %(limit)s
+"""
+
+
+def summarize(text):
+    text = ' '.join((text or '').split())
+    return text if len(text) <= SUMMARY_LENGTH else text[:SUMMARY_LENGTH - 1] + '…'
+
+
+def publish(course_id, item_type, item_id, actor_id, title, summary='', user_id=None, cur=None):
+    """
+    Agrega un evento al stream del curso y encola su difusión. Con `user_id`
+    el evento es privado de ese usuario (p. ej. su calificación) y reemplaza
+    al evento anterior del mismo elemento para ese usuario. Con `cur` el
+    evento se confirma junto con la escritura de origen.
+    """
+    if cur is None:
+        with transaction() as cur:
+            return publish(course_id, item_type, item_id, actor_id, title, summary, user_id, cur=cur)
+
+    if user_id:
+        cur.execute(
+            "DELETE FROM stream_items WHERE item_type = %s AND item_id = %s AND user_id = %s",
+            (item_type, item_id, user_id)
+        )
+    cur.execute("""
+        INSERT INTO stream_items (course_id, item_type, item_id, user_id, actor_id, title, summary)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, (course_id, item_type, item_id, user_id, actor_id, title[:255], summarize(summary)))
+    stream_item_id = cur.lastrowid
+    enqueue('stream_fanout', {'stream_item_id': stream_item_id}, cur=cur)
+    return stream_item_id
+
+
+def update_item(item_type, item_id, title, summary, cur=None):
+    """Mantiene el texto de los eventos al editar el elemento de origen"""
+    (cur.execute if cur is not None else execute)(
+        "UPDATE stream_items SET title = %s, summary = %s WHERE item_type = %s AND item_id = %s",
+        (title[:255], summarize(summary), item_type, item_id)
+    )
+
+
+def retract(item_types, item_id, cur=None):
+    """Quita del stream los eventos de un elemento borrado (las entradas caen en cascada)"""
+    placeholders = ', '.join(['%s'] * len(item_types))
+    (cur.execute if cur is not None else execute)(
+        f"DELETE FROM stream_items WHERE item_type IN ({placeholders}) AND item_id = %s",
+        (*item_types, item_id)
+    )
+
+
+def fan_out(stream_item_id):
+    with transaction() as cur:
+        cur.execute("SELECT id, course_id, user_id FROM stream_items WHERE id = %s", (stream_item_id,))
+        item = cur.fetchone()
+        if not item:
+            return 0
+        if item['user_id']:
+            cur.execute(
+                "INSERT IGNORE INTO stream_entries (user_id, stream_item_id, course_id) VALUES (%s, %s, %s)",
+                (item['user_id'], item['id'], item['course_id'])
+            )
+        else:
+            cur.execute(FANOUT_COURSE_SQL, {'item_id': item['id'], 'course_id': item['course_id']})
+        return cur.rowcount
+
+
+def backfill(user_id, course_id, limit=BACKFILL_ITEMS):
+    """Copia los eventos recientes de un curso al stream de un nuevo miembro"""
+    _, count = execute(BACKFILL_SQL, {'user_id': user_id, 'course_id': course_id, 'limit': limit})
+    return count
+
+
+def serialize_item(row):
+    return {
+        'id': row['id'],
+        'type': row['item_type'],
+        'item_id': row['item_id'],
+        'course': {
+            'id': row['course_id'],
+            'name': row['course_name']
+        },
+        'actor': {
+            'id': row['actor_id'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'avatar': avatar_url(row['avatar'], 32)
+        } if row['actor_id'] else None,
+        'title': row['title'],
+        'summary': row['summary'],
+        'is_private': row['user_id'] is not None,
+        'created_at': row['created_at'].isoformat()
+    }
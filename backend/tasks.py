@@ -0,0 +1,191 @@
+"""
+Manejadores de la cola de trabajos (ver jobs.py).
+
+La difusión a los estudiantes de un curso corre aquí y no en la ruta que la
+origina: las notificaciones se insertan en una sola transacción junto con un
+trabajo de correo por destinatario, y cada correo se reintenta por separado.
+"""
+from datetime import datetime
+
+from changes import record, change_entry
+from db import query_one, query_all, transaction
+from email_config import send_notification_email
+from jobs import job_handler, enqueue_many
+from realtime import emit_to_user
+from response_cache import invalidate, assignment_tag
+from thumbnails import generate_thumbnail
+import stream
+
+# Estudiantes del curso que todavía no recibieron la notificación de este
+# elemento; así un reintento no duplica lo que ya se insertó.
+COURSE_RECIPIENTS_SQL = """
+    SELECT u.id, u.email, u.first_name, u.last_name,
+           (u.email_notifications AND u.{preference}) AS wants_email
+    FROM course_enrollments ce
+    JOIN users u ON u.id = ce.student_id
+    WHERE ce.course_id = %(course_id)s
+      AND NOT EXISTS (
+          SELECT 1 FROM notifications n
+          WHERE n.user_id = u.id AND n.type = %(type)s AND n.related_id = %(related_id)s
+      )
+"""
+
+
+def notify_users(recipients, title, message, notification_type, related_id, email_data=None):
+    """Inserta las notificaciones y encola los correos en una transacción; luego las emite"""
+    created = []
+    with transaction() as cur:
+        for recipient in recipients:
+            cur.execute("""
+                INSERT INTO notifications (user_id, title, message, type, related_id)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (recipient['id'], title, message, notification_type, related_id))
+            created.append((recipient['id'], cur.lastrowid))
+        record(cur, [
+            change_entry('notification', notification_id, user_id=user_id)
+            for user_id, notification_id in created
+        ])
+        if email_data is not None:
+            enqueue_many('send_email', [{
+                'user_email': recipient['email'],
+                'user_name': f"{recipient['first_name']} {recipient['last_name']}",
+                'notification_type': notification_type,
+                'data': email_data
+            } for recipient in recipients if recipient['wants_email']], cur=cur)
+
+    created_at = datetime.utcnow().isoformat()
+    for user_id, notification_id in created:
+        emit_to_user(user_id, 'new_notification', {
+            'id': notification_id,
+            'title': title,
+            'message': message,
+            'type': notification_type,
+            'related_id': related_id,
+            'created_at': created_at
+        })
+    return len(created)
+
+
+def course_recipients(course_id, notification_type, related_id, preference):
+    return query_all(
+        COURSE_RECIPIENTS_SQL.format(preference=preference),
+        {'course_id': course_id, 'type': notification_type, 'related_id': related_id}
+    )
+
+
+@job_handler('send_email')
+def send_email(user_email, user_name, notification_type, data):
+    if not send_notification_email(user_email, user_name, notification_type, data):
+        raise RuntimeError(f"No se pudo enviar el correo a {user_email}")
+
+
+@job_handler('assignment_created')
+def assignment_created(assignment_id):
+    assignment = query_one("""
+        SELECT a.id, a.title, a.description, a.due_date, a.course_id,
+               c.name AS course_name, u.first_name, u.last_name
+        FROM assignments a
+        JOIN courses c ON c.id = a.course_id
+        JOIN users u ON u.id = c.teacher_id
+        WHERE a.id = %s
+    """, (assignment_id,))
+    if not assignment:
+        return
+
+    due_date = assignment['due_date'].strftime('%d/%m/%Y %H:%M') if assignment['due_date'] else 'N/A'
+    notify_users(
+        course_recipients(assignment['course_id'], 'assignment', assignment['id'], 'assignment_reminders'),
+        title=f"Nueva tarea: {assignment['title']}",
+        message=f"Se ha creado una nueva tarea en {assignment['course_name']}. Fecha límite: {due_date}",
+        notification_type='assignment',
+        related_id=assignment['id'],
+        email_data={
+            'title': assignment['title'],
+            'description': assignment['description'],
+            'due_date': due_date,
+            'course_name': assignment['course_name'],
+            'teacher_name': f"{assignment['first_name']} {assignment['last_name']}"
+        }
+    )
+
+
+@job_handler('announcement_created')
+def announcement_created(announcement_id):
+    announcement = query_one("""
+        SELECT a.id, a.title, a.content, a.course_id, c.name AS course_name
+        FROM announcements a
+        JOIN courses c ON c.id = a.course_id
+        WHERE a.id = %s
+    """, (announcement_id,))
+    if not announcement:
+        return
+
+    notify_users(
+        course_recipients(announcement['course_id'], 'announcement', announcement['id'], 'announcement_notifications'),
+        title=f"Nuevo anuncio: {announcement['title']}",
+        message=f"Se publicó un anuncio en {announcement['course_name']}",
+        notification_type='announcement',
+        related_id=announcement['id'],
+        email_data={
+            'title': announcement['title'],
+            'content': announcement['content'],
+            'course_name': announcement['course_name']
+        }
+    )
+
+
+@job_handler('submission_graded')
+def submission_graded(submission_id):
+    submission = query_one("""
+        SELECT s.id, s.points_earned, s.feedback, a.title AS assignment_title,
+               u.id AS student_id, u.email, u.first_name, u.last_name,
+               (u.email_notifications AND u.grade_notifications) AS wants_email
+        FROM assignment_submissions s
+        JOIN assignments a ON a.id = s.assignment_id
+        JOIN users u ON u.id = s.student_id
+        WHERE s.id = %s
+    """, (submission_id,))
+    if not submission:
+        return
+
+    grade = float(submission['points_earned']) if submission['points_earned'] is not None else None
+    notify_users(
+        [{
+            'id': submission['student_id'],
+            'email': submission['email'],
+            'first_name': submission['first_name'],
+            'last_name': submission['last_name'],
+            'wants_email': submission['wants_email']
+        }],
+        title=f"Tarea calificada: {submission['assignment_title']}",
+        message=f"Tu entrega fue calificada con {grade if grade is not None else 'N/A'} puntos",
+        notification_type='grade',
+        related_id=submission['id'],
+        email_data={
+            'assignment_title': submission['assignment_title'],
+            'grade': grade,
+            'comments': submission['feedback'] or 'Sin comentarios'
+        }
+    )
+
+
+@job_handler('stream_fanout')
+def stream_fanout(stream_item_id):
+    stream.fan_out(stream_item_id)
+
+
+@job_handler('stream_backfill')
+def stream_backfill(user_id, course_id):
+    stream.backfill(user_id, course_id)
+
+
+@job_handler('build_thumbnail')
+def build_thumbnail(file_id, location, mime_type, blob_id=None):
+    if not generate_thumbnail(file_id, location, mime_type, blob_id):
+        return
+    # Los listados de adjuntos de las tareas muestran la URL de la miniatura
+    rows = query_all("""
+        SELECT DISTINCT assignment_id FROM file_attachments
+        WHERE (id = %s OR blob_id = %s) AND assignment_id IS NOT NULL
+    """, (file_id, blob_id))
+    invalidate(*(assignment_tag(row['assignment_id']) for row in rows))
@@ -0,0 +1,91 @@
+"""
+Generación de miniaturas y vistas previas de adjuntos en segundo plano.
+
+Tras confirmar una subida se encola un trabajo 'build_thumbnail' (ver
+jobs.py y tasks.py) que corre en los workers de la cola: las imágenes se
+reducen a WebP y los PDF se rasterizan en su primera página.
+La miniatura se guarda junto al blob, así que el contenido deduplicado se
+procesa una sola vez y todos sus adjuntos la comparten.
+"""
+import os
+import uuid
+
+from PIL import Image, ImageOps
+
+import storage
+from blobs import thumbnail_location
+from config import Config
+from db import execute
+from jobs import enqueue
+
+try:
+    import fitz  # PyMuPDF, para la primera página de los PDF
+except ImportError:
+    fitz = None
+
+IMAGE_MIME_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp'}
+PDF_MIME_TYPE = 'application/pdf'
+
+def supports_thumbnail(mime_type):
+    if mime_type in IMAGE_MIME_TYPES:
+        return True
+    return mime_type == PDF_MIME_TYPE and fitz is not None
+
+
+def render_image(file_path, size):
+    # El archivo se cierra al salir: convert() devuelve una copia independiente
+    with Image.open(file_path) as source:
+        # Los JPEG se pueden decodificar directamente a una escala menor
+        source.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((size, size))
+        return image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+
+def render_pdf(file_path, size):
+    with fitz.open(file_path) as document:
+        if document.page_count == 0:
+            return None
+        page = document[0]
+        zoom = size / max(page.rect.width, page.rect.height)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def generate_thumbnail(file_id, location, mime_type, blob_id=None, size=None):
+    """Crea la miniatura (si no existe) y la registra en file_attachments"""
+    size = size or Config.THUMBNAIL_SIZE
+    target = thumbnail_location(location)
+
+    if not storage.exists(target):
+        with storage.fetch_to_temp(location) as file_path:
+            if mime_type in IMAGE_MIME_TYPES:
+                image = render_image(file_path, size)
+            elif mime_type == PDF_MIME_TYPE and fitz is not None:
+                image = render_pdf(file_path, size)
+            else:
+                return None
+        if image is None:
+            return None
+
+        temp_path = os.path.join(storage.temp_folder(), f".{uuid.uuid4().hex}.webp")
+        image.save(temp_path, 'WEBP', quality=75, method=4)
+        storage.store_at(temp_path, target)
+
+    if blob_id:
+        execute("UPDATE file_attachments SET thumbnail_path = %s WHERE blob_id = %s", (target, blob_id))
+    else:
+        execute("UPDATE file_attachments SET thumbnail_path = %s WHERE id = %s", (target, file_id))
+    return target
+
+
+def schedule_thumbnail(attachment):
+    """Encola la miniatura de un adjunto recién confirmado"""
+    if not supports_thumbnail(attachment.mime_type):
+        return
+    enqueue('build_thumbnail', {
+        'file_id': attachment.id,
+        'location': attachment.file_path,
+        'mime_type': attachment.mime_type,
+        'blob_id': attachment.blob_id
+    })
@@ -0,0 +1,81 @@
+"""
+Generación de archivos ZIP en streaming.
+
+zipfile escribe sobre un destino sin seek usando descriptores de datos, así
+que cada bloque comprimido se entrega a la respuesta apenas se produce. La
+memoria usada no depende del tamaño del archivo: sólo el bloque de lectura
+y el directorio central (una entrada por archivo).
+"""
+import time
+import zipfile
+from contextlib import closing
+
+BUFFER_SIZE = 64 * 1024
+
+# Formatos que ya vienen comprimidos: se guardan sin volver a comprimir
+STORED_EXTENSIONS = {
+    'pdf', 'docx', 'xlsx', 'pptx', 'jpg', 'jpeg', 'png', 'gif', 'webp',
+    'zip', 'rar', '7z', 'gz', 'mp4', 'mov', 'avi', 'mp3',
+}
+
+
+class _StreamSink:
+    """Destino de escritura sin seek que acumula bytes hasta que se drenan"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def compression_for(filename):
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    return zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(entries, opener=lambda path: open(path, 'rb'), buffer_size=BUFFER_SIZE):
+    """
+    Genera el ZIP bloque a bloque.
+    entries: iterable de (nombre_en_zip, origen, fecha_modificacion); opener(origen)
+    debe retornar un archivo binario legible. Los orígenes inexistentes se omiten.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, mode='w', allowZip64=True) as archive:
+        for arcname, source_ref, modified_at in entries:
+            try:
+                source = opener(source_ref)
+            except FileNotFoundError:
+                continue
+
+            timestamp = modified_at.timetuple()[:6] if modified_at else time.localtime()[:6]
+            info = zipfile.ZipInfo(arcname, date_time=timestamp)
+            info.compress_type = compression_for(arcname)
+
+            with closing(source), archive.open(info, mode='w', force_zip64=True) as dest:
+                while True:
+                    chunk = source.read(buffer_size)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Directorio central
+    data = sink.drain()
+    if data:
+        yield data
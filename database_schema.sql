@@ -14,8 +14,15 @@ CREATE TABLE users (
     first_name VARCHAR(100) NOT NULL,
     last_name VARCHAR(100) NOT NULL,
     role ENUM('student', 'teacher', 'admin') NOT NULL DEFAULT 'student',
+    avatar VARCHAR(255),
+    unread_messages INT NOT NULL DEFAULT 0,
+    email_notifications BOOLEAN NOT NULL DEFAULT TRUE,
+    assignment_reminders BOOLEAN NOT NULL DEFAULT TRUE,
+    grade_notifications BOOLEAN NOT NULL DEFAULT TRUE,
+    announcement_notifications BOOLEAN NOT NULL DEFAULT TRUE,
     is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
 );
 
 -- ==================================================
@@ -32,6 +39,7 @@ CREATE TABLE courses (
     teacher_id INT NOT NULL,
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
     FOREIGN KEY (teacher_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -61,6 +69,7 @@ CREATE TABLE assignments (
     course_id INT NOT NULL,
     is_archived BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
     FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE
 );
 
@@ -75,6 +84,7 @@ CREATE TABLE announcements (
     course_id INT NOT NULL,
     author_id INT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
     FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE,
     FOREIGN KEY (author_id) REFERENCES users(id) ON DELETE CASCADE
 );
@@ -94,11 +104,25 @@ CREATE TABLE assignment_submissions (
     graded_by INT,
     graded_at DATETIME,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
     FOREIGN KEY (student_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (assignment_id) REFERENCES assignments(id) ON DELETE CASCADE,
     FOREIGN KEY (graded_by) REFERENCES users(id) ON DELETE SET NULL
 );
 
+-- ==================================================
+-- TABLA: file_blobs (contenido deduplicado por SHA-256)
+-- ==================================================
+CREATE TABLE file_blobs (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    sha256 CHAR(64) UNIQUE NOT NULL,
+    file_path VARCHAR(500) NOT NULL,
+    file_size BIGINT NOT NULL,
+    content_encoding VARCHAR(20),
+    ref_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- ==================================================
 -- TABLA: file_attachments
 -- ==================================================
@@ -109,17 +133,114 @@ CREATE TABLE file_attachments (
     file_path VARCHAR(500) NOT NULL,
     file_size BIGINT NOT NULL,
     mime_type VARCHAR(100) NOT NULL,
+    blob_id INT,
+    thumbnail_path VARCHAR(500),
     submission_id INT,
     assignment_id INT,
     announcement_id INT,
     uploaded_by INT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (blob_id) REFERENCES file_blobs(id),
     FOREIGN KEY (submission_id) REFERENCES assignment_submissions(id) ON DELETE CASCADE,
     FOREIGN KEY (assignment_id) REFERENCES assignments(id) ON DELETE CASCADE,
     FOREIGN KEY (announcement_id) REFERENCES announcements(id) ON DELETE CASCADE,
     FOREIGN KEY (uploaded_by) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- ==================================================
+-- TABLA: maintenance_cursors (posición de los trabajos por lotes)
+-- ==================================================
+CREATE TABLE maintenance_cursors (
+    name VARCHAR(100) PRIMARY KEY,
+    position VARCHAR(500) NOT NULL DEFAULT '',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- ==================================================
+-- TABLA: stream_items (eventos de cada curso, materializados al escribir)
+-- ==================================================
+CREATE TABLE stream_items (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    course_id INT NOT NULL,
+    item_type ENUM('announcement', 'assignment', 'grade') NOT NULL,
+    item_id INT NOT NULL,
+    user_id INT,
+    actor_id INT,
+    title VARCHAR(255) NOT NULL,
+    summary VARCHAR(255) NOT NULL DEFAULT '',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (actor_id) REFERENCES users(id) ON DELETE SET NULL
+);
+
+-- ==================================================
+-- TABLA: stream_entries (stream de cada usuario)
+-- ==================================================
+CREATE TABLE stream_entries (
+    user_id INT NOT NULL,
+    stream_item_id BIGINT NOT NULL,
+    course_id INT NOT NULL,
+    PRIMARY KEY (user_id, stream_item_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (stream_item_id) REFERENCES stream_items(id) ON DELETE CASCADE
+);
+
+-- ==================================================
+-- TABLA: change_log (cambios para la sincronización incremental)
+-- ==================================================
+CREATE TABLE change_log (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    entity_type ENUM('assignment', 'submission', 'announcement', 'notification', 'enrollment') NOT NULL,
+    entity_id INT NOT NULL,
+    course_id INT,
+    user_id INT,
+    operation ENUM('upsert', 'delete') NOT NULL DEFAULT 'upsert',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ==================================================
+-- TABLA: jobs (cola de trabajos en segundo plano)
+-- ==================================================
+CREATE TABLE jobs (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    type VARCHAR(50) NOT NULL,
+    payload JSON NOT NULL,
+    status ENUM('pending', 'running', 'done', 'dead') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_at DATETIME NOT NULL,
+    locked_by VARCHAR(100),
+    locked_at DATETIME,
+    last_error TEXT,
+    duration_ms INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME
+);
+
+-- ==================================================
+-- TABLA: upload_sessions (subidas reanudables)
+-- ==================================================
+CREATE TABLE upload_sessions (
+    id CHAR(32) PRIMARY KEY,
+    user_id INT NOT NULL,
+    original_filename VARCHAR(255) NOT NULL,
+    total_size BIGINT NOT NULL,
+    received_bytes BIGINT NOT NULL DEFAULT 0,
+    submission_id INT,
+    assignment_id INT,
+    announcement_id INT,
+    status ENUM('pending', 'completed') NOT NULL DEFAULT 'pending',
+    file_id INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (submission_id) REFERENCES assignment_submissions(id) ON DELETE CASCADE,
+    FOREIGN KEY (assignment_id) REFERENCES assignments(id) ON DELETE CASCADE,
+    FOREIGN KEY (announcement_id) REFERENCES announcements(id) ON DELETE CASCADE,
+    FOREIGN KEY (file_id) REFERENCES file_attachments(id) ON DELETE SET NULL
+);
+
 -- ==================================================
 -- TABLA: comments
 -- ==================================================
@@ -152,6 +273,20 @@ CREATE TABLE messages (
     FOREIGN KEY (receiver_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- ==================================================
+-- TABLA: conversations (resumen de cada hilo, una fila por participante)
+-- ==================================================
+CREATE TABLE conversations (
+    user_id INT NOT NULL,
+    other_id INT NOT NULL,
+    last_message_id INT NOT NULL,
+    unread_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, other_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (other_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (last_message_id) REFERENCES messages(id) ON DELETE CASCADE
+);
+
 -- ==================================================
 -- TABLA: notifications
 -- ==================================================
@@ -164,6 +299,7 @@ CREATE TABLE notifications (
     is_read BOOLEAN DEFAULT FALSE,
     related_id INT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -171,19 +307,42 @@ CREATE TABLE notifications (
 -- ÍNDICES
 -- ==================================================
 CREATE INDEX idx_users_email ON users(email);
+CREATE INDEX idx_users_avatar ON users(avatar);
 CREATE INDEX idx_courses_teacher ON courses(teacher_id);
 CREATE INDEX idx_enrollments_student ON course_enrollments(student_id);
 CREATE INDEX idx_assignments_course ON assignments(course_id);
+CREATE INDEX idx_announcements_feed ON announcements(course_id, is_pinned, created_at);
 CREATE INDEX idx_submissions_assignment ON assignment_submissions(assignment_id);
 CREATE INDEX idx_submissions_student ON assignment_submissions(student_id);
-CREATE INDEX idx_notifications_user ON notifications(user_id);
+CREATE INDEX idx_notifications_user ON notifications(user_id, is_read);
 CREATE INDEX idx_notifications_type ON notifications(type);
 CREATE INDEX idx_notifications_read ON notifications(is_read);
-CREATE INDEX idx_messages_sender ON messages(sender_id);
-CREATE INDEX idx_messages_receiver ON messages(receiver_id);
+CREATE INDEX idx_messages_sender ON messages(sender_id, created_at);
+CREATE INDEX idx_messages_receiver ON messages(receiver_id, created_at);
+CREATE INDEX idx_conversations_recent ON conversations(user_id, last_message_id);
+CREATE INDEX idx_comments_announcement ON comments(announcement_id, created_at);
+CREATE INDEX idx_comments_assignment ON comments(assignment_id, created_at);
+CREATE INDEX idx_comments_submission ON comments(submission_id, created_at);
 CREATE INDEX idx_files_submission ON file_attachments(submission_id);
 CREATE INDEX idx_files_assignment ON file_attachments(assignment_id);
+CREATE INDEX idx_files_announcement ON file_attachments(announcement_id);
 CREATE INDEX idx_files_uploader ON file_attachments(uploaded_by);
+CREATE INDEX idx_files_blob ON file_attachments(blob_id);
+CREATE INDEX idx_stream_items_course ON stream_items(course_id, id);
+CREATE INDEX idx_stream_items_item ON stream_items(item_type, item_id);
+CREATE INDEX idx_stream_entries_item ON stream_entries(stream_item_id);
+CREATE INDEX idx_change_log_course ON change_log(course_id, id);
+CREATE INDEX idx_change_log_user ON change_log(user_id, id);
+CREATE INDEX idx_jobs_claim ON jobs(status, run_at);
+CREATE INDEX idx_jobs_type ON jobs(type, status, finished_at);
+CREATE INDEX idx_upload_sessions_user ON upload_sessions(user_id);
+CREATE INDEX idx_upload_sessions_expires ON upload_sessions(status, expires_at);
+
+-- Búsqueda de texto completo (GET /api/search)
+CREATE FULLTEXT INDEX ft_courses_search ON courses(name, subject);
+CREATE FULLTEXT INDEX ft_assignments_search ON assignments(title, description);
+CREATE FULLTEXT INDEX ft_announcements_search ON announcements(title, content);
+CREATE FULLTEXT INDEX ft_messages_search ON messages(subject, content);
 
 -- ==================================================
 -- DATOS INICIALES